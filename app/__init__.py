@@ -1,3 +1,4 @@
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -22,6 +23,22 @@ def create_app(config_name='default'):
     
     # Initialize extensions with app
     db.init_app(app)
+    
+    # Invalidate tagged cache entries after commits that change their data
+    from app.utils.cache_invalidation import register_cache_invalidation
+    register_cache_invalidation(db.session)
+    
+    # Keep the per-user daily stats rollup in step with task writes
+    from app.utils.daily_stats import register_daily_stats
+    register_daily_stats(db.session)
+    
+    # Keep topic and subject confidence totals in step with subtopic confidence writes
+    from app.utils.confidence_rollup import register_confidence_rollup
+    register_confidence_rollup(db.session)
+    
+    # Keep the cached topic recency indexes in step with committed task writes
+    from app.utils.topic_recency import register_topic_recency
+    register_topic_recency(db.session)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     bcrypt.init_app(app)
@@ -33,10 +50,22 @@ def create_app(config_name='default'):
     }
     cache.init_app(app, config=cache_config)
     
+    # Share optimization results and tag versions across worker processes
+    from app.utils.shared_cache import init_shared_cache
+    init_shared_cache(app)
+    
     # Enable static file caching
     from app.utils.cache_utils import cache_static_files
     cache_static_files(app, max_age=app.config.get('STATIC_CACHE_TIMEOUT', 86400))
     
+    # Compress dynamic responses for clients that accept gzip (or zstd)
+    from app.utils.compression import init_compression
+    init_compression(app)
+    
+    # Optionally coalesce confidence edits into batched background writes
+    from app.utils.confidence_buffer import init_confidence_buffer
+    init_confidence_buffer(app)
+    
     # Register CLI commands
     from app.cli import register_commands
     register_commands(app)
@@ -69,7 +98,21 @@ def create_app(config_name='default'):
             # Then create default task types
             from app.models.task import TaskType
             TaskType.create_default_types()
+            
+            # Load the task type registry once the defaults exist
+            from app.utils.task_type_registry import refresh_task_type_registry
+            refresh_task_type_registry()
+            
+            # Fill the daily stats rollup on databases that predate it
+            from app.utils.daily_stats import ensure_daily_stats
+            ensure_daily_stats()
         except Exception as e:
             app.logger.error(f"Error during initialization: {str(e)}")
     
+    # Start the off-peak plan scheduler (skip the reloader's watcher process)
+    if app.config.get('PLAN_PREGENERATION_ENABLED') and (
+            not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        from app.utils.plan_pregeneration import start_plan_scheduler
+        start_plan_scheduler(app)
+    
     return app
@@ -26,6 +26,101 @@ def register_commands(app):
         else:
             click.echo(click.style(f"Error: {message}", fg='red'))
     
+    @app.cli.command('pregenerate-plans')
+    @click.option('--date', 'date_str', default='tomorrow',
+                  help="Day to plan: 'today', 'tomorrow' or YYYY-MM-DD.")
+    @click.option('--batch-size', default=None, type=int, help='Users per batch.')
+    @click.option('--workers', default=None, type=int, help='Planner processes (1 = no pool).')
+    @with_appcontext
+    def pregenerate_plans_command(date_str, batch_size, workers):
+        """Generate the day's tasks for every active user that has no plan yet."""
+        from datetime import datetime, timedelta
+        from flask import current_app
+        from app.utils.plan_pregeneration import pregenerate_plans
+        
+        today = datetime.utcnow().date()
+        if date_str == 'today':
+            due_date = today
+        elif date_str == 'tomorrow':
+            due_date = today + timedelta(days=1)
+        else:
+            try:
+                due_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+            except ValueError:
+                raise click.BadParameter("Use 'today', 'tomorrow' or YYYY-MM-DD.", param_hint='--date')
+        
+        batch_size = batch_size or current_app.config.get('PLAN_PREGENERATION_BATCH_SIZE', 50)
+        click.echo(f'Pre-generating plans for {due_date}...')
+        stats = pregenerate_plans(
+            due_date,
+            batch_size=batch_size,
+            active_days=current_app.config.get('PLAN_PREGENERATION_ACTIVE_DAYS', 30),
+            max_workers=workers or current_app.config.get('PLAN_PREGENERATION_WORKERS', 1)
+        )
+        
+        click.echo(click.style(
+            f"{stats['generated']} plans generated ({stats['tasks']} tasks), "
+            f"{stats['skipped']} already planned, {stats['failed']} failed, "
+            f"out of {stats['users']} active users", fg='green' if not stats['failed'] else 'yellow'))
+        click.echo(f"{stats['seconds']}s: {stats['users_per_second']} users/s, "
+                   f"{stats['tasks_per_second']} tasks/s")
+    
+    @app.cli.command('backfill-daily-stats')
+    @click.option('--user-id', default=None, type=int, help='Only rebuild this user.')
+    @with_appcontext
+    def backfill_daily_stats_command(user_id):
+        """Rebuild the user_daily_stats rollup from the tasks table."""
+        from app.utils.daily_stats import backfill_daily_stats
+        
+        click.echo('Rebuilding daily stats...')
+        rows = backfill_daily_stats(user_id)
+        click.echo(click.style(f'{rows} daily stat rows written', fg='green'))
+    
+    @app.cli.command('init-confidence')
+    @click.option('--user-id', default=None, type=int, help='Only initialize this user.')
+    @with_appcontext
+    def init_confidence_command(user_id):
+        """Create default subtopic confidences and recompute topic percentages for all users."""
+        from app.utils.confidence_utils import initialize_confidences
+        
+        click.echo('Initializing confidence data...')
+        stats = initialize_confidences([user_id] if user_id is not None else None)
+        click.echo(click.style(
+            f"{stats['subtopics']} subtopic confidences created, {stats['topics']} topic and "
+            f"{stats['subjects']} subject confidences updated for {stats['users']} users", fg='green'))
+    
+    @app.cli.command('verify-confidence')
+    @click.option('--user-id', default=None, type=int, help='Only check this user.')
+    @click.option('--fix/--check', default=True, help='Repair drifted totals (default) or only report them.')
+    @with_appcontext
+    def verify_confidence_command(user_id, fix):
+        """Add missing confidence total columns, then recompute the totals from scratch and repair any drift."""
+        from app.utils.confidence_rollup import add_confidence_total_columns, verify_confidence_totals
+        
+        added = add_confidence_total_columns()
+        if added:
+            click.echo(f"Added {', '.join(added)} to topic_confidences")
+        
+        click.echo('Verifying confidence totals...')
+        stats = verify_confidence_totals(user_id, fix=fix)
+        click.echo(click.style(
+            f"{stats['checked']} topic and subject confidences checked, {stats['mismatched']} mismatched, "
+            f"{stats['fixed']} fixed", fg='green' if not stats['mismatched'] or stats['fixed'] else 'yellow'))
+    
+    @app.cli.command('build-static')
+    @with_appcontext
+    def build_static_command():
+        """Write fingerprinted and precompressed copies of the static assets."""
+        from flask import current_app
+        from app.utils.compression import build_static
+        
+        click.echo('Building static assets...')
+        stats = build_static(current_app.static_folder)
+        click.echo(click.style(
+            f"{stats['files']} files fingerprinted, {stats['compressed']} .gz files written", fg='green'))
+        if not current_app.config.get('STATIC_FINGERPRINTING'):
+            click.echo('STATIC_FINGERPRINTING is off in this config, so url_for keeps the original names.')
+    
     # Database functions are now handled by the db-manage interface
     
     @app.cli.command('db-manage')
@@ -1,6 +1,7 @@
 from app.models.user import User
 from app.models.curriculum import Subject, Topic, Subtopic
 from app.models.task import Task, TaskType, TaskTypePreference, TaskSubtopic
+from app.models.stats import UserDailyStat
 
 def create_tables():
     """
@@ -10,6 +11,10 @@ def create_tables():
     from app import db
     db.create_all()
     
+    # Add columns that create_all can't add to existing tables
+    from app.utils.confidence_rollup import add_confidence_total_columns
+    add_confidence_total_columns()
+    
     # Create default task types
     TaskType.create_default_types()
     
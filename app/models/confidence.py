@@ -61,6 +61,11 @@ class TopicConfidence(db.Model):
     confidence_percent = db.Column(db.Float, default=50.0)  # Default to 50%
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Running totals of the user's subtopic levels in this topic and its nested
+    # topics (kept by confidence_rollup)
+    level_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    level_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Using back_populates instead of backref per best practices
     user = db.relationship('User', back_populates='topic_confidences', lazy=True)
     topic = db.relationship('Topic', back_populates='topic_confidences', lazy=True)
@@ -91,66 +96,81 @@ class TopicConfidence(db.Model):
             
         return confidence
     
-    @staticmethod
-    def calculate_for_topic(topic_id, user_id):
-        """Calculate topic confidence as mean of subtopic confidences."""
-        from app.models.curriculum import Subtopic
-        
-        # Get all subtopics for this topic
-        subtopics = Subtopic.query.filter_by(topic_id=topic_id).all()
-        
-        # Handle empty subtopics case
-        if not subtopics:
-            return 0.0
-        
-        # Get confidence levels for these subtopics
-        subtopic_confidences = SubtopicConfidence.query.filter_by(
-            user_id=user_id
-        ).filter(
-            SubtopicConfidence.subtopic_id.in_([st.id for st in subtopics])
-        ).all()
-        
-        # If no confidence records exist, create them with default values
-        if not subtopic_confidences or len(subtopic_confidences) < len(subtopics):
-            for subtopic in subtopics:
-                SubtopicConfidence.get_or_create(user_id, subtopic.id)
-                
-            # Refresh the confidence records
-            subtopic_confidences = SubtopicConfidence.query.filter_by(
-                user_id=user_id
-            ).filter(
-                SubtopicConfidence.subtopic_id.in_([st.id for st in subtopics])
-            ).all()
-        
-        # Calculate mean confidence
-        total_confidence = sum(sc.confidence_level for sc in subtopic_confidences)
-        count = len(subtopic_confidences)
-        
-        # Avoid division by zero
-        if count == 0:
-            return 50.0
-            
-        avg_confidence = total_confidence / count
-        
-        # Convert to percentage with adjusted scale where:
-        # 1/5 = 0%, 3/5 = 50%, 5/5 = 100%
-        confidence_percent = ((avg_confidence - 1) / 4.0) * 100.0
-        
-        return confidence_percent
-    
     @staticmethod
     def update_for_topic(topic_id, user_id):
-        """Update confidence percentage for a topic."""
-        # Calculate new confidence percentage
-        confidence_percent = TopicConfidence.calculate_for_topic(topic_id, user_id)
+        """
+        Update confidence percentage for a topic.
+        The rollup listener adjusts level_sum/level_count and the percentage on
+        every subtopic flush, so this only flushes and reads back one row.
+        """
+        from app.utils.confidence_rollup import topic_percent, subtopic_count
+        from app.utils.curriculum_index import get_curriculum_index
         
-        # Get or create topic confidence record
-        topic_confidence = TopicConfidence.get_or_create(user_id, topic_id)
+        # Apply pending subtopic changes, then reload the row the listener wrote
+        db.session.flush()
+        topic_confidence = TopicConfidence.query.filter_by(
+            user_id=user_id,
+            topic_id=topic_id
+        ).populate_existing().first()
+        
+        if not topic_confidence:
+            # Nothing rated yet, so every subtopic counts at the default level
+            topic_confidence = TopicConfidence(
+                user_id=user_id,
+                topic_id=topic_id,
+                confidence_percent=topic_percent(0, 0, subtopic_count(db.session.connection(), 'topic', topic_id))
+            )
+            db.session.add(topic_confidence)
         
-        # Update the percentage
-        topic_confidence.confidence_percent = confidence_percent
         topic_confidence.last_updated = datetime.utcnow()
+        confidence_percent = topic_confidence.confidence_percent
         
         db.session.commit()
         
+        # Keep cached task-generation weights in step with the new confidence
+        from app.utils.weighted_sampler import update_topic_weight, invalidate_subtopic_order
+        update_topic_weight(user_id, topic_id, confidence_percent)
+        invalidate_subtopic_order(user_id, topic_id)
+        
+        # Parent topics (Psychology papers) roll up this topic's subtopics too
+        ancestor_ids = get_curriculum_index().get_ancestor_ids(topic_id)
+        if ancestor_ids:
+            for ancestor_id, percent in db.session.query(
+                TopicConfidence.topic_id, TopicConfidence.confidence_percent
+            ).filter(
+                TopicConfidence.user_id == user_id,
+                TopicConfidence.topic_id.in_(ancestor_ids)
+            ):
+                update_topic_weight(user_id, ancestor_id, percent)
+        
         return topic_confidence
+
+class SubjectConfidence(db.Model):
+    """Model representing a user's confidence rolled up over a whole subject."""
+    __tablename__ = 'subject_confidences'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
+    confidence_percent = db.Column(db.Float, default=50.0)  # Default to 50%
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Running totals of the user's subtopic levels in this subject (kept by confidence_rollup)
+    level_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    level_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Using back_populates instead of backref per best practices
+    user = db.relationship('User', back_populates='subject_confidences', lazy=True)
+    subject = db.relationship('Subject', back_populates='subject_confidences', lazy=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'subject_id', name='unique_user_subject_confidence'),
+    )
+    
+    def __repr__(self):
+        return f"<SubjectConfidence user_id={self.user_id} subject_id={self.subject_id} percent={self.confidence_percent}>"
+    
+    @property
+    def average_level(self):
+        """Average level (1-5) of the rated subtopics, or None if none are rated."""
+        return self.level_sum / self.level_count if self.level_count else None
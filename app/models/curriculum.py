@@ -16,6 +16,7 @@ class Subject(db.Model):
     # Use back_populates instead of backref per SQLAlchemy best practices
     topics = db.relationship('Topic', back_populates='subject', lazy=True, cascade='all, delete-orphan')
     tasks = db.relationship('Task', back_populates='subject', lazy=True)
+    subject_confidences = db.relationship('SubjectConfidence', back_populates='subject', lazy=True, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f"<Subject {self.title}>"
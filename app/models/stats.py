@@ -0,0 +1,25 @@
+from app import db
+
+class UserDailyStat(db.Model):
+    """
+    Per-user, per-day, per-subject task counts, maintained incrementally as
+    tasks are created, completed, skipped or deleted (see app.utils.daily_stats).
+    The day is the task's due date, or its creation date when it has none.
+    """
+    __tablename__ = 'user_daily_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
+    created = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    minutes = db.Column(db.Integer, nullable=False, default=0)  # Duration of completed tasks
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', 'subject_id', name='unique_user_day_subject_stat'),
+    )
+    
+    def __repr__(self):
+        return f"<UserDailyStat user={self.user_id} day={self.day} subject={self.subject_id} created={self.created} completed={self.completed}>"
@@ -20,11 +20,9 @@ class TaskType(db.Model):
     
     @classmethod
     def get_uplearn_id(cls):
-        """Get the ID of the Uplearn task type."""
-        uplearn = cls.query.filter_by(name='uplearn').first()
-        if uplearn:
-            return uplearn.id
-        return None
+        """Get the ID of the Uplearn task type (from the in-process registry)."""
+        from app.utils.task_type_registry import get_task_type_registry
+        return get_task_type_registry().uplearn_id
     
     @classmethod
     def create_default_types(cls):
@@ -124,7 +122,7 @@ class Task(db.Model):
         self.due_date = due_date
         self.total_duration = total_duration
     
-    def mark_completed(self):
+    def mark_completed(self, commit=True):
         """Mark the task as completed and load relationships."""
         self.completed_at = datetime.utcnow()
         
@@ -133,12 +131,14 @@ class Task(db.Model):
             _ = self.subtopics  # Access relationship to load it
             self._subtopics_loaded = True
         
-        db.session.commit()
+        if commit:
+            db.session.commit()
     
-    def mark_skipped(self):
-        """Mark the task as skipped."""
+    def mark_skipped(self, commit=True):
+        """Mark the task as skipped. Pass commit=False to batch several updates."""
         self.skipped_at = datetime.utcnow()
-        db.session.commit()
+        if commit:
+            db.session.commit()
     
     def add_subtopic(self, subtopic_id, duration=15):
         """Add a subtopic to this task."""
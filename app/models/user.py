@@ -2,7 +2,7 @@ from datetime import datetime
 from flask_login import UserMixin
 from app import db, bcrypt, login_manager
 from app.models.task import TaskTypePreference, TaskType
-from app.models.confidence import SubtopicConfidence, TopicConfidence
+from app.models.confidence import SubtopicConfidence, TopicConfidence, SubjectConfidence
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -33,6 +33,7 @@ class User(db.Model, UserMixin):
     # Confidence relationships
     subtopic_confidences = db.relationship('SubtopicConfidence', back_populates='user', lazy=True, cascade='all, delete-orphan')
     topic_confidences = db.relationship('TopicConfidence', back_populates='user', lazy=True, cascade='all, delete-orphan')
+    subject_confidences = db.relationship('SubjectConfidence', back_populates='user', lazy=True, cascade='all, delete-orphan')
     
     def __init__(self, username, password, email=None):
         self.username = username
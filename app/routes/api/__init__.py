@@ -5,11 +5,13 @@ from datetime import datetime, timedelta
 from app import db
 from app.models.task import Task, TaskSubtopic, TaskType
 from app.models.curriculum import Subtopic, Topic
-from app.utils.task_generator import generate_replacement_task
+from app.utils.task_generator import generate_replacement_task, build_replacement_task, save_tasks
 from app.routes.api.curriculum import curriculum_bp
 from app.routes.api.confidence import confidence_bp
 from app.models.confidence import SubtopicConfidence
-from app.utils.confidence_utils import update_subtopics_confidence_from_dict
+from app.utils.task_type_registry import get_task_type_registry
+from app.utils.cache_utils import user_etag_response
+from app.utils.task_analytics import get_task_series
 
 # Create blueprint
 api_bp = Blueprint('api', __name__)
@@ -142,9 +144,9 @@ def refresh_tasks():
         Task.skipped_at.is_(None)
     ).all()
     
-    # Mark all as skipped
+    # Mark all as skipped in a single commit
     for task in active_tasks:
-        task.mark_skipped()
+        task.mark_skipped(commit=False)
     
     db.session.commit()
     
@@ -166,12 +168,14 @@ def refresh_tasks():
             # Approximately 1 task per 30 minutes of study time
             num_tasks = max(1, int(study_hours * 2))
             
-            # Generate new tasks using old method
+            # Build new tasks using old method, then write them in one commit
             tasks = []
+            planned_topic_ids = set()
             for _ in range(num_tasks):
-                task = generate_replacement_task(current_user)
+                task = build_replacement_task(current_user, planned_topic_ids=planned_topic_ids)
                 if task:
                     tasks.append(task)
+            save_tasks(tasks)
         
         # Format tasks for the API response
         new_tasks = []
@@ -261,12 +265,13 @@ def add_task_for_subtopic():
     
     # Get task type (default to notes)
     task_type_id = request.json.get('task_type_id')
+    task_types = get_task_type_registry()
     if not task_type_id:
-        task_type = TaskType.query.filter_by(name='notes').first()
+        task_type = task_types.get_by_name('notes')
         if not task_type:
-            task_type = TaskType.query.first()  # Fallback to any task type
+            task_type = task_types.first()  # Fallback to any task type
     else:
-        task_type = TaskType.query.get(task_type_id)
+        task_type = task_types.get(task_type_id)
     
     if not task_type:
         return jsonify({'success': False, 'message': 'No task type available'}), 500
@@ -327,7 +332,7 @@ def practice_subtopic():
     subtopic = Subtopic.query.get_or_404(subtopic_id)
     
     # Get the practice task type
-    practice_type = TaskType.query.filter_by(name='practice').first()
+    practice_type = get_task_type_registry().get_by_name('practice')
     if not practice_type:
         return jsonify({'success': False, 'message': 'Practice task type not found'}), 500
     
@@ -385,24 +390,13 @@ def start_task(task_id):
 
 @api_bp.route('/pomodoro/stats', methods=['GET'])
 @login_required
+@user_etag_response(cache_body=True)
 def get_pomodoro_stats():
     """Get statistics for the Pomodoro dashboard."""
-    # Calculate completion rate for last 7 days
-    today = datetime.utcnow().date()
-    seven_days_ago = today - timedelta(days=7)
-    
-    total_tasks = Task.query.filter(
-        Task.user_id == current_user.id,
-        Task.due_date >= seven_days_ago,
-        Task.due_date <= today
-    ).count()
-    
-    completed_tasks = Task.query.filter(
-        Task.user_id == current_user.id,
-        Task.due_date >= seven_days_ago,
-        Task.due_date <= today,
-        Task.completed_at.isnot(None)
-    ).count()
+    # Calculate completion rate for the last 7 days (and today) from the daily rollup
+    series = get_task_series(current_user.id, days=8)
+    total_tasks = sum(point.created for point in series)
+    completed_tasks = sum(point.completed for point in series)
     
     completion_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
     
@@ -411,7 +405,7 @@ def get_pomodoro_stats():
         'stats': {
             'completion_rate': completion_rate,
             'total_pomodoros': 0,  # This would be stored in a new model if implemented
-            'focus_time': 0        # This would be stored in a new model if implemented
+            'focus_time': sum(point.minutes for point in series)  # Minutes of completed tasks
         }
     })
 
@@ -459,13 +453,73 @@ def update_subtopic_confidence():
         if confidence_level and 1 <= confidence_level <= 5:
             formatted_data[int(subtopic_id)] = (confidence_level, priority)
     
-    # Update confidences
-    success = update_subtopics_confidence_from_dict(current_user.id, formatted_data)
-    
-    if not success:
+    # Queue the updates when write-behind is enabled, else write them now
+    from app.utils.confidence_buffer import submit_confidence_updates
+    try:
+        submit_confidence_updates(current_user.id, formatted_data)
+    except Exception as e:
+        current_app.logger.error(f"Error updating multiple subtopic confidences: {str(e)}")
         return jsonify({'success': False, 'message': 'Error updating confidences'}), 500
     
     return jsonify({
         'success': True,
         'message': f'Updated {len(formatted_data)} subtopic confidences'
     })
+
+@api_bp.route('/subtopics/priority/<int:subtopic_id>', methods=['POST'])
+@login_required
+def set_subtopic_priority(subtopic_id):
+    """Set priority for a subtopic."""
+    if not request.is_json:
+        return jsonify({'success': False, 'message': 'Invalid request format'}), 400
+    
+    priority = request.json.get('priority', False)
+    
+    # Make sure the subtopic exists
+    Subtopic.query.get_or_404(subtopic_id)
+    
+    # Set the flag and keep the current level (queued when write-behind is enabled)
+    from app.utils.confidence_buffer import submit_confidence_updates
+    submit_confidence_updates(current_user.id, {subtopic_id: (None, bool(priority))})
+    
+    return jsonify({
+        'success': True,
+        'message': f'Subtopic priority {"set" if priority else "unset"}',
+        'subtopic_id': subtopic_id,
+        'priority': priority
+    })
+
+@api_bp.route('/topic-confidence/<int:topic_id>', methods=['POST'])
+@login_required
+def update_topic_confidence(topic_id):
+    """Set every subtopic of a topic to one confidence level."""
+    if not request.is_json:
+        return jsonify({'success': False, 'message': 'Invalid request format'}), 400
+    
+    new_level = request.json.get('confidence_level')
+    
+    if not isinstance(new_level, int) or not 1 <= new_level <= 5:
+        return jsonify({'success': False, 'message': 'Invalid confidence level'}), 400
+    
+    # Make sure the topic exists
+    Topic.query.get_or_404(topic_id)
+    
+    from app.utils.curriculum_index import get_curriculum_index
+    subtopics = get_curriculum_index().get_subtopics(topic_id)
+    
+    if not subtopics:
+        return jsonify({
+            'success': False, 
+            'message': 'Cannot set topic confidence directly. Topic has no subtopics.'
+        }), 400
+    
+    # Queued when write-behind is enabled; the topic confidence follows from the subtopic totals
+    from app.utils.confidence_buffer import submit_confidence_updates
+    submit_confidence_updates(current_user.id, {subtopic.id: (new_level, None) for subtopic in subtopics})
+    
+    return jsonify({
+        'success': True,
+        'message': 'Topic confidence updated via subtopic updates',
+        'topic_id': topic_id,
+        'confidence_level': new_level
+    })
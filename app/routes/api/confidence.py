@@ -1,7 +1,7 @@
 from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from app import db
-from app.models.confidence import SubtopicConfidence, TopicConfidence
+from app.models.confidence import SubtopicConfidence, TopicConfidence, SubjectConfidence
 from app.models.curriculum import Subtopic, Topic
 from datetime import datetime
 
@@ -18,6 +18,9 @@ def get_all_confidence_data():
     # Get all topic confidence data
     topic_confidences = TopicConfidence.query.filter_by(user_id=current_user.id).all()
     
+    # Get subject rollups
+    subject_confidences = SubjectConfidence.query.filter_by(user_id=current_user.id).all()
+    
     return jsonify({
         'subtopic_confidences': [
             {
@@ -34,6 +37,16 @@ def get_all_confidence_data():
                 'last_updated': tc.last_updated.isoformat() if tc.last_updated else None
             }
             for tc in topic_confidences
+        ],
+        'subject_confidences': [
+            {
+                'subject_id': sc.subject_id,
+                'confidence_percent': sc.confidence_percent,
+                'average_level': sc.average_level,
+                'rated_subtopics': sc.level_count,
+                'last_updated': sc.last_updated.isoformat() if sc.last_updated else None
+            }
+            for sc in subject_confidences
         ]
     })
 
@@ -111,6 +124,58 @@ def subtopic_confidence(subtopic_id):
             }
         })
 
+@confidence_bp.route('/user/batch', methods=['POST'])
+@login_required
+def batch_confidence():
+    """
+    Update many subtopic confidences in one request.
+    
+    Accepts {"updates": [...]} where each update is either
+    {"subtopic_id": 1, "confidence_level": 4, "priority": true} or a
+    [subtopic_id, confidence_level, priority] array (priority is optional).
+    """
+    from app.utils.confidence_utils import upsert_subtopic_confidences
+    
+    data = request.get_json(silent=True)
+    updates = data.get('updates') if isinstance(data, dict) else data
+    if not isinstance(updates, list) or not updates:
+        return jsonify({'error': 'A non-empty list of updates is required'}), 400
+    
+    # Later updates for the same subtopic win
+    confidence_dict = {}
+    for update in updates:
+        try:
+            if isinstance(update, dict):
+                subtopic_id = int(update['subtopic_id'])
+                confidence_level = int(update['confidence_level'])
+                priority = update.get('priority')
+            else:
+                subtopic_id, confidence_level = int(update[0]), int(update[1])
+                priority = update[2] if len(update) > 2 else None
+        except (KeyError, IndexError, TypeError, ValueError):
+            return jsonify({'error': f'Invalid update: {update}'}), 400
+        
+        # Validate confidence level (1-5)
+        if confidence_level < 1 or confidence_level > 5:
+            return jsonify({'error': 'Confidence level must be between 1 and 5'}), 400
+        
+        confidence_dict[subtopic_id] = (confidence_level, None if priority is None else bool(priority))
+    
+    topic_confidences = upsert_subtopic_confidences(current_user.id, confidence_dict)
+    
+    return jsonify({
+        'success': True,
+        'updated': len(confidence_dict),
+        'topic_confidences': [
+            {
+                'topic_id': tc.topic_id,
+                'confidence_percent': tc.confidence_percent,
+                'last_updated': tc.last_updated.isoformat() if tc.last_updated else None
+            }
+            for tc in topic_confidences
+        ]
+    })
+
 @confidence_bp.route('/user/topic/<int:topic_id>', methods=['GET'])
 @login_required
 def topic_confidence(topic_id):
@@ -138,23 +203,17 @@ def topic_confidence(topic_id):
 @login_required
 def initialize_confidence():
     """Initialize confidence data for all subjects, topics, and subtopics."""
-    user_id = current_user.id
-    
-    # Get all subtopics
-    subtopics = Subtopic.query.all()
-    
-    # Create default confidence for each subtopic
-    for subtopic in subtopics:
-        SubtopicConfidence.get_or_create(user_id, subtopic.id)
+    from app.utils.confidence_utils import initialize_confidences
+    from app.utils.curriculum_index import get_curriculum_index
     
-    # Get all topics
-    topics = Topic.query.all()
+    # Two set-based statements in one transaction
+    initialize_confidences([current_user.id])
     
-    # Create topic confidence records
-    for topic in topics:
-        TopicConfidence.update_for_topic(topic.id, user_id)
+    index = get_curriculum_index()
+    subtopic_count = len(index.subtopics)
+    topic_count = len(index.topics)
     
     return jsonify({
         'success': True,
-        'message': f'Initialized confidence data for {len(subtopics)} subtopics and {len(topics)} topics'
+        'message': f'Initialized confidence data for {subtopic_count} subtopics and {topic_count} topics'
     })
@@ -2,6 +2,8 @@ from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from app import db
 from app.models.curriculum import Subject, Topic, Subtopic
+from app.utils.curriculum_index import get_curriculum_index
+from app.utils.cache_utils import serialized_response
 
 # Create API blueprint for curriculum
 curriculum_bp = Blueprint('curriculum_api', __name__, url_prefix='/api/curriculum')
@@ -10,7 +12,8 @@ curriculum_bp = Blueprint('curriculum_api', __name__, url_prefix='/api/curriculu
 @login_required
 def get_subjects():
     """API endpoint to get all subjects."""
-    subjects = Subject.query.all()
+    index = get_curriculum_index()
+    subjects = index.subjects
     
     # Filter out duplicates based on course codes
     unique_subjects = {}
@@ -71,7 +74,7 @@ def get_subjects():
                 'id': subject.id,
                 'title': subject.title,
                 'description': subject.description,
-                'topic_count': len(subject.topics)
+                'topic_count': index.topic_count(subject.id)
             }
             for subject in filtered_subjects
         ]
@@ -81,13 +84,14 @@ def get_subjects():
 @login_required
 def get_topics(subject_id):
     """API endpoint to get topics for a subject."""
-    topics = Topic.query.filter_by(subject_id=subject_id).all()
+    index = get_curriculum_index()
+    topics = index.get_topics(subject_id)
     
     if not topics:
         return jsonify({'topics': []})
     
     # Get the subject title
-    subject = Subject.query.get(subject_id)
+    subject = index.get_subject(subject_id)
     
     # Filter out specific Psychology topics with 0 subtopics
     if subject and subject.title == "Psychology":
@@ -104,7 +108,7 @@ def get_topics(subject_id):
             'name': topic.name,
             'title': topic.title,
             'description': topic.description,
-            'subtopics_count': len(topic.subtopics)
+            'subtopics_count': index.subtopic_count(topic.id)
         })
     
     return jsonify({'topics': result})
@@ -113,7 +117,7 @@ def get_topics(subject_id):
 @login_required
 def get_subtopics(topic_id):
     """API endpoint to get subtopics for a topic."""
-    subtopics = Subtopic.query.filter_by(topic_id=topic_id).all()
+    subtopics = get_curriculum_index().get_subtopics(topic_id)
     
     if not subtopics:
         return jsonify({'subtopics': []})
@@ -129,6 +133,28 @@ def get_subtopics(topic_id):
     
     return jsonify({'subtopics': result})
 
+@curriculum_bp.route('/hierarchy')
+@login_required
+def get_curriculum_hierarchy():
+    """
+    Get the curriculum hierarchy for custom task creation.
+    The JSON is encoded once per curriculum version (per subject for
+    ?subject_id= slices) and served pre-compressed with a strong ETag.
+    """
+    from flask import current_app
+    
+    index = get_curriculum_index()
+    subject_id = request.args.get('subject_id', type=int)
+    
+    if subject_id is not None and index.get_subject(subject_id) is None:
+        return jsonify({'success': False, 'message': 'Subject not found'}), 404
+    
+    payload = index.serialized(('hierarchy', subject_id), lambda: {
+        'success': True,
+        'hierarchy': index.hierarchy(subject_id)
+    })
+    return serialized_response(payload, max_age=current_app.config.get('CURRICULUM_CACHE_MAX_AGE', 86400))
+
 @curriculum_bp.route('/search')
 @login_required
 def search_curriculum():
@@ -137,14 +163,16 @@ def search_curriculum():
     if not query or len(query) < 2:
         return jsonify({'results': []})
     
+    index = get_curriculum_index()
+    
     # Search subjects
-    subjects = Subject.query.filter(Subject.title.ilike(f'%{query}%')).all()
+    subjects = [s for s in index.subjects if query in s.title.lower()]
     
     # Search topics
-    topics = Topic.query.filter(Topic.title.ilike(f'%{query}%')).all()
+    topics = [t for t in index.topics if query in t.title.lower()]
     
     # Search subtopics
-    subtopics = Subtopic.query.filter(Subtopic.title.ilike(f'%{query}%')).all()
+    subtopics = [st for st in index.subtopics if query in st.title.lower()]
     
     results = {
         'subjects': [{'id': s.id, 'title': s.title} for s in subjects],
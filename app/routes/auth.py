@@ -3,6 +3,8 @@ from flask_login import login_user, logout_user, current_user, login_required
 from app import db, bcrypt
 from app.models.user import User
 from app.models.task import TaskType, TaskTypePreference
+from app.utils.preference_matrix import invalidate_preference_matrix
+from app.utils.task_type_registry import get_task_type_registry
 
 # Create blueprint
 auth_bp = Blueprint('auth', __name__)
@@ -86,7 +88,7 @@ def register():
         db.session.commit()
         
         # Initialize task type preferences
-        task_types = TaskType.query.all()
+        task_types = get_task_type_registry().all()
         for task_type in task_types:
             # Create global preference for this task type
             preference = TaskTypePreference(
@@ -97,6 +99,7 @@ def register():
             db.session.add(preference)
         
         db.session.commit()
+        invalidate_preference_matrix(user.id)
         
         flash('Account created successfully! Please log in.', 'success')
         return redirect(url_for('auth.login'))
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, jsonify, current_app
 from flask_login import login_required, current_user
 from app import db
 from app.models.curriculum import Subject, Topic, Subtopic
+from app.utils.curriculum_index import get_curriculum_index
 
 # Create a blueprint for curriculum routes
 curriculum = Blueprint('curriculum', __name__)
@@ -18,16 +19,16 @@ def view_curriculum():
 @login_required
 def get_subjects():
     """API endpoint to get all subjects."""
-    subjects = Subject.query.all()
+    index = get_curriculum_index()
     return jsonify({
         'subjects': [
             {
                 'id': subject.id,
                 'title': subject.title,
                 'description': subject.description,
-                'topic_count': len(subject.topics)
+                'topic_count': index.topic_count(subject.id)
             }
-            for subject in subjects
+            for subject in index.subjects
         ]
     })
 
@@ -35,7 +36,8 @@ def get_subjects():
 @login_required
 def get_topics(subject_id):
     """API endpoint to get topics for a subject."""
-    topics = Topic.query.filter_by(subject_id=subject_id).all()
+    index = get_curriculum_index()
+    topics = index.get_topics(subject_id)
     
     if not topics:
         return jsonify({'topics': []})
@@ -47,7 +49,7 @@ def get_topics(subject_id):
                 'name': topic.name,
                 'title': topic.title,
                 'description': topic.description,
-                'subtopics_count': len(topic.subtopics)
+                'subtopics_count': index.subtopic_count(topic.id)
             }
             for topic in topics
         ]
@@ -57,7 +59,7 @@ def get_topics(subject_id):
 @login_required
 def get_subtopics(topic_id):
     """API endpoint to get subtopics for a topic."""
-    subtopics = Subtopic.query.filter_by(topic_id=topic_id).all()
+    subtopics = get_curriculum_index().get_subtopics(topic_id)
     
     if not subtopics:
         return jsonify({'subtopics': []})
@@ -81,14 +83,16 @@ def search_curriculum():
     if not query or len(query) < 2:
         return jsonify({'results': []})
     
+    index = get_curriculum_index()
+    
     # Search subjects
-    subjects = Subject.query.filter(Subject.title.ilike(f'%{query}%')).all()
+    subjects = [s for s in index.subjects if query in s.title.lower()]
     
     # Search topics
-    topics = Topic.query.filter(Topic.title.ilike(f'%{query}%')).all()
+    topics = [t for t in index.topics if query in t.title.lower()]
     
     # Search subtopics
-    subtopics = Subtopic.query.filter(Subtopic.title.ilike(f'%{query}%')).all()
+    subtopics = [st for st in index.subtopics if query in st.title.lower()]
     
     results = {
         'subjects': [{'id': s.id, 'title': s.title} for s in subjects],
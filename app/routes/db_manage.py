@@ -11,6 +11,8 @@ from app import db
 from app.utils.curriculum_importer import import_curriculum_data
 from app.models.task import TaskType
 from app.utils.database_helpers import fill_database
+from app.utils.curriculum_index import invalidate_curriculum_index
+from app.utils.task_type_registry import refresh_task_type_registry
 
 # Create blueprint
 db_manage_bp = Blueprint('db_manage', __name__, url_prefix='/db')
@@ -227,6 +229,8 @@ def _apply_db(filename):
     # Apply the cached database
     try:
         shutil.copy2(cache_path, db_path)
+        invalidate_curriculum_index()
+        refresh_task_type_registry()
         flash(f'Database "{filename}" applied successfully (backup created as "{backup_filename}")', 'success')
         
         # Check if we need to restart the app
@@ -451,6 +455,8 @@ def initialize_db():
         app = create_app()
         with app.app_context():
             create_tables()
+            refresh_task_type_registry()
+        invalidate_curriculum_index()
         
         flash('Database initialized successfully with empty tables', 'success')
     except Exception as e:
@@ -470,6 +476,7 @@ def repair_database():
         
         # Create default task types
         TaskType.create_default_types()
+        refresh_task_type_registry()
         
         flash('Database repaired successfully: tables and default task types created', 'success')
         
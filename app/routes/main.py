@@ -1,14 +1,19 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, session, jsonify
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
+from sqlalchemy.orm import selectinload
 from app import db
 from app.models.curriculum import Subject, Topic, Subtopic, Exam
 from app.models.task import Task, TaskType, TaskTypePreference
-from app.utils.task_generator import generate_task_for_subject, get_subject_distribution_for_week
-from app.utils.analytics_utils import prepare_analytics_data, get_chart_data_for_dashboard
+from app.utils.task_generator import get_subject_distribution_for_week
+from app.utils.analytics_utils import prepare_analytics_data, get_chart_data_for_dashboard, get_task_aggregates
+from app.utils.curriculum_index import get_curriculum_index
 from app.utils.optimization_utils import get_optimized_subject_distribution, generate_tasks_in_batch
 from app.utils.optimization_tasks import generate_balanced_task_batch
-from app.utils.cache_utils import cache_response, add_cache_headers
+from app.utils.plan_pregeneration import generate_daily_plan
+from app.utils.preference_matrix import get_preference_matrix, invalidate_preference_matrix
+from app.utils.task_type_registry import get_task_type_registry
+from app.utils.cache_utils import cache_response, add_cache_headers, user_etag_response
 import os
 import random
 import stripe
@@ -22,10 +27,10 @@ main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
 @login_required
+@user_etag_response()  # Revalidated against the user's data version
 def index():
     """Main dashboard with daily tasks."""
-    response = _get_index_data()
-    return add_cache_headers(response, max_age=60)  # Short cache for dynamic dashboard
+    return _get_index_data()
 
 def _get_index_data():
     """Get data for the index page - separate function to support caching."""
@@ -46,23 +51,11 @@ def _get_index_data():
         Task.completed_at.isnot(None)
     ).order_by(Task.completed_at.desc()).limit(3).all()
     
-    # Generate tasks if none exist
+    # Plans are normally pre-generated off-peak; only generate live if today's is missing
     if not active_tasks and not completed_tasks:
         try:
-            # Get all subjects
-            all_subjects = Subject.query.all()
-            
-            # If we have more than 3 subjects, randomly pick 3 different ones
-            random.shuffle(all_subjects)
-            subject_sample = all_subjects[:min(3, len(all_subjects))]
-            
-            # Try to generate tasks for each selected subject
-            new_tasks = []
-            
-            for subject in subject_sample:
-                task = generate_task_for_subject(current_user, subject.id)
-                if task:
-                    new_tasks.append(task)
+            # Try to generate tasks for three random subjects in a single commit
+            new_tasks = generate_daily_plan(current_user, today)
             
             # If we successfully generated tasks, use them
             if new_tasks:
@@ -106,6 +99,7 @@ def _get_index_data():
 
 @main_bp.route('/calendar')
 @login_required
+@user_etag_response(cache_body=True)
 def calendar():
     """Calendar view with exam dates."""
     # Get month/year from query parameters for navigation, default to current
@@ -186,46 +180,34 @@ def curriculum():
 
 @main_bp.route('/progress')
 @login_required
+@user_etag_response(cache_body=True)
 def progress():
     """View progress and statistics with advanced analytics."""
-    # Get basic task stats
-    total_tasks = Task.query.filter_by(user_id=current_user.id).count()
-    completed_tasks = Task.query.filter(
-        Task.user_id == current_user.id,
-        Task.completed_at.isnot(None)
-    ).count()
+    # Get basic task stats (one grouped query, shared with the analytics below)
+    aggregates = get_task_aggregates(current_user.id)
+    total_tasks = aggregates.total
+    completed_tasks = aggregates.completed
     
     # Calculate completion percentage
-    completion_percentage = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+    completion_percentage = aggregates.completion_rate
     
     # Get subject breakdown
-    subjects = Subject.query.all()
     subject_stats = {}
     
-    for subject in subjects:
-        subject_total = Task.query.filter_by(
-            user_id=current_user.id,
-            subject_id=subject.id
-        ).count()
-        
-        subject_completed = Task.query.filter(
-            Task.user_id == current_user.id,
-            Task.subject_id == subject.id,
-            Task.completed_at.isnot(None)
-        ).count()
-        
-        subject_percentage = (subject_completed / subject_total * 100) if subject_total > 0 else 0
-        
+    for subject in get_curriculum_index().subjects:
+        counts = aggregates.subject(subject.id)
         subject_stats[subject.id] = {
             'name': subject.title,
-            'total': subject_total,
-            'completed': subject_completed,
-            'percentage': subject_percentage
+            'total': counts.total,
+            'completed': counts.completed,
+            'percentage': aggregates.subject_percentage(subject.id)
         }
     
     # Get recent tasks (last 10)
     recent_tasks = Task.query.filter_by(
         user_id=current_user.id
+    ).options(
+        selectinload(Task.subject), selectinload(Task.task_type)
     ).order_by(Task.created_at.desc()).limit(10).all()
     
     # Get advanced analytics data
@@ -267,7 +249,7 @@ def settings():
             current_user.weekend_study_hours = max(0, min(12, weekend_hours))
         
         # Update task type preferences
-        task_types = TaskType.query.all()
+        task_types = get_task_type_registry().all()
         subjects = Subject.query.all()
         
         # Process global preferences
@@ -295,7 +277,7 @@ def settings():
         for subject in subjects:
             # Check if Uplearn is enabled for this subject
             uplearn_enabled = request.form.get(f'uplearn_subject_{subject.id}') == 'on'
-            uplearn_type = TaskType.query.filter_by(name='uplearn').first()
+            uplearn_type = get_task_type_registry().get_by_name('uplearn')
             
             if uplearn_type:
                 # Get or create preference
@@ -321,11 +303,12 @@ def settings():
         current_user.dark_mode = dark_mode
         
         db.session.commit()
+        invalidate_preference_matrix(current_user.id)
         flash('Settings updated successfully', 'success')
         return redirect(url_for('main.settings'))
     
     # Get task types
-    task_types = TaskType.query.all()
+    task_types = get_task_type_registry().all()
     
     # Get subjects - filter out duplicates
     subjects_query = Subject.query.all()
@@ -382,33 +365,22 @@ def settings():
     # Convert dictionary to list for template
     subjects = list(unique_subjects.values())
     
-    # Get task type preferences
+    # Get task type preferences from the cached matrix
+    preferences = get_preference_matrix(current_user.id)
     global_preferences = {}
     subject_preferences = {}
     
     for task_type in task_types:
         # Get global preference
-        preference = TaskTypePreference.query.filter_by(
-            user_id=current_user.id,
-            task_type_id=task_type.id,
-            subject_id=None
-        ).first()
-        
-        global_preferences[task_type.id] = preference.is_enabled if preference else True
+        global_preferences[task_type.id] = preferences.is_globally_enabled(task_type.id)
         
         # Get subject-specific preferences
         if task_type.name == 'uplearn':
             for subject in subjects:
-                preference = TaskTypePreference.query.filter_by(
-                    user_id=current_user.id,
-                    task_type_id=task_type.id,
-                    subject_id=subject.id
-                ).first()
-                
                 if subject.id not in subject_preferences:
                     subject_preferences[subject.id] = {}
                 
-                subject_preferences[subject.id][task_type.id] = preference.is_enabled if preference else False
+                subject_preferences[subject.id][task_type.id] = preferences.is_enabled_for_subject(task_type.id, subject.id)
     
     return render_template('main/settings.html',
                            task_types=task_types,
@@ -419,6 +391,7 @@ def settings():
 
 @main_bp.route('/pomodoro')
 @login_required
+@user_etag_response()
 def pomodoro():
     """Pomodoro timer with task integration."""
     # Get today's active tasks
@@ -463,7 +436,7 @@ def first_login_setup():
             # For now, we'll just note this in the UI and not enforce it in the backend
         
         # Process task type preferences
-        task_types = TaskType.query.all()
+        task_types = get_task_type_registry().all()
         for task_type in task_types:
             enabled = request.form.get(f'task_type_{task_type.id}') == 'on'
             
@@ -488,6 +461,7 @@ def first_login_setup():
         # We would handle this in a more advanced implementation
         
         db.session.commit()
+        invalidate_preference_matrix(current_user.id)
         
         # Mark setup as complete
         session['setup_complete'] = True
@@ -497,7 +471,7 @@ def first_login_setup():
     
     # Get subjects and task types for the form
     subjects = Subject.query.all()
-    task_types = TaskType.query.all()
+    task_types = get_task_type_registry().all()
     
     return render_template('main/first_login_setup.html',
                            subjects=subjects,
@@ -5,7 +5,6 @@ document.addEventListener('DOMContentLoaded', function() {
     initProgressBar();
     initConfidenceBars();
     renderCharts();
-    initConfidenceChangeText();
 });
 
 /**
@@ -23,27 +22,6 @@ function initConfidenceBars() {
     });
 }
 
-/**
- * Initialize confidence change text by populating it dynamically to avoid CSS validation issues
- */
-function initConfidenceChangeText() {
-    // For the confidence text in the overview section
-    const overviewConfidenceText = document.querySelector('#confidence-change-text');
-    if (overviewConfidenceText) {
-        const direction = overviewConfidenceText.getAttribute('data-change-dir');
-        const value = overviewConfidenceText.getAttribute('data-change-val');
-        overviewConfidenceText.textContent = `${direction === 'increase' ? 'Improving' : 'Declining'} by ${value}% over last 90 days`;
-    }
-    
-    // For the confidence text in the learning rate section
-    const learningConfidenceText = document.querySelector('#confidence-change-text[data-direction]');
-    if (learningConfidenceText) {
-        const direction = learningConfidenceText.getAttribute('data-direction');
-        const value = learningConfidenceText.getAttribute('data-value');
-        learningConfidenceText.textContent = `Your confidence has ${direction} by ${value}% over the last 90 days.`;
-    }
-}
-
 /**
  * Initialize tab navigation
  */
@@ -99,17 +77,9 @@ function renderCharts() {
         renderConfidenceDistributionChart(chartData.confidenceDistribution);
     }
     
-    if (chartData.confidenceTrend) {
-        renderConfidenceTrendChart(chartData.confidenceTrend);
-    }
-    
     if (chartData.subjectPerformance) {
         renderSubjectPerformanceChart(chartData.subjectPerformance);
     }
-    
-    if (chartData.forgettingCurve) {
-        renderForgettingCurveChart(chartData.forgettingCurve);
-    }
 }
 
 /**
@@ -196,31 +166,6 @@ function renderConfidenceDistributionChart(data) {
     });
 }
 
-/**
- * Render the confidence trend line chart
- */
-function renderConfidenceTrendChart(data) {
-    const confidenceTrendCtx = document.getElementById('confidence-trend-chart').getContext('2d');
-    const confidenceTrendChart = new Chart(confidenceTrendCtx, {
-        type: 'line',
-        data: data,
-        options: {
-            responsive: true,
-            maintainAspectRatio: true,
-            scales: {
-                y: {
-                    beginAtZero: false,
-                    min: 1,
-                    max: 5,
-                    ticks: {
-                        stepSize: 1
-                    }
-                }
-            }
-        }
-    });
-}
-
 /**
  * Render the subject performance bar chart
  */
@@ -244,26 +189,3 @@ function renderSubjectPerformanceChart(data) {
         }
     });
 }
-
-/**
- * Render the forgetting curve line chart
- */
-function renderForgettingCurveChart(data) {
-    const forgettingCurveCtx = document.getElementById('forgetting-curve-chart').getContext('2d');
-    const forgettingCurveChart = new Chart(forgettingCurveCtx, {
-        type: 'line',
-        data: data,
-        options: {
-            responsive: true,
-            maintainAspectRatio: true,
-            scales: {
-                y: {
-                    title: {
-                        display: true,
-                        text: 'Confidence Change'
-                    }
-                }
-            }
-        }
-    });
-}
@@ -1,6 +1,7 @@
 # Import utility modules for easy access
 from app.utils.task_generator import (
     generate_task_for_subject,
+    generate_tasks,
     generate_replacement_task,
     select_weighted_topic,
     add_subtopics_to_task,
@@ -1,13 +1,11 @@
 """
 Analytics utilities for the Timetable app.
-Provides basic analytics features without confidence tracking.
+Provides task and confidence analytics for the progress page.
 """
 
-from datetime import datetime, timedelta
-from sqlalchemy import text, func, desc
-from app import db
-from app.models.curriculum import Subject, Topic, Subtopic
-from app.models.task import Task, TaskSubtopic
+from app.utils.curriculum_index import get_curriculum_index
+from app.utils.task_analytics import get_task_aggregates, get_task_series
+from app.utils.confidence_analytics import ConfidenceAnalytics
 
 def prepare_analytics_data(user_id):
     """
@@ -19,34 +17,29 @@ def prepare_analytics_data(user_id):
     Returns:
         Dictionary with analytics data
     """
-    # Get task completion stats
-    total_tasks = Task.query.filter_by(user_id=user_id).count()
-    completed_tasks = Task.query.filter(
-        Task.user_id == user_id,
-        Task.completed_at.isnot(None)
-    ).count()
+    # Get task completion stats (one grouped query, shared with the rest of the request)
+    aggregates = get_task_aggregates(user_id)
+    total_tasks = aggregates.total
+    completed_tasks = aggregates.completed
     
     # Calculate completion rate
-    completion_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+    completion_rate = aggregates.completion_rate
+    
+    # Confidence statistics (one query for the ratings, one grouped query for subject averages)
+    confidence = ConfidenceAnalytics(user_id)
+    subject_confidence = confidence.get_subject_averages()
+    average_confidence = confidence.get_average_confidence()
     
     # Get subject breakdown
-    subjects = Subject.query.all()
+    index = get_curriculum_index()
     subject_stats = []
     subject_analytics = []
     
-    for subject in subjects:
-        subject_total = Task.query.filter_by(
-            user_id=user_id,
-            subject_id=subject.id
-        ).count()
-        
-        subject_completed = Task.query.filter(
-            Task.user_id == user_id,
-            Task.subject_id == subject.id,
-            Task.completed_at.isnot(None)
-        ).count()
-        
-        subject_percentage = (subject_completed / subject_total * 100) if subject_total > 0 else 0
+    for subject in index.subjects:
+        counts = aggregates.subject(subject.id)
+        subject_total = counts.total
+        subject_completed = counts.completed
+        subject_percentage = aggregates.subject_percentage(subject.id)
         
         subject_stats.append({
             'name': subject.title,
@@ -64,9 +57,9 @@ def prepare_analytics_data(user_id):
         elif subject_percentage >= 40:
             mastery_level = "Intermediate"
             
-        # Generate a random confidence score between 2 and 4.5 for demonstration
-        import random
-        avg_confidence = round(random.uniform(2, 4.5), 1)
+        # Average rated confidence (0 when nothing in the subject is rated)
+        subject_average = subject_confidence.get(subject.id)
+        avg_confidence = round(subject_average.average, 1) if subject_average else 0
         
         subject_analytics.append({
             'subject_title': subject.title,
@@ -76,36 +69,18 @@ def prepare_analytics_data(user_id):
         })
     
     # Calculate tasks per week
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_tasks = Task.query.filter(
-        Task.user_id == user_id,
-        Task.created_at >= thirty_days_ago
-    ).count()
-    
-    tasks_per_week = (recent_tasks / 30) * 7
-    
-    # Generate mock recommendations
-    recommendations = []
-    subtopics = Subtopic.query.limit(5).all()
-    
-    for i, subtopic in enumerate(subtopics):
-        topic = Topic.query.get(subtopic.topic_id)
-        subject = Subject.query.get(topic.subject_id) if topic else None
-        
-        if subject:
-            import random
-            confidence_level = random.randint(1, 3) if i < 3 else random.randint(3, 5)
-            days_since = random.randint(3, 30) if i > 0 else None
-            
-            recommendations.append({
-                'subtopic': subtopic.title,
-                'topic': topic.title,
-                'subject': subject.title,
-                'confidence_level': confidence_level,
-                'days_since_last_review': days_since,
-                'recommended_review': confidence_level < 3 or (days_since and days_since > 14),
-                'priority': i < 2
-            })
+    tasks_per_week = aggregates.tasks_per_week
+    
+    # Review recommendations ranked by (7 - level)² x staleness
+    recommendations = [{
+        'subtopic': rec['subtopic'].title,
+        'topic': rec['topic'].title if rec['topic'] else '',
+        'subject': rec['subject'].title if rec['subject'] else '',
+        'confidence_level': rec['confidence_level'],
+        'days_since_last_review': rec['days_since_last_review'],
+        'recommended_review': rec['recommended_review'],
+        'priority': rec['priority']
+    } for rec in confidence.get_priority_recommendations(limit=5)]
     
     return {
         'overview': {
@@ -113,31 +88,15 @@ def prepare_analytics_data(user_id):
             'completed_tasks': completed_tasks,
             'completion_rate': completion_rate,
             'tasks_per_week': tasks_per_week,
-            'average_confidence': 3.7,
-            'subtopics_tracked': 42
+            'average_confidence': round(average_confidence, 1) if average_confidence is not None else 0,
+            'subtopics_tracked': len(confidence.rows)
         },
         'subjects': subject_analytics,
         'subject_stats': subject_stats,
-        'learning': {
-            'rate': {
-                'learning_rate_monthly': 0.4,
-                'confidence_change': 0.8,
-                'confidence_change_percent': 12,
-                'first_period_average': 3.2,
-                'second_period_average': 4.0
-            },
-            'optimal_review_intervals': {
-                'short_term': 3,
-                'medium_term': 10,
-                'long_term': 21
-            }
-        },
         'efficiency': {
             'completed_tasks': completed_tasks,
             'completion_rate': round(completion_rate),
-            'tasks_per_week': round(tasks_per_week, 1),
-            'effectiveness_rate': 85,
-            'avg_confidence_gain': 0.3
+            'tasks_per_week': round(tasks_per_week, 1)
         },
         'recommendations': recommendations
     }
@@ -153,25 +112,14 @@ def get_chart_data_for_dashboard(user_id):
         Dictionary with chart data
     """
     # Get subject data for chart
-    subjects = Subject.query.all()
+    aggregates = get_task_aggregates(user_id)
     subject_labels = []
     subject_data = []
     
-    for subject in subjects:
-        subject_total = Task.query.filter_by(
-            user_id=user_id,
-            subject_id=subject.id
-        ).count()
-        
-        subject_completed = Task.query.filter(
-            Task.user_id == user_id,
-            Task.subject_id == subject.id,
-            Task.completed_at.isnot(None)
-        ).count()
-        
-        if subject_total > 0:
+    for subject in get_curriculum_index().subjects:
+        if aggregates.subject(subject.id).total > 0:
             subject_labels.append(subject.title)
-            subject_data.append(subject_completed / subject_total * 100)
+            subject_data.append(aggregates.subject_percentage(subject.id))
     
     # Create subject performance chart
     subject_chart = {
@@ -183,35 +131,13 @@ def get_chart_data_for_dashboard(user_id):
         }]
     }
     
-    # Create weekly task completion chart
-    now = datetime.utcnow()
-    labels = []
-    completed_data = []
-    total_data = []
-    
-    for i in range(7):
-        day = now - timedelta(days=6-i)
-        day_start = datetime(day.year, day.month, day.day, 0, 0, 0)
-        day_end = datetime(day.year, day.month, day.day, 23, 59, 59)
-        
-        # Format day label (e.g., "Mon", "Tue", etc.)
-        day_label = day.strftime('%a')
-        labels.append(day_label)
-        
-        # Count tasks for this day
-        day_total = Task.query.filter(
-            Task.user_id == user_id,
-            Task.created_at.between(day_start, day_end)
-        ).count()
-        
-        day_completed = Task.query.filter(
-            Task.user_id == user_id,
-            Task.created_at.between(day_start, day_end),
-            Task.completed_at.isnot(None)
-        ).count()
-        
-        total_data.append(day_total)
-        completed_data.append(day_completed)
+    # Create weekly task completion chart (one grouped query for the 7 days)
+    series = get_task_series(user_id, days=7)
+    
+    # Format day labels (e.g., "Mon", "Tue", etc.)
+    labels = [point.start.strftime('%a') for point in series]
+    total_data = [point.created for point in series]
+    completed_data = [point.completed for point in series]
     
     # Create weekly task completion chart
     weekly_chart = {
@@ -230,7 +156,21 @@ def get_chart_data_for_dashboard(user_id):
         ]
     }
     
+    # Create confidence distribution chart (rated subtopics per level)
+    distribution = ConfidenceAnalytics(user_id).get_level_distribution()
+    confidence_chart = {
+        'labels': [f'Level {level}' for level in distribution],
+        'datasets': [{
+            'data': list(distribution.values()),
+            'backgroundColor': [
+                'rgba(244, 67, 54, 0.7)', 'rgba(255, 152, 0, 0.7)', 'rgba(255, 235, 59, 0.7)',
+                'rgba(139, 195, 74, 0.7)', 'rgba(76, 175, 80, 0.7)'
+            ]
+        }]
+    }
+    
     return {
+        'confidenceDistribution': confidence_chart,
         'subjectPerformance': subject_chart,
         'weeklyCompletion': weekly_chart
     }
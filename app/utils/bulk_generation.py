@@ -0,0 +1,286 @@
+"""
+Bulk multi-user task generation for nightly runs.
+Loads the inputs for a chunk of users in a few set-based queries, plans their
+tasks with plan_subject_task (the planner build_task_for_subject uses),
+optionally in a pool of spawned processes, and writes every Task and
+TaskSubtopic row with bulk inserts.
+"""
+
+import os
+import random
+import time
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from sqlalchemy import insert
+from app import db
+from app.utils.cache_invalidation import tag_session, user_tasks_tag
+from app.utils.daily_stats import record_inserted_tasks
+from app.utils.curriculum_index import CurriculumIndex, get_curriculum_index
+from app.utils.plan_pregeneration import PLAN_SUBJECT_COUNT
+from app.utils.preference_matrix import load_preference_matrices
+from app.utils.task_type_registry import get_task_type_registry
+from app.utils.task_planning import plan_subject_task
+from app.utils.task_subtopic_utils import get_task_duration
+from app.utils.topic_recency import RECENCY_DAYS, clear_topic_recency
+from app.utils.weighted_sampler import WeightedSampler, confidence_weight, topic_weight
+
+# Everything the planner needs for one user, as plain picklable data
+UserInputs = namedtuple('UserInputs', [
+    'user_id', 'study_hours_per_day', 'weekend_study_hours',
+    'preferences',          # PreferenceMatrix
+    'topic_confidence',     # topic_id -> confidence percent
+    'subtopic_confidence',  # subtopic_id -> confidence level
+    'planned_topic_ids',    # topics already planned on the day
+    'completed_topic_ids'   # topics completed in the look-back window
+])
+
+# Planner state inside pool workers (set once per worker by _init_worker)
+_worker_index = None
+_worker_task_types = None
+
+
+def load_user_inputs(user_ids, due_date):
+    """
+    Load planner inputs for a chunk of users with five set-based queries.
+
+    Args:
+        user_ids: List of user IDs
+        due_date: Day being planned
+
+    Returns:
+        Tuple of (list of UserInputs for users without a plan, set of user IDs that already have one)
+    """
+    from app.models.user import User
+    from app.models.task import Task
+    from app.models.confidence import TopicConfidence, SubtopicConfidence
+
+    users = db.session.query(
+        User.id, User.study_hours_per_day, User.weekend_study_hours
+    ).filter(User.id.in_(user_ids)).order_by(User.id).all()
+
+    preferences = load_preference_matrices(user_ids)
+
+    topic_confidence = {user_id: {} for user_id in user_ids}
+    for user_id, topic_id, percent in db.session.query(
+        TopicConfidence.user_id, TopicConfidence.topic_id, TopicConfidence.confidence_percent
+    ).filter(TopicConfidence.user_id.in_(user_ids)).all():
+        topic_confidence[user_id][topic_id] = percent
+
+    subtopic_confidence = {user_id: {} for user_id in user_ids}
+    for user_id, subtopic_id, level in db.session.query(
+        SubtopicConfidence.user_id, SubtopicConfidence.subtopic_id, SubtopicConfidence.confidence_level
+    ).filter(SubtopicConfidence.user_id.in_(user_ids)).all():
+        subtopic_confidence[user_id][subtopic_id] = level
+
+    # Recent tasks give both the recency sets and the users already planned
+    planned_users = set()
+    planned_topic_ids = {user_id: set() for user_id in user_ids}
+    completed_topic_ids = {user_id: set() for user_id in user_ids}
+    for user_id, topic_id, task_due, completed_at in db.session.query(
+        Task.user_id, Task.topic_id, Task.due_date, Task.completed_at
+    ).filter(
+        Task.user_id.in_(user_ids),
+        Task.due_date >= due_date - timedelta(days=RECENCY_DAYS),
+        Task.due_date <= due_date
+    ).all():
+        if task_due == due_date:
+            planned_users.add(user_id)
+            planned_topic_ids[user_id].add(topic_id)
+        if completed_at is not None:
+            completed_topic_ids[user_id].add(topic_id)
+
+    inputs = [
+        UserInputs(
+            user_id, study_hours, weekend_hours,
+            preferences[user_id],
+            topic_confidence[user_id], subtopic_confidence[user_id],
+            planned_topic_ids[user_id], completed_topic_ids[user_id]
+        )
+        for user_id, study_hours, weekend_hours in users
+        if user_id not in planned_users
+    ]
+    return inputs, planned_users
+
+
+def _draw_topic(topics, inputs, planned, rng):
+    """Weighted topic draw avoiding topics planned that day, then recently completed ones."""
+    sampler = WeightedSampler(
+        [t.id for t in topics],
+        [topic_weight(inputs.topic_confidence.get(t.id, 50.0)) for t in topics]
+    )
+    topic_id = sampler.sample(rng, exclude=planned)
+    if topic_id is None:
+        topic_id = sampler.sample(rng, exclude=inputs.completed_topic_ids)
+    if topic_id is None:
+        topic_id = sampler.sample(rng)
+    return next((t for t in topics if t.id == topic_id), None) or rng.choice(topics)
+
+
+def plan_user(inputs, index, task_types, due_date, rng):
+    """
+    Plan one user's tasks for a day without touching the database:
+    plan_subject_task for up to three random subjects, drawing topics and
+    ordering subtopics from the preloaded inputs.
+
+    Args:
+        inputs: UserInputs for the user
+        index: CurriculumIndex
+        task_types: Dictionary of task type ID -> name
+        due_date: Day being planned
+        rng: random.Random instance
+
+    Returns:
+        List of task dictionaries with a 'subtopics' list of (subtopic_id, duration)
+    """
+    duration = get_task_duration(inputs, due_date)
+    planned = set(inputs.planned_topic_ids)
+
+    def order_subtopics(topic, subtopics):
+        return sorted(subtopics, key=lambda s: confidence_weight(inputs.subtopic_confidence.get(s.id, 3)),
+                      reverse=True)
+
+    subjects = list(index.subjects)
+    rng.shuffle(subjects)
+
+    tasks = []
+    for subject in subjects[:PLAN_SUBJECT_COUNT]:
+        task = plan_subject_task(
+            subject, index, inputs.preferences, task_types,
+            draw_topic=lambda topics: _draw_topic(topics, inputs, planned, rng),
+            order_subtopics=order_subtopics,
+            duration=duration,
+            rng=rng
+        )
+        if not task:
+            continue
+
+        # Later subjects in the same plan avoid this topic
+        planned.add(task['topic_id'])
+
+        task.update(user_id=inputs.user_id, due_date=due_date)
+        tasks.append(task)
+    return tasks
+
+
+def _plan_chunk(inputs_list, due_date, seed, index=None, task_types=None):
+    """Plan a chunk of users; runs in a pool worker unless index/task_types are given."""
+    index = index or _worker_index
+    task_types = task_types or _worker_task_types
+    rng = random.Random(seed)
+    return [task for inputs in inputs_list for task in plan_user(inputs, index, task_types, due_date, rng)]
+
+
+def _init_worker(curriculum, task_types):
+    """Pool initializer: rebuild the curriculum index once per worker."""
+    global _worker_index, _worker_task_types
+    _worker_index = CurriculumIndex(*curriculum)
+    _worker_task_types = task_types
+
+
+def write_planned_tasks(planned_tasks):
+    """
+    Insert planned tasks and their subtopic links with two bulk statements
+    and one commit.
+
+    Args:
+        planned_tasks: List of task dictionaries from plan_user
+
+    Returns:
+        Number of tasks written
+    """
+    from app.models.task import Task, TaskSubtopic
+
+    if not planned_tasks:
+        return 0
+
+    task_rows = [{k: v for k, v in task.items() if k != 'subtopics'} for task in planned_tasks]
+    task_ids = db.session.scalars(
+        insert(Task).returning(Task.id, sort_by_parameter_order=True), task_rows
+    ).all()
+
+    link_rows = [
+        {'task_id': task_id, 'subtopic_id': subtopic_id, 'duration': duration}
+        for task_id, task in zip(task_ids, planned_tasks)
+        for subtopic_id, duration in task['subtopics']
+    ]
+    if link_rows:
+        db.session.execute(TaskSubtopic.__table__.insert(), link_rows)
+
+    # Bulk inserts bypass the flush listeners, so count the tasks and tag the users explicitly
+    record_inserted_tasks(db.session, task_rows)
+    tag_session(db.session, *{user_tasks_tag(task['user_id']) for task in planned_tasks})
+    db.session.commit()
+    return len(task_ids)
+
+
+def generate_plans_bulk(user_ids, due_date, chunk_size=200, max_workers=None):
+    """
+    Generate the plan for a day for many users at once. Users that already
+    have tasks on that day are skipped.
+
+    Args:
+        user_ids: List of user IDs
+        due_date: Day to plan
+        chunk_size: Users per load/plan/write chunk
+        max_workers: Planner processes (None = CPU count, 1 = plan in this process)
+
+    Returns:
+        Dictionary with users, generated, skipped, failed, tasks, seconds,
+        users_per_second and tasks_per_second
+    """
+    from flask import current_app
+
+    started = time.perf_counter()
+    stats = {'users': len(user_ids), 'generated': 0, 'skipped': 0, 'failed': 0, 'tasks': 0}
+
+    index = get_curriculum_index()
+    task_types = {entry.id: entry.name for entry in get_task_type_registry().all()}
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(chunks)))
+
+    def load(chunk):
+        inputs, planned_users = load_user_inputs(chunk, due_date)
+        stats['skipped'] += len(planned_users)
+        return inputs
+
+    def write(inputs, planned_tasks):
+        planned_user_ids = {task['user_id'] for task in planned_tasks}
+        try:
+            stats['tasks'] += write_planned_tasks(planned_tasks)
+            stats['generated'] += len(planned_user_ids)
+            stats['failed'] += len(inputs) - len(planned_user_ids)
+        except Exception as e:
+            db.session.rollback()
+            stats['failed'] += len(inputs)
+            current_app.logger.error(f"Error writing bulk plans: {str(e)}")
+        for user_inputs in inputs:
+            clear_topic_recency(user_inputs.user_id)
+
+    if max_workers == 1:
+        for chunk in chunks:
+            inputs = load(chunk)
+            write(inputs, _plan_chunk(inputs, due_date, random.getrandbits(64), index, task_types))
+    else:
+        # Spawned (not forked) workers don't inherit the app's threads, locks or
+        # open database connections
+        curriculum = (index.subjects, index.topics, index.subtopics)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(curriculum, task_types)) as executor:
+            # Load every chunk up front so workers plan while later chunks load
+            pending = []
+            for chunk in chunks:
+                inputs = load(chunk)
+                pending.append((inputs, executor.submit(_plan_chunk, inputs, due_date, random.getrandbits(64))))
+            for inputs, future in pending:
+                write(inputs, future.result())
+
+    elapsed = time.perf_counter() - started
+    stats['seconds'] = round(elapsed, 3)
+    stats['users_per_second'] = round(stats['users'] / elapsed, 1) if elapsed else 0.0
+    stats['tasks_per_second'] = round(stats['tasks'] / elapsed, 1) if elapsed else 0.0
+    return stats
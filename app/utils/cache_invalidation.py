@@ -0,0 +1,165 @@
+"""
+Tag-based cache invalidation.
+Cached entries carry tags (e.g. user:42:tasks, curriculum). Each tag has a
+version number that is folded into cache keys, so bumping a tag's version
+makes every entry carrying it unreachable. Versions are bumped by a
+SQLAlchemy listener after a commit that touched matching rows.
+
+Versions live in this process unless a shared store is configured (see
+shared_cache), in which case every worker reads and bumps the same versions.
+"""
+
+import secrets
+import threading
+from sqlalchemy import event
+
+CURRICULUM_TAG = 'curriculum'
+
+_tag_versions = {}
+_lock = threading.Lock()
+
+# In-process versions restart from 0 with the process; this tells the runs apart
+_process_epoch = secrets.randbits(62)
+
+# Shared store holding versions for every worker process, if configured
+_tag_store = None
+
+def configure_tag_store(store):
+    """Keep tag versions in a shared store (None goes back to in-process versions)."""
+    global _tag_store
+    _tag_store = store
+
+def user_tasks_tag(user_id):
+    """Tag for everything derived from a user's tasks."""
+    return f"user:{user_id}:tasks"
+
+def user_confidence_tag(user_id):
+    """Tag for everything derived from a user's confidence ratings."""
+    return f"user:{user_id}:confidence"
+
+def user_preferences_tag(user_id):
+    """Tag for everything derived from a user's settings and task-type preferences."""
+    return f"user:{user_id}:preferences"
+
+def user_data_tags(user_id):
+    """Every tag covering a user's own data."""
+    return [user_tasks_tag(user_id), user_confidence_tag(user_id), user_preferences_tag(user_id)]
+
+def get_tag_versions(tags):
+    """
+    Current versions of some tags, in the order given.
+
+    Args:
+        tags: Iterable of tag strings
+
+    Returns:
+        Tuple of (tag, version) pairs
+    """
+    if _tag_store is not None:
+        tags = list(tags)
+        versions = _tag_store.get_tag_versions(tags)
+        return tuple((tag, versions.get(tag, 0)) for tag in tags)
+
+    with _lock:
+        return tuple((tag, _tag_versions.get(tag, 0)) for tag in tags)
+
+def get_tag_epoch():
+    """
+    Identifier for the current run of tag versions.
+    Versions restart from 0 when the process restarts (or the shared store is
+    recreated), so anything sent to clients that is derived from versions alone,
+    like an ETag, must include the epoch as well.
+    """
+    if _tag_store is not None:
+        return _tag_store.epoch
+    return _process_epoch
+
+def invalidate_tags(*tags):
+    """Bump the version of each tag so entries cached under it stop matching."""
+    if not tags:
+        return
+    if _tag_store is not None:
+        _tag_store.bump_tags(tags)
+    else:
+        with _lock:
+            for tag in tags:
+                _tag_versions[tag] = _tag_versions.get(tag, 0) + 1
+
+    if CURRICULUM_TAG in tags:
+        from app.utils.curriculum_index import invalidate_curriculum_index
+        invalidate_curriculum_index()
+
+def get_user_data_version(user_id):
+    """
+    Version of a user's data: the sum of their tag versions, so it increases
+    on any write to their tasks, confidences or preferences.
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        Integer version
+    """
+    return sum(version for _, version in get_tag_versions(user_data_tags(user_id)))
+
+def tag_session(session, *tags):
+    """
+    Queue tags to invalidate when the session commits. Use this for writes the
+    flush listener can't see (Core or bulk ORM statements).
+    """
+    session.info.setdefault('cache_tags', set()).update(tags)
+
+def tags_for_object(obj):
+    """
+    Tags affected by a changed ORM object.
+
+    Returns:
+        List of tag strings (empty for untracked models)
+    """
+    from app.models.task import Task, TaskTypePreference
+    from app.models.user import User
+    from app.models.confidence import SubtopicConfidence, TopicConfidence, SubjectConfidence
+    from app.models.curriculum import Subject, Topic, Subtopic, Exam
+
+    if isinstance(obj, Task):
+        return [user_tasks_tag(obj.user_id)]
+    if isinstance(obj, (SubtopicConfidence, TopicConfidence, SubjectConfidence)):
+        return [user_confidence_tag(obj.user_id)]
+    if isinstance(obj, TaskTypePreference):
+        return [user_preferences_tag(obj.user_id)]
+    if isinstance(obj, User):
+        return [user_preferences_tag(obj.id)]
+    if isinstance(obj, (Subject, Topic, Subtopic, Exam)):
+        return [CURRICULUM_TAG]
+    return []
+
+def _after_flush(session, flush_context):
+    """Collect tags for every object written in this flush."""
+    tags = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tags.update(tags_for_object(obj))
+    if tags:
+        tag_session(session, *tags)
+
+def _after_commit(session):
+    """Invalidate the tags collected since the last commit."""
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        invalidate_tags(*tags)
+
+def _after_rollback(session):
+    """Discard tags for changes that were rolled back."""
+    session.info.pop('cache_tags', None)
+
+def register_cache_invalidation(session):
+    """
+    Attach the invalidation listeners to a session (or scoped session).
+
+    Args:
+        session: Session, sessionmaker or scoped_session to listen on
+    """
+    if event.contains(session, 'after_flush', _after_flush):
+        return
+    event.listen(session, 'after_flush', _after_flush)
+    event.listen(session, 'after_commit', _after_commit)
+    event.listen(session, 'after_rollback', _after_rollback)
@@ -1,10 +1,12 @@
 from functools import wraps
 from flask import make_response, request, current_app
 from app import cache
+from app.utils.cache_invalidation import get_tag_versions, get_tag_epoch, user_data_tags, CURRICULUM_TAG
+from datetime import datetime
 import hashlib
 import re
 
-def cache_response(timeout=None, key_prefix='view'):
+def cache_response(timeout=None, key_prefix='view', tags=None):
     """
     Cache response decorator that works with both API and HTML responses.
     Uses the request path and query parameters to build the cache key.
@@ -12,6 +14,8 @@ def cache_response(timeout=None, key_prefix='view'):
     Args:
         timeout: Cache timeout in seconds (defaults to app config)
         key_prefix: Prefix for the cache key
+        tags: List of invalidation tags, or a callable taking the view's
+              arguments and returning them; their versions are part of the key
     """
     def decorator(f):
         @wraps(f)
@@ -28,6 +32,12 @@ def cache_response(timeout=None, key_prefix='view'):
             # Create a cache key based on the full request path and args
             cache_key = key_prefix + ':' + request.full_path
             
+            # Fold tag versions into the key so invalidated entries are never read
+            if tags is not None:
+                tag_list = tags(*args, **kwargs) if callable(tags) else tags
+                versions = get_tag_versions(tag_list)
+                cache_key += ':' + ','.join(f"{tag}={version}" for tag, version in versions)
+            
             # Try to get the response from the cache
             response = cache.get(cache_key)
             
@@ -75,14 +85,151 @@ def add_cache_headers(response, max_age=None, etag=None):
     
     return response
 
+def serialized_response(payload, max_age=86400, mimetype='application/json'):
+    """
+    Serve a pre-encoded payload (see CurriculumIndex.serialized) with a strong
+    ETag, answering If-None-Match with 304 and sending the gzip body to clients
+    that accept it.
+    
+    Args:
+        payload: SerializedPayload with body, gzip_body and etag
+        max_age: Cache-Control max-age in seconds
+        mimetype: Response content type
+    
+    Returns:
+        Response object
+    """
+    use_gzip = payload.gzip_body is not None and request.accept_encodings['gzip'] > 0
+    # Each encoding is a different representation, so it needs its own strong ETag
+    etag = payload.etag + ('-gz' if use_gzip else '')
+    
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(payload.gzip_body if use_gzip else payload.body,
+                                              mimetype=mimetype)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = f'private, max-age={max_age}'
+    return response
+
+def _user_etag(user_id):
+    """
+    ETag for the current request as seen by a user, derived from data versions
+    instead of the rendered body: (route, query, user, user data version,
+    curriculum version, tag version epoch, today's date). The epoch keeps
+    versions that restarted from 0 from matching ETags issued before.
+    """
+    versions = get_tag_versions(user_data_tags(user_id) + [CURRICULUM_TAG])
+    user_version = sum(version for _, version in versions[:-1])
+    curriculum_version = versions[-1][1]
+    raw = repr((request.endpoint, request.full_path, user_id, user_version,
+                curriculum_version, get_tag_epoch(), datetime.utcnow().date().isoformat()))
+    return 'u' + hashlib.blake2b(raw.encode('utf-8'), digest_size=12).hexdigest()
+
+def user_etag_response(cache_body=False, timeout=None):
+    """
+    Per-user conditional GET decorator for authenticated views.
+    The ETag is computed from data versions before the view runs, so a request
+    whose If-None-Match still matches gets a 304 without querying or rendering.
+    
+    Args:
+        cache_body: Also keep rendered bodies in the cache, keyed by ETag, so
+                    a browser without the page gets it without a render
+        timeout: Body cache timeout in seconds (defaults to app config)
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            from flask import session
+            from flask_login import current_user
+            
+            # Only plain GETs by a logged-in user; pending flash messages must be rendered
+            if (request.method != 'GET' or not current_user.is_authenticated
+                    or session.get('_flashes')):
+                return f(*args, **kwargs)
+            
+            user_id = current_user.id
+            etag = _user_etag(user_id)
+            
+            # Weak comparison: the compression middleware weakens ETags of compressed bodies
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+            
+            cached_body = cache.get(f"user_view:{user_id}:{etag}") if cache_body else None
+            if cached_body is not None:
+                body, mimetype = cached_body
+                response = current_app.response_class(body, mimetype=mimetype)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                
+                # The view may have written (e.g. generated today's plan), so tag the
+                # response with the versions as they are now
+                etag = _user_etag(user_id)
+                if cache_body:
+                    timeout_value = timeout or current_app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+                    cache.set(f"user_view:{user_id}:{etag}", (response.get_data(), response.mimetype),
+                              timeout=timeout_value)
+            
+            response.set_etag(etag)
+            # Browsers must revalidate every time, which is cheap with the version ETag
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
 def cache_static_files(app, max_age=86400):  # Default 1 day
     """
     Configure the Flask app to cache static files.
     
+    When `flask build-static` has been run, url_for('static', ...) points at
+    the fingerprinted copies (if STATIC_FINGERPRINTING is on) and clients that
+    accept gzip get the precompressed .gz sibling of a file.
+    
     Args:
         app: Flask app instance
         max_age: Cache max-age in seconds for static files
     """
+    import os
+    import mimetypes
+    from flask import send_from_directory
+    from app.utils.compression import load_static_manifest
+    
+    manifest = load_static_manifest(app.static_folder) if app.config.get('STATIC_FINGERPRINTING') else {}
+    
+    if manifest:
+        @app.url_defaults
+        def fingerprint_static_urls(endpoint, values):
+            if endpoint == 'static' and values.get('filename') in manifest:
+                values['filename'] = manifest[values['filename']]
+    
+    serve_original = app.view_functions.get('static')
+    
+    if serve_original is not None:
+        def serve_static(filename):
+            # Prefer a precompressed sibling that is at least as new as the file
+            path = os.path.join(app.static_folder, filename)
+            gz_path = path + '.gz'
+            if (request.accept_encodings['gzip'] > 0 and os.path.isfile(gz_path)
+                    and os.path.isfile(path) and os.path.getmtime(gz_path) >= os.path.getmtime(path)):
+                response = send_from_directory(app.static_folder, filename + '.gz',
+                                               mimetype=mimetypes.guess_type(filename)[0])
+                response.headers['Content-Encoding'] = 'gzip'
+            else:
+                response = serve_original(filename=filename)
+            response.vary.add('Accept-Encoding')
+            return response
+        
+        app.view_functions['static'] = serve_static
+    
     @app.after_request
     def add_cache_headers_to_static(response):
         # Check if the request is for a static file
@@ -97,4 +244,4 @@ def cache_static_files(app, max_age=86400):  # Default 1 day
         
         return response
     
-    return app 
\ No newline at end of file
+    return app
@@ -0,0 +1,224 @@
+"""
+Response compression.
+Negotiates gzip (or zstd when the zstandard package is installed) for dynamic
+responses above a size threshold, and builds precompressed, fingerprinted
+copies of the static assets for cache_static_files to serve.
+"""
+
+import os
+import gzip
+import re
+import json
+import hashlib
+import shutil
+import posixpath
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content types worth compressing (images other than SVG are already compressed)
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'text/xml',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'
+}
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.svg', '.html', '.txt', '.xml'}
+
+# Fingerprinted copies go in static/dist/, listed in static/dist/manifest.json
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+FINGERPRINT_LENGTH = 12
+
+def _accepts(encoding):
+    """Whether the current request accepts a content coding."""
+    from flask import request
+    return request.accept_encodings[encoding] > 0
+
+def compress_body(data, encoding, level=6):
+    """
+    Compress bytes with a content coding.
+
+    Args:
+        data: Raw body
+        encoding: 'gzip' or 'zstd'
+        level: Compression level
+
+    Returns:
+        Compressed bytes
+    """
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def init_compression(app):
+    """
+    Compress dynamic responses for clients that accept it.
+
+    Responses are skipped when they are streamed or file-backed, already
+    encoded, not a compressible type, or smaller than COMPRESS_MIN_SIZE.
+
+    Args:
+        app: Flask app instance
+    """
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    level = app.config.get('COMPRESS_LEVEL', 6)
+
+    @app.after_request
+    def compress_response(response):
+        if not app.config.get('COMPRESS_ENABLED', True):
+            return response
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        # The representation depends on Accept-Encoding even when sent uncompressed
+        response.vary.add('Accept-Encoding')
+
+        if zstandard is not None and _accepts('zstd'):
+            encoding = 'zstd'
+        elif _accepts('gzip'):
+            encoding = 'gzip'
+        else:
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        response.set_data(compress_body(data, encoding, level))
+        response.headers['Content-Encoding'] = encoding
+
+        # Bytes differ from the identity encoding, so a strong ETag must become weak
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    return app
+
+# CSS references to other files: @import 'x.css', @import url(x.css) and url(x.png)
+CSS_REFERENCE = re.compile(
+    r"""(@import\s+)(['"])([^'"]+)\2|url\(\s*(['"]?)([^'")\s]+)\4\s*\)"""
+)
+
+def _content_hash(data):
+    """Short content hash of some bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()[:FINGERPRINT_LENGTH]
+
+def _write_gzip(path, level=9):
+    """Write a precompressed .gz sibling, keeping it only if it's smaller."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    compressed = gzip.compress(data, compresslevel=level, mtime=0)
+    if len(compressed) >= len(data):
+        return False
+    with open(path + '.gz', 'wb') as f:
+        f.write(compressed)
+    return True
+
+def _resolve_reference(relative, target):
+    """
+    Static-relative path a CSS reference points at, or None for external,
+    absolute, data: and fragment-only references.
+    """
+    if not target or target.startswith(('data:', '#', '/', 'http:', 'https:')) or '://' in target:
+        return None
+    path = target.split('#', 1)[0].split('?', 1)[0]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(relative), path))
+
+def build_static(static_folder):
+    """
+    Write fingerprinted copies of every static asset to static/dist/ (with a
+    manifest mapping original names to them) and precompressed .gz siblings
+    for compressible originals and copies.
+
+    CSS @import and url() references to other static files are rewritten to
+    their fingerprinted names, and dependencies are fingerprinted first, so a
+    stylesheet's hash changes whenever anything it imports changes.
+
+    Args:
+        static_folder: Path to the app's static folder
+
+    Returns:
+        Dictionary with files (fingerprinted) and compressed counts and the manifest
+    """
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist_folder):
+        shutil.rmtree(dist_folder)
+
+    sources = {}
+    for root, dirs, files in os.walk(static_folder):
+        # Don't descend into previous build output
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist_folder]
+        for name in files:
+            if not name.endswith('.gz'):
+                source = os.path.join(root, name)
+                sources[os.path.relpath(source, static_folder).replace(os.sep, '/')] = source
+
+    manifest = {}
+    building = set()
+
+    def fingerprint(relative):
+        """Fingerprint a file (its dependencies first) and return its dist name."""
+        if relative in manifest:
+            return manifest[relative]
+        building.add(relative)
+
+        with open(sources[relative], 'rb') as f:
+            data = f.read()
+
+        if relative.lower().endswith('.css'):
+            text = data.decode('utf-8')
+
+            def rewrite(match):
+                target = match.group(3) if match.group(3) is not None else match.group(5)
+                dependency = _resolve_reference(relative, target)
+                # Unknown files and import cycles keep their original reference
+                if dependency not in sources or dependency in building:
+                    return match.group(0)
+                fingerprinted = posixpath.relpath(fingerprint(dependency), posixpath.dirname(f"{DIST_DIR}/{relative}"))
+                suffix = target[len(target.split('#', 1)[0].split('?', 1)[0]):]
+                return match.group(0).replace(target, fingerprinted + suffix, 1)
+
+            data = CSS_REFERENCE.sub(rewrite, text).encode('utf-8')
+
+        stem, ext = os.path.splitext(relative)
+        fingerprinted = f"{DIST_DIR}/{stem}.{_content_hash(data)}{ext}"
+        target = os.path.join(static_folder, *fingerprinted.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        shutil.copystat(sources[relative], target)
+
+        building.discard(relative)
+        manifest[relative] = fingerprinted
+        return fingerprinted
+
+    compressed = 0
+    for relative in sorted(sources):
+        fingerprinted = fingerprint(relative)
+        if os.path.splitext(relative)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            compressed += _write_gzip(sources[relative])
+            compressed += _write_gzip(os.path.join(static_folder, *fingerprinted.split('/')))
+
+    with open(os.path.join(dist_folder, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return {'files': len(manifest), 'compressed': compressed, 'manifest': manifest}
+
+def load_static_manifest(static_folder):
+    """
+    Load the manifest written by build_static.
+
+    Returns:
+        Dictionary of original filename -> fingerprinted filename (empty if not built)
+    """
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
@@ -0,0 +1,151 @@
+"""
+Confidence analytics.
+Loads all of a user's subtopic confidences with one projection query (topic
+and subject details come from the curriculum index), ranks review priorities
+with a heap-based top-k and reads per-subject averages from the materialized
+subject totals, so latency stays flat even for users who have rated every subtopic.
+"""
+
+import heapq
+from collections import namedtuple
+from datetime import datetime
+from app import db
+from app.models.confidence import SubtopicConfidence, SubjectConfidence
+from app.utils.optimization_cache import cached
+from app.utils.cache_invalidation import user_confidence_tag
+from app.utils.curriculum_index import get_curriculum_index
+from app.utils.weighted_sampler import confidence_weight
+
+# One rated subtopic
+ConfidenceRow = namedtuple('ConfidenceRow', ['subtopic_id', 'confidence_level', 'last_updated', 'priority'])
+
+# Per-subject average confidence level (1-5) and number of rated subtopics
+SubjectAverage = namedtuple('SubjectAverage', ['average', 'count'])
+
+# Ratings older than this are recommended for review
+REVIEW_AFTER_DAYS = 14
+
+@cached(timeout_seconds=3600, namespace='confidence_rows',
+        tags=lambda user_id: [user_confidence_tag(user_id)])
+def load_confidence_rows(user_id):
+    """
+    Load a user's subtopic confidences with one projection query.
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        Tuple of ConfidenceRow
+    """
+    return tuple(ConfidenceRow(*row) for row in db.session.query(
+        SubtopicConfidence.subtopic_id, SubtopicConfidence.confidence_level,
+        SubtopicConfidence.last_updated, SubtopicConfidence.priority
+    ).filter(SubtopicConfidence.user_id == user_id).all())
+
+@cached(timeout_seconds=3600, namespace='subject_confidence',
+        tags=lambda user_id: [user_confidence_tag(user_id)])
+def load_subject_confidence(user_id):
+    """
+    Average confidence level per subject, read from one SubjectConfidence row each.
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        Dictionary of subject_id -> SubjectAverage (subjects with rated subtopics only)
+    """
+    rows = db.session.query(
+        SubjectConfidence.subject_id, SubjectConfidence.level_sum, SubjectConfidence.level_count
+    ).filter(
+        SubjectConfidence.user_id == user_id,
+        SubjectConfidence.level_count > 0
+    ).all()
+
+    return {subject_id: SubjectAverage(level_sum / level_count, level_count)
+            for subject_id, level_sum, level_count in rows}
+
+class ConfidenceAnalytics:
+    """Confidence statistics and review recommendations for one user."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._rows = None
+
+    @property
+    def rows(self):
+        """The user's rated subtopics (loaded once per instance)."""
+        if self._rows is None:
+            self._rows = load_confidence_rows(self.user_id)
+        return self._rows
+
+    @staticmethod
+    def _days_since(row, now):
+        """Whole days since a rating was last updated, or None if unknown."""
+        if row.last_updated is None:
+            return None
+        return max(0, (now - row.last_updated).days)
+
+    @classmethod
+    def priority_score(cls, row, now):
+        """
+        Review priority: (7 - level)² weighted by staleness (1 + weeks since
+        the rating was updated); never-dated ratings count as one month old.
+        """
+        days = cls._days_since(row, now)
+        staleness = 1 + (days if days is not None else 30) / 7
+        return confidence_weight(row.confidence_level or 3) * staleness
+
+    def get_priority_recommendations(self, limit=5, now=None):
+        """
+        Top subtopics to review, highest priority first (O(n log limit)).
+
+        Args:
+            limit: Maximum number of recommendations
+            now: Reference time (defaults to now)
+
+        Returns:
+            List of dictionaries with subtopic, topic and subject entries,
+            confidence_level, days_since_last_review, priority, recommended_review and score
+        """
+        now = now or datetime.utcnow()
+        index = get_curriculum_index()
+
+        top = heapq.nlargest(limit, (
+            (self.priority_score(row, now), row) for row in self.rows
+            if index.get_subtopic(row.subtopic_id) is not None
+        ), key=lambda item: item[0])
+
+        recommendations = []
+        for score, row in top:
+            subtopic = index.get_subtopic(row.subtopic_id)
+            topic = index.get_topic(subtopic.topic_id)
+            days = self._days_since(row, now)
+            recommendations.append({
+                'subtopic': subtopic,
+                'topic': topic,
+                'subject': index.get_subject(topic.subject_id) if topic else None,
+                'confidence_level': row.confidence_level,
+                'days_since_last_review': days,
+                'priority': bool(row.priority),
+                'recommended_review': (row.confidence_level or 3) < 3 or days is None or days > REVIEW_AFTER_DAYS,
+                'score': score
+            })
+        return recommendations
+
+    def get_subject_averages(self):
+        """Average confidence level per subject: subject_id -> SubjectAverage."""
+        return load_subject_confidence(self.user_id)
+
+    def get_average_confidence(self):
+        """Average confidence level (1-5) over every rated subtopic, or None."""
+        if not self.rows:
+            return None
+        return sum(row.confidence_level or 3 for row in self.rows) / len(self.rows)
+
+    def get_level_distribution(self):
+        """Number of rated subtopics at each confidence level: {1: n, ..., 5: n}."""
+        distribution = {level: 0 for level in range(1, 6)}
+        for row in self.rows:
+            if row.confidence_level in distribution:
+                distribution[row.confidence_level] += 1
+        return distribution
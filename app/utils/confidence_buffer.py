@@ -0,0 +1,243 @@
+"""
+Write-behind buffer for confidence edits.
+Slider drags and priority taps arrive as bursts of small writes, each of which
+would take the SQLite write lock. When CONFIDENCE_WRITE_BEHIND_ENABLED is set,
+those writes are coalesced per (user, subtopic) for CONFIDENCE_WRITE_BEHIND_WINDOW
+seconds and then written by a background thread in one transaction.
+
+Pending writes are flushed synchronously when the same user makes any other
+request (read-your-writes), when the buffer grows past
+CONFIDENCE_WRITE_BEHIND_MAX_PENDING, and at interpreter shutdown. The buffer is
+per process, so a read served by another worker can lag by up to one window.
+"""
+
+import atexit
+import threading
+import time
+
+# Endpoints whose writes go through the buffer (they don't flush it)
+BUFFERED_ENDPOINTS = {
+    'api.update_subtopic_confidence',
+    'api.set_subtopic_priority',
+    'api.update_topic_confidence'
+}
+
+# Longest wait (seconds) before retrying a failed background flush
+MAX_RETRY_DELAY = 30
+
+# Buffer for this process (None when write-behind is disabled)
+_buffer = None
+_buffer_lock = threading.Lock()
+
+class ConfidenceWriteBuffer:
+    """Coalesces subtopic confidence updates and flushes them in batches."""
+
+    def __init__(self, app, window_seconds=0.5, max_pending=500):
+        self.app = app
+        self.window_seconds = window_seconds
+        self.max_pending = max_pending
+        self._pending = {}  # user_id -> {subtopic_id: (confidence_level, priority)}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time, so a sync flush waits for the writer
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.stats = {'submitted': 0, 'coalesced': 0, 'flushes': 0, 'written': 0, 'failures': 0}
+
+    def submit(self, user_id, updates):
+        """
+        Queue updates for a user, merging them over any pending ones.
+
+        Args:
+            user_id: User ID
+            updates: Dictionary of {subtopic_id: (confidence_level, priority)};
+                None keeps the pending (or stored) value
+        """
+        with self._lock:
+            pending = self._pending.setdefault(user_id, {})
+            for subtopic_id, (confidence_level, priority) in updates.items():
+                self.stats['submitted'] += 1
+                previous = pending.get(subtopic_id)
+                if previous is None:
+                    self._size += 1
+                else:
+                    self.stats['coalesced'] += 1
+                    confidence_level = previous[0] if confidence_level is None else confidence_level
+                    priority = previous[1] if priority is None else priority
+                pending[subtopic_id] = (confidence_level, priority)
+            full = self._size >= self.max_pending
+
+        if full:
+            self.flush()
+        else:
+            self._start()
+            self._wakeup.set()
+
+    def has_pending(self, user_id):
+        """Whether a user has writes waiting in the buffer."""
+        with self._lock:
+            return user_id in self._pending
+
+    def _take(self, user_ids=None):
+        """Remove and return pending updates (all users, or only some)."""
+        with self._lock:
+            if user_ids is None:
+                taken, self._pending = self._pending, {}
+            else:
+                taken = {uid: self._pending.pop(uid) for uid in user_ids if uid in self._pending}
+            self._size -= sum(len(updates) for updates in taken.values())
+            return taken
+
+    def _requeue(self, taken):
+        """Put back updates from a failed flush, under anything submitted since."""
+        with self._lock:
+            for user_id, updates in taken.items():
+                pending = self._pending.setdefault(user_id, {})
+                for subtopic_id, update in updates.items():
+                    if subtopic_id not in pending:
+                        pending[subtopic_id] = update
+                        self._size += 1
+
+    def flush(self, user_ids=None):
+        """
+        Write pending updates in one transaction.
+
+        Args:
+            user_ids: Only flush these users (None for everyone)
+
+        Returns:
+            Number of subtopic confidences written
+        """
+        from app import db
+        from app.utils.confidence_utils import write_subtopic_confidences, refresh_topic_weights
+
+        with self._flush_lock:
+            taken = self._take(user_ids)
+            if not taken:
+                return 0
+
+            with self.app.app_context():
+                try:
+                    topic_ids = {user_id: write_subtopic_confidences(user_id, updates)
+                                 for user_id, updates in taken.items()}
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    self._requeue(taken)
+                    self.stats['failures'] += 1
+                    self.app.logger.error(f"Error flushing confidence updates: {str(e)}")
+                    return 0
+
+                for user_id, changed in topic_ids.items():
+                    refresh_topic_weights(user_id, changed)
+
+            written = sum(len(updates) for updates in taken.values())
+            self.stats['flushes'] += 1
+            self.stats['written'] += written
+            return written
+
+    def _start(self):
+        """Start the background writer on first use (and after a fork)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with _buffer_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='confidence-write-behind', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        retries = 0
+        while True:
+            self._wakeup.wait()
+            # Let the burst settle so it coalesces into one write
+            time.sleep(self.window_seconds)
+            self._wakeup.clear()
+            failures = self.stats['failures']
+            self.flush()
+            if self.stats['failures'] == failures:
+                retries = 0
+                continue
+
+            # The failed updates were requeued; retry them after a growing delay
+            retries += 1
+            time.sleep(min(self.window_seconds * 2 ** retries, MAX_RETRY_DELAY))
+            self._wakeup.set()
+
+def get_confidence_buffer():
+    """The process's write-behind buffer, or None when it is disabled."""
+    return _buffer
+
+def submit_confidence_updates(user_id, updates):
+    """
+    Queue confidence updates when write-behind is enabled, else write them now.
+
+    Args:
+        user_id: User ID
+        updates: Dictionary of {subtopic_id: (confidence_level, priority)};
+            None keeps the current value
+
+    Returns:
+        True if the updates were buffered, False if they were written directly
+    """
+    buffer = get_confidence_buffer()
+    if buffer is None:
+        from app.utils.confidence_utils import upsert_subtopic_confidences
+        upsert_subtopic_confidences(user_id, updates)
+        return False
+    buffer.submit(user_id, updates)
+    return True
+
+def flush_confidence_updates(user_id=None):
+    """
+    Write a user's (or everyone's) buffered updates now.
+
+    Returns:
+        Number of subtopic confidences written
+    """
+    buffer = get_confidence_buffer()
+    if buffer is None:
+        return 0
+    return buffer.flush([user_id] if user_id is not None else None)
+
+def init_confidence_buffer(app):
+    """
+    Enable write-behind confidence updates when CONFIDENCE_WRITE_BEHIND_ENABLED is set.
+
+    Registers a before_request hook that flushes the current user's pending
+    writes before anything else they request (except more buffered writes),
+    and a shutdown flush.
+
+    Args:
+        app: Flask app instance
+
+    Returns:
+        The ConfidenceWriteBuffer, or None when disabled
+    """
+    global _buffer
+
+    if not app.config.get('CONFIDENCE_WRITE_BEHIND_ENABLED'):
+        with _buffer_lock:
+            _buffer = None
+        return None
+
+    buffer = ConfidenceWriteBuffer(
+        app,
+        window_seconds=app.config.get('CONFIDENCE_WRITE_BEHIND_WINDOW', 0.5),
+        max_pending=app.config.get('CONFIDENCE_WRITE_BEHIND_MAX_PENDING', 500)
+    )
+    @app.before_request
+    def flush_pending_confidence():
+        from flask import request
+        from flask_login import current_user
+
+        if request.endpoint in BUFFERED_ENDPOINTS or request.endpoint == 'static':
+            return None
+        if current_user.is_authenticated and buffer.has_pending(current_user.id):
+            buffer.flush([current_user.id])
+        return None
+
+    atexit.register(buffer.flush)
+
+    with _buffer_lock:
+        _buffer = buffer
+    return buffer
@@ -0,0 +1,374 @@
+"""
+Running confidence totals for every level of the curriculum tree.
+TopicConfidence rows carry the sum and count of the confidence levels of every
+subtopic under the topic (so a Psychology paper rolls up its categories), and
+SubjectConfidence rows do the same for a whole subject. An after_flush listener
+turns every created, changed or deleted SubtopicConfidence into (sum, count)
+deltas for its topic, the topic's ancestors and its subject, and upserts them
+together with the recomputed percentages, so a rating change costs a constant
+number of small writes however big the tree is. rebuild_confidence_totals
+recomputes every node from scratch in one grouped pass and repairs any drift.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, func, inspect, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Level an unrated subtopic counts at
+DEFAULT_LEVEL = 3
+
+# SubtopicConfidence attributes that change which nodes a row counts in, or what it adds
+_TRACKED_ATTRS = ('user_id', 'subtopic_id', 'confidence_level')
+
+# Node kinds with materialized totals
+NODE_KINDS = ('topic', 'subject')
+
+def topic_percent(level_sum, level_count, subtopic_count, default_level=DEFAULT_LEVEL):
+    """
+    Confidence percentage from a node's subtopic level totals, counting unrated
+    subtopics at the default level (1/5 = 0%, 3/5 = 50%, 5/5 = 100%).
+    Works on plain numbers and on SQL column expressions.
+
+    Args:
+        level_sum: Sum of the rated subtopics' levels
+        level_count: Number of rated subtopics
+        subtopic_count: Number of subtopics under the node (must be a number)
+        default_level: Level unrated subtopics count at
+
+    Returns:
+        Percentage (0.0 for a node without subtopics)
+    """
+    if not subtopic_count:
+        return 0.0
+    mean = (level_sum + default_level * (subtopic_count - level_count)) / subtopic_count
+    return (mean - 1) / 4.0 * 100.0
+
+def _model(kind):
+    """Totals model and node id column name for a node kind."""
+    from app.models.confidence import TopicConfidence, SubjectConfidence
+
+    if kind == 'subject':
+        return SubjectConfidence, 'subject_id'
+    return TopicConfidence, 'topic_id'
+
+def subtopic_count(connection, kind, node_id):
+    """
+    Number of subtopics under a topic (nested topics included) or a subject,
+    from the curriculum index, else the database.
+    """
+    from app.models.curriculum import Subtopic, Topic
+    from app.utils.curriculum_index import get_curriculum_index
+
+    index = get_curriculum_index()
+    if kind == 'subject':
+        count = index.subject_subtopic_count(node_id)
+        query = select(func.count(Subtopic.id)).join(Topic, Subtopic.topic_id == Topic.id).where(Topic.subject_id == node_id)
+    else:
+        count = index.subtree_subtopic_count(node_id)
+        # Walk parent_topic_id down from the node, as the index's subtree count does
+        subtree = select(Topic.id).where(Topic.id == node_id).cte('subtree', recursive=True)
+        subtree = subtree.union(select(Topic.id).where(Topic.parent_topic_id == subtree.c.id))
+        query = select(func.count(Subtopic.id)).where(Subtopic.topic_id.in_(select(subtree.c.id)))
+    if count:
+        return count
+    return connection.execute(query).scalar() or 0
+
+def _node_path(index, topic_id, subject_id):
+    """Nodes a subtopic of a topic counts in: the topic, its ancestors and its subject."""
+    return [('topic', node_id) for node_id in (topic_id,) + index.get_ancestor_ids(topic_id)] + [('subject', subject_id)]
+
+def _nodes(connection, subtopic_ids):
+    """
+    Map subtopic ids to the nodes they count in: [('topic', id), ..., ('subject', id)].
+    Unindexed subtopics fall back to the database (their topic and subject only).
+    """
+    from app.models.curriculum import Subtopic, Topic
+    from app.utils.curriculum_index import get_curriculum_index
+
+    index = get_curriculum_index()
+    topics = {}
+    missing = []
+    for subtopic_id in set(subtopic_ids):
+        subtopic = index.get_subtopic(subtopic_id)
+        topic = index.get_topic(subtopic.topic_id) if subtopic is not None else None
+        if topic is not None:
+            topics[subtopic_id] = (topic.id, topic.subject_id)
+        elif subtopic_id is not None:
+            missing.append(subtopic_id)
+    if missing:
+        for subtopic_id, topic_id, subject_id in connection.execute(
+            select(Subtopic.id, Topic.id, Topic.subject_id)
+            .join(Topic, Subtopic.topic_id == Topic.id)
+            .where(Subtopic.id.in_(missing))
+        ):
+            topics[subtopic_id] = (topic_id, subject_id)
+
+    return {subtopic_id: _node_path(index, topic_id, subject_id)
+            for subtopic_id, (topic_id, subject_id) in topics.items()}
+
+def _current_values(confidence):
+    """Tracked values including the pending changes."""
+    return {name: getattr(confidence, name) for name in _TRACKED_ATTRS}
+
+def _previous_values(confidence):
+    """Tracked values as they were before the pending changes."""
+    state = inspect(confidence)
+    values = {}
+    for name in _TRACKED_ATTRS:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        else:
+            values[name] = None
+    return values
+
+def confidence_deltas(connection, changes):
+    """
+    Group subtopic level changes into per-node deltas.
+
+    Args:
+        connection: Connection in the current transaction
+        changes: Iterable of (values, sign) where values has user_id, subtopic_id
+            and confidence_level, and sign is 1 (added) or -1 (removed)
+
+    Returns:
+        Dictionary of (kind, user_id, node_id) -> [level_sum delta, level_count delta]
+    """
+    changes = list(changes)
+    nodes = _nodes(connection, [values['subtopic_id'] for values, sign in changes])
+
+    deltas = defaultdict(lambda: [0, 0])
+    for values, sign in changes:
+        if values['user_id'] is None:
+            continue
+        level = values['confidence_level']
+        for kind, node_id in nodes.get(values['subtopic_id'], ()):
+            row = deltas[(kind, values['user_id'], node_id)]
+            row[0] += sign * (level if level is not None else DEFAULT_LEVEL)
+            row[1] += sign
+    return deltas
+
+def apply_confidence_deltas(connection, deltas):
+    """
+    Upsert level deltas into topic_confidences and subject_confidences,
+    recomputing each percentage from the new totals in the same statement
+    (one statement per node).
+
+    Args:
+        connection: Connection in the current transaction
+        deltas: Dictionary of (kind, user_id, node_id) -> [level_sum delta, level_count delta]
+    """
+    now = datetime.utcnow()
+    for (kind, user_id, node_id), (level_sum, level_count) in deltas.items():
+        if not level_sum and not level_count:
+            continue
+        model, node_column = _model(kind)
+        table = model.__table__
+        count = subtopic_count(connection, kind, node_id)
+        stmt = sqlite_insert(table).values({
+            'user_id': user_id, node_column: node_id, 'level_sum': level_sum, 'level_count': level_count,
+            'confidence_percent': topic_percent(level_sum, level_count, count), 'last_updated': now
+        })
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c[node_column]],
+            set_={
+                'level_sum': table.c.level_sum + stmt.excluded.level_sum,
+                'level_count': table.c.level_count + stmt.excluded.level_count,
+                'confidence_percent': topic_percent(
+                    table.c.level_sum + stmt.excluded.level_sum,
+                    table.c.level_count + stmt.excluded.level_count,
+                    count
+                ),
+                'last_updated': stmt.excluded.last_updated
+            }
+        ))
+
+def _after_flush(session, flush_context):
+    """Turn the SubtopicConfidence rows written by this flush into node deltas."""
+    from app.models.confidence import SubtopicConfidence
+
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, SubtopicConfidence):
+            changes.append((_current_values(obj), 1))
+    for obj in session.dirty:
+        if isinstance(obj, SubtopicConfidence) and session.is_modified(obj, include_collections=False):
+            changes.append((_previous_values(obj), -1))
+            changes.append((_current_values(obj), 1))
+    for obj in session.deleted:
+        if isinstance(obj, SubtopicConfidence):
+            changes.append((_previous_values(obj), -1))
+
+    if changes:
+        connection = session.connection()
+        apply_confidence_deltas(connection, confidence_deltas(connection, changes))
+
+def _keep_previous(target, value, oldvalue, initiator):
+    """No-op set listener; registering it with active_history loads the old value first."""
+
+def register_confidence_rollup(session):
+    """
+    Attach the totals listener to a session (or scoped session).
+
+    Args:
+        session: Session, sessionmaker or scoped_session to listen on
+    """
+    from app.models.confidence import SubtopicConfidence
+
+    if not event.contains(session, 'after_flush', _after_flush):
+        event.listen(session, 'after_flush', _after_flush)
+
+    # An expired attribute (e.g. after a commit) is overwritten without loading
+    # it, which would leave _previous_values nothing to subtract
+    for name in _TRACKED_ATTRS:
+        attribute = getattr(SubtopicConfidence, name)
+        if not event.contains(attribute, 'set', _keep_previous):
+            event.listen(attribute, 'set', _keep_previous, active_history=True)
+
+def rebuild_confidence_totals(user_ids=None, fix=True):
+    """
+    Recompute every topic and subject total in one pass: a single grouped query
+    per (user, topic), rolled up through the curriculum index to parent topics
+    and subjects, then compared (with the percentage) against the stored rows.
+    Doesn't commit.
+
+    Args:
+        user_ids: Only rebuild these users (None for everyone)
+        fix: Rewrite drifted or missing rows
+
+    Returns:
+        Dictionary with checked, mismatched and fixed counts, the number of
+        topic and subject rows written, and the ids of the users whose rows changed
+    """
+    from app import db
+    from app.models.confidence import SubtopicConfidence
+    from app.models.curriculum import Subtopic, Topic
+    from app.utils.curriculum_index import get_curriculum_index
+
+    leaves = db.session.query(
+        SubtopicConfidence.user_id, Subtopic.topic_id, Topic.subject_id,
+        func.sum(func.coalesce(SubtopicConfidence.confidence_level, DEFAULT_LEVEL)),
+        func.count(SubtopicConfidence.id)
+    ).join(
+        Subtopic, SubtopicConfidence.subtopic_id == Subtopic.id
+    ).join(
+        Topic, Subtopic.topic_id == Topic.id
+    ).group_by(SubtopicConfidence.user_id, Subtopic.topic_id, Topic.subject_id)
+    if user_ids is not None:
+        leaves = leaves.filter(SubtopicConfidence.user_id.in_(user_ids))
+
+    # Roll the per-topic totals up to every ancestor and the subject
+    index = get_curriculum_index()
+    actual = defaultdict(lambda: [0, 0])
+    for user_id, topic_id, subject_id, level_sum, level_count in leaves:
+        for kind, node_id in _node_path(index, topic_id, subject_id):
+            row = actual[(kind, user_id, node_id)]
+            row[0] += level_sum
+            row[1] += level_count
+
+    stored = {}
+    for kind in NODE_KINDS:
+        model, node_column = _model(kind)
+        query = db.session.query(
+            model.user_id, getattr(model, node_column), model.level_sum, model.level_count, model.confidence_percent
+        )
+        if user_ids is not None:
+            query = query.filter(model.user_id.in_(user_ids))
+        for user_id, node_id, level_sum, level_count, percent in query:
+            stored[(kind, user_id, node_id)] = (level_sum, level_count, percent)
+
+    connection = db.session.connection()
+    counts = {}
+    rows = {kind: [] for kind in NODE_KINDS}
+    keys = actual.keys() | stored.keys()
+    for key in keys:
+        kind, user_id, node_id = key
+        level_sum, level_count = actual.get(key, (0, 0))
+        if (kind, node_id) not in counts:
+            counts[(kind, node_id)] = subtopic_count(connection, kind, node_id)
+        percent = topic_percent(level_sum, level_count, counts[(kind, node_id)])
+        current = stored.get(key)
+        if (current is not None and current[0] == level_sum and current[1] == level_count
+                and current[2] is not None and abs(current[2] - percent) < 1e-6):
+            continue
+        rows[kind].append({'user_id': user_id, _model(kind)[1]: node_id, 'level_sum': level_sum,
+                           'level_count': level_count, 'confidence_percent': percent})
+
+    mismatched = sum(len(kind_rows) for kind_rows in rows.values())
+    result = {'checked': len(keys), 'mismatched': mismatched, 'fixed': 0,
+              'topics': 0, 'subjects': 0, 'user_ids': set()}
+    if not mismatched or not fix:
+        return result
+
+    now = datetime.utcnow()
+    for kind, kind_rows in rows.items():
+        if not kind_rows:
+            continue
+        model, node_column = _model(kind)
+        table = model.__table__
+        stmt = sqlite_insert(table)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c[node_column]],
+            set_={
+                'level_sum': stmt.excluded.level_sum,
+                'level_count': stmt.excluded.level_count,
+                'confidence_percent': stmt.excluded.confidence_percent,
+                'last_updated': stmt.excluded.last_updated
+            }
+        ), [dict(row, last_updated=now) for row in kind_rows])
+        result[kind + 's'] = len(kind_rows)
+        result['user_ids'].update(row['user_id'] for row in kind_rows)
+
+    result['fixed'] = mismatched
+    return result
+
+def verify_confidence_totals(user_id=None, fix=True):
+    """
+    Recompute every topic and subject total from scratch and repair any drift.
+
+    Args:
+        user_id: Only check this user (None for everyone)
+        fix: Rewrite drifted or missing rows
+
+    Returns:
+        Dictionary with checked, mismatched and fixed counts
+    """
+    from app import db
+    from app.utils.cache_invalidation import tag_session, user_confidence_tag
+    from app.utils.weighted_sampler import clear_user_samplers
+
+    result = rebuild_confidence_totals([user_id] if user_id is not None else None, fix=fix)
+    user_ids = result.pop('user_ids')
+    if not user_ids:
+        return result
+
+    # Core statements bypass the flush listeners, so tag the users explicitly
+    tag_session(db.session, *[user_confidence_tag(uid) for uid in user_ids])
+    db.session.commit()
+    for uid in user_ids:
+        clear_user_samplers(uid)
+    return result
+
+def add_confidence_total_columns():
+    """
+    Add the level_sum/level_count columns to topic_confidences on databases that
+    predate them (create_all doesn't alter existing tables). The new columns
+    start at zero, so run verify_confidence_totals afterwards to fill them.
+
+    Returns:
+        List of the column names added
+    """
+    from app import db
+    from app.models.confidence import TopicConfidence
+
+    table = TopicConfidence.__tablename__
+    columns = {column['name'] for column in inspect(db.engine).get_columns(table)}
+    missing = [name for name in ('level_sum', 'level_count') if name not in columns]
+    if missing:
+        with db.engine.begin() as connection:
+            for name in missing:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0"))
+    return missing
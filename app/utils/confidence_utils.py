@@ -1,3 +1,6 @@
+from datetime import datetime
+from sqlalchemy import literal, true
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app import db
 from app.models.confidence import SubtopicConfidence, TopicConfidence
 
@@ -36,12 +39,143 @@ def update_subtopic_confidence(user_id, subtopic_id, confidence_level, priority=
             confidence.priority = priority
         
         db.session.commit()
+        
+        # Drop the cached subtopic ordering for the parent topic
+        from app.utils.curriculum_index import get_curriculum_index
+        from app.utils.weighted_sampler import invalidate_subtopic_order
+        subtopic = get_curriculum_index().get_subtopic(subtopic_id)
+        if subtopic:
+            invalidate_subtopic_order(user_id, subtopic.topic_id)
+        
         return True
     except Exception as e:
         print(f"Error updating subtopic confidence: {e}")
         db.session.rollback()
         return False
 
+def write_subtopic_confidences(user_id, updates):
+    """
+    Write many subtopic confidences without committing: one SELECT of the
+    current rows, one INSERT ... ON CONFLICT DO UPDATE for all of them, then
+    each affected topic, parent topic and subject is adjusted once from the
+    grouped deltas.
+    
+    Args:
+        user_id (int): User ID
+        updates (dict): Dictionary of {subtopic_id: (confidence_level, priority)};
+            a level or priority of None keeps the current value
+        
+    Returns:
+        set: IDs of the affected topics, parents included (unknown subtopic ids are skipped)
+    """
+    from app.models.curriculum import Subtopic
+    from app.utils.cache_invalidation import tag_session, user_confidence_tag
+    from app.utils.confidence_rollup import DEFAULT_LEVEL, confidence_deltas, apply_confidence_deltas
+    from app.utils.curriculum_index import get_curriculum_index
+    
+    index = get_curriculum_index()
+    subtopic_ids = [subtopic_id for subtopic_id in updates if index.get_subtopic(subtopic_id) is not None]
+    unindexed = [subtopic_id for subtopic_id in updates if index.get_subtopic(subtopic_id) is None]
+    if unindexed:
+        subtopic_ids += [row[0] for row in db.session.query(Subtopic.id).filter(Subtopic.id.in_(unindexed))]
+    if not subtopic_ids:
+        return set()
+    
+    current = {
+        subtopic_id: (level, priority)
+        for subtopic_id, level, priority in db.session.query(
+            SubtopicConfidence.subtopic_id, SubtopicConfidence.confidence_level, SubtopicConfidence.priority
+        ).filter(
+            SubtopicConfidence.user_id == user_id,
+            SubtopicConfidence.subtopic_id.in_(subtopic_ids)
+        )
+    }
+    
+    now = datetime.utcnow()
+    rows = []
+    changes = []
+    for subtopic_id in subtopic_ids:
+        confidence_level, priority = updates[subtopic_id]
+        old = current.get(subtopic_id)
+        if confidence_level is None:
+            confidence_level = old[0] if old else DEFAULT_LEVEL
+        if priority is None:
+            priority = old[1] if old else False
+        rows.append({'user_id': user_id, 'subtopic_id': subtopic_id, 'confidence_level': confidence_level,
+                     'priority': bool(priority), 'last_updated': now})
+        if old:
+            changes.append(({'user_id': user_id, 'subtopic_id': subtopic_id, 'confidence_level': old[0]}, -1))
+        changes.append(({'user_id': user_id, 'subtopic_id': subtopic_id, 'confidence_level': confidence_level}, 1))
+    
+    stmt = sqlite_insert(SubtopicConfidence.__table__).values(rows)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'subtopic_id'],
+        set_={
+            'confidence_level': stmt.excluded.confidence_level,
+            'priority': stmt.excluded.priority,
+            'last_updated': stmt.excluded.last_updated
+        }
+    ))
+    
+    # Core statements bypass the flush listeners, so apply the rollup deltas
+    # (one upsert per affected node) and tag the user's confidence explicitly
+    connection = db.session.connection()
+    deltas = confidence_deltas(connection, changes)
+    apply_confidence_deltas(connection, deltas)
+    tag_session(db.session, user_confidence_tag(user_id))
+    
+    return {node_id for kind, _, node_id in deltas if kind == 'topic'}
+
+def refresh_topic_weights(user_id, topic_ids):
+    """
+    Read back a user's topic confidences in one query and push them into the
+    cached task-generation weights.
+    
+    Args:
+        user_id (int): User ID
+        topic_ids (set): Topic IDs that changed
+        
+    Returns:
+        list: The TopicConfidence rows
+    """
+    from app.utils.weighted_sampler import update_topic_weight, invalidate_subtopic_order
+    
+    if not topic_ids:
+        return []
+    
+    topic_confidences = TopicConfidence.query.filter(
+        TopicConfidence.user_id == user_id,
+        TopicConfidence.topic_id.in_(topic_ids)
+    ).populate_existing().all()
+    
+    for topic_confidence in topic_confidences:
+        update_topic_weight(user_id, topic_confidence.topic_id, topic_confidence.confidence_percent)
+        invalidate_subtopic_order(user_id, topic_confidence.topic_id)
+    
+    return topic_confidences
+
+def upsert_subtopic_confidences(user_id, updates):
+    """
+    Set many subtopic confidences in one transaction (see write_subtopic_confidences).
+    
+    Args:
+        user_id (int): User ID
+        updates (dict): Dictionary of {subtopic_id: (confidence_level, priority)};
+            a level or priority of None keeps the current value
+        
+    Returns:
+        list: Updated TopicConfidence rows for the affected topics
+    """
+    try:
+        topic_ids = write_subtopic_confidences(user_id, updates)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    # Read back every affected topic and keep the cached weights in step
+    return refresh_topic_weights(user_id, topic_ids)
+
 def update_subtopics_confidence_from_dict(user_id, confidence_dict):
     """
     Update confidence levels for multiple subtopics at once.
@@ -54,43 +188,7 @@ def update_subtopics_confidence_from_dict(user_id, confidence_dict):
         bool: Success status
     """
     try:
-        # Update each subtopic confidence
-        for subtopic_id, (confidence_level, priority) in confidence_dict.items():
-            # Get or create confidence entry
-            confidence = SubtopicConfidence.query.filter_by(
-                user_id=user_id,
-                subtopic_id=subtopic_id
-            ).first()
-            
-            if not confidence:
-                # Create new entry if it doesn't exist
-                confidence = SubtopicConfidence(
-                    user_id=user_id,
-                    subtopic_id=subtopic_id,
-                    confidence_level=confidence_level,
-                    priority=priority
-                )
-                db.session.add(confidence)
-            else:
-                # Update existing entry
-                confidence.confidence_level = confidence_level
-                confidence.priority = priority
-        
-        # Commit all changes
-        db.session.commit()
-        
-        # Update topic confidences for affected topics
-        from app.models.curriculum import Subtopic
-        affected_topics = set()
-        
-        for subtopic_id in confidence_dict.keys():
-            subtopic = Subtopic.query.get(subtopic_id)
-            if subtopic:
-                affected_topics.add(subtopic.topic_id)
-        
-        for topic_id in affected_topics:
-            TopicConfidence.update_for_topic(topic_id, user_id)
-        
+        upsert_subtopic_confidences(user_id, confidence_dict)
         return True
     except Exception as e:
         print(f"Error updating multiple subtopic confidences: {e}")
@@ -114,4 +212,68 @@ def update_topic_confidence(user_id, topic_id):
         return topic_confidence.confidence_percent
     except Exception as e:
         print(f"Error updating topic confidence: {e}")
-        return 50.0  # Default to 50% on error 
\ No newline at end of file
+        return 50.0  # Default to 50% on error 
+
+def initialize_confidences(user_ids=None, default_level=3):
+    """
+    Give users a default confidence for every subtopic they haven't rated and
+    recompute all their topic and subject totals, with two set-based steps in one
+    transaction:
+    
+    1. INSERT ... SELECT users x subtopics ... ON CONFLICT DO NOTHING
+    2. One SELECT ... GROUP BY user, topic, rolled up to parent topics and
+       subjects and upserted in one executemany per table
+    
+    Args:
+        user_ids (list): Users to initialize (None for every user)
+        default_level (int): Confidence level for new subtopic rows
+        
+    Returns:
+        dict: Number of users, subtopic rows created and topic and subject rows written
+    """
+    from app.models.user import User
+    from app.models.curriculum import Subtopic
+    from app.utils.cache_invalidation import tag_session, user_confidence_tag
+    from app.utils.weighted_sampler import clear_user_samplers
+    from app.utils.confidence_rollup import rebuild_confidence_totals
+    
+    all_users = user_ids is None
+    if all_users:
+        user_ids = [row[0] for row in db.session.query(User.id).all()]
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {'users': 0, 'subtopics': 0, 'topics': 0, 'subjects': 0}
+    
+    # SQLite needs a WHERE clause to parse INSERT ... SELECT ... ON CONFLICT
+    user_filter = true() if all_users else User.id.in_(user_ids)
+    
+    now = datetime.utcnow()
+    try:
+        # Default rows for every (user, subtopic) pair that doesn't have one yet
+        subtopic_table = SubtopicConfidence.__table__
+        pairs = db.session.query(
+            User.id, Subtopic.id, literal(default_level), literal(now), literal(False)
+        ).select_from(User).join(Subtopic, true()).filter(user_filter)
+        created = db.session.execute(
+            sqlite_insert(subtopic_table).from_select(
+                ['user_id', 'subtopic_id', 'confidence_level', 'last_updated', 'priority'],
+                pairs.statement
+            ).on_conflict_do_nothing(index_elements=['user_id', 'subtopic_id'])
+        ).rowcount
+        
+        # Topic (nested topics included) and subject totals and percentages,
+        # from one grouped query rolled up through the curriculum tree
+        totals = rebuild_confidence_totals(None if all_users else user_ids)
+        
+        # Core statements bypass the flush listeners, so tag the users explicitly
+        tag_session(db.session, *[user_confidence_tag(user_id) for user_id in user_ids])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    # Topic weights changed for every initialized user
+    for user_id in user_ids:
+        clear_user_samplers(user_id)
+    
+    return {'users': len(user_ids), 'subtopics': created, 'topics': totals['topics'], 'subjects': totals['subjects']}
@@ -3,6 +3,7 @@ import os
 from app import db
 from app.models.curriculum import Subject, Topic, Subtopic
 from app.models.task import TaskType
+from app.utils.curriculum_index import invalidate_curriculum_index
 from sqlalchemy.exc import SQLAlchemyError
 
 def import_curriculum_data():
@@ -125,6 +126,7 @@ def import_curriculum_data():
         
         # Commit the transaction
         db.session.commit()
+        invalidate_curriculum_index()
         return True, "Curriculum data imported successfully."
         
     except FileNotFoundError:
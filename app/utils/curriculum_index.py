@@ -0,0 +1,294 @@
+"""
+Curriculum index for task generation.
+Holds an immutable, in-process snapshot of subjects, topics and subtopics so
+task generation and the curriculum API can run without curriculum queries.
+Serialized API payloads are memoized on the snapshot, so they are rebuilt
+only when the curriculum changes.
+"""
+
+import gzip
+import json
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from app import db
+from app.models.curriculum import Subject, Topic, Subtopic
+
+# Lightweight read-only records exposing the same attribute names as the models
+SubjectEntry = namedtuple('SubjectEntry', ['id', 'title', 'description'])
+TopicEntry = namedtuple('TopicEntry', ['id', 'subject_id', 'parent_topic_id', 'name', 'title', 'description'])
+SubtopicEntry = namedtuple('SubtopicEntry', ['id', 'topic_id', 'title', 'description', 'estimated_duration'])
+
+# A JSON payload encoded once: raw bytes, gzip-compressed bytes and a content-hash ETag
+SerializedPayload = namedtuple('SerializedPayload', ['body', 'gzip_body', 'etag'])
+
+# Process-wide snapshot and the version it must match to be considered fresh.
+# The version pairs this process's invalidation counter with the curriculum tag
+# version, which is shared across workers when a shared tag store is configured.
+_index = None
+_version = 0
+_lock = threading.Lock()
+
+# Seconds between reads of the curriculum tag version, and the longest a
+# snapshot is served (a fallback for workers without a shared tag store)
+VERSION_CHECK_INTERVAL = 1.0
+MAX_SNAPSHOT_AGE = 300
+_tag_version = 0
+_checked_at = None
+
+
+class CurriculumIndex:
+    """
+    Array-backed snapshot of the curriculum.
+
+    Entries are stored in tuples ordered by ID. Parent/child links are stored
+    as tuples of positions into those arrays, so lookups never touch the database.
+    """
+
+    def __init__(self, subjects, topics, subtopics, version=0):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.subjects = tuple(subjects)
+        self.topics = tuple(topics)
+        self.subtopics = tuple(subtopics)
+
+        # ID -> position lookups
+        self._subject_pos = {s.id: i for i, s in enumerate(self.subjects)}
+        self._topic_pos = {t.id: i for i, t in enumerate(self.topics)}
+        self._subtopic_pos = {st.id: i for i, st in enumerate(self.subtopics)}
+
+        # Build link tables as lists first, then freeze them
+        topics_by_subject = {}
+        root_topics_by_subject = {}
+        child_topics = {}
+        subtopics_by_topic = {}
+
+        for pos, topic in enumerate(self.topics):
+            topics_by_subject.setdefault(topic.subject_id, []).append(pos)
+            if topic.parent_topic_id is None:
+                root_topics_by_subject.setdefault(topic.subject_id, []).append(pos)
+            else:
+                child_topics.setdefault(topic.parent_topic_id, []).append(pos)
+
+        for pos, subtopic in enumerate(self.subtopics):
+            subtopics_by_topic.setdefault(subtopic.topic_id, []).append(pos)
+
+        self._topics_by_subject = {k: tuple(v) for k, v in topics_by_subject.items()}
+        self._root_topics_by_subject = {k: tuple(v) for k, v in root_topics_by_subject.items()}
+        self._child_topics = {k: tuple(v) for k, v in child_topics.items()}
+        self._subtopics_by_topic = {k: tuple(v) for k, v in subtopics_by_topic.items()}
+
+        # Per-subject topic counts (used by the subject distribution)
+        self.topic_counts = {subject.id: len(self._topics_by_subject.get(subject.id, ()))
+                             for subject in self.subjects}
+
+        # Subtopic counts under each topic (nested topics included) and each subject
+        self._subtree_subtopic_counts = {}
+        self._subject_subtopic_counts = {}
+        for topic_id, positions in self._subtopics_by_topic.items():
+            topic = self.get_topic(topic_id)
+            if topic is None:
+                continue
+            for node_id in (topic_id,) + self.get_ancestor_ids(topic_id):
+                self._subtree_subtopic_counts[node_id] = self._subtree_subtopic_counts.get(node_id, 0) + len(positions)
+            self._subject_subtopic_counts[topic.subject_id] = (
+                self._subject_subtopic_counts.get(topic.subject_id, 0) + len(positions))
+
+        # Serialized payloads built from this snapshot: key -> SerializedPayload
+        self._payloads = {}
+        self._payloads_lock = threading.Lock()
+
+    def get_subject(self, subject_id):
+        """Get a subject entry by ID, or None."""
+        pos = self._subject_pos.get(subject_id)
+        return self.subjects[pos] if pos is not None else None
+
+    def get_topic(self, topic_id):
+        """Get a topic entry by ID, or None."""
+        pos = self._topic_pos.get(topic_id)
+        return self.topics[pos] if pos is not None else None
+
+    def get_subtopic(self, subtopic_id):
+        """Get a subtopic entry by ID, or None."""
+        pos = self._subtopic_pos.get(subtopic_id)
+        return self.subtopics[pos] if pos is not None else None
+
+    def get_topics(self, subject_id):
+        """Get all topics (nested or not) for a subject."""
+        return [self.topics[pos] for pos in self._topics_by_subject.get(subject_id, ())]
+
+    def get_root_topics(self, subject_id):
+        """Get topics without a parent for a subject (Psychology papers)."""
+        return [self.topics[pos] for pos in self._root_topics_by_subject.get(subject_id, ())]
+
+    def get_child_topics(self, topic_id):
+        """Get child topics of a topic (Psychology subtopic categories)."""
+        return [self.topics[pos] for pos in self._child_topics.get(topic_id, ())]
+
+    def get_subtopics(self, topic_id):
+        """Get subtopics directly under a topic."""
+        return [self.subtopics[pos] for pos in self._subtopics_by_topic.get(topic_id, ())]
+
+    def topic_count(self, subject_id):
+        """Number of topics in a subject."""
+        return self.topic_counts.get(subject_id, 0)
+
+    def subtopic_count(self, topic_id):
+        """Number of subtopics directly under a topic."""
+        return len(self._subtopics_by_topic.get(topic_id, ()))
+
+    def get_ancestor_ids(self, topic_id):
+        """IDs of a topic's parent, grandparent, ... (nearest first)."""
+        ancestors = []
+        topic = self.get_topic(topic_id)
+        while topic is not None and topic.parent_topic_id is not None and topic.parent_topic_id not in ancestors:
+            ancestors.append(topic.parent_topic_id)
+            topic = self.get_topic(topic.parent_topic_id)
+        return tuple(ancestors)
+
+    def subtree_subtopic_count(self, topic_id):
+        """Number of subtopics under a topic, including those of its nested topics."""
+        return self._subtree_subtopic_counts.get(topic_id, 0)
+
+    def subject_subtopic_count(self, subject_id):
+        """Number of subtopics in a subject."""
+        return self._subject_subtopic_counts.get(subject_id, 0)
+
+    def hierarchy(self, subject_id=None):
+        """
+        Subject -> topic -> subtopic tree used for custom task creation.
+
+        Args:
+            subject_id: Only include this subject (None for every subject)
+
+        Returns:
+            List of subject dictionaries with nested topics and subtopics
+        """
+        subjects = self.subjects if subject_id is None else [self.get_subject(subject_id)]
+        return [{
+            'id': subject.id,
+            'title': subject.title,
+            'topics': [{
+                'id': topic.id,
+                'title': topic.title,
+                'subtopics': [{
+                    'id': subtopic.id,
+                    'title': subtopic.title,
+                    'duration': subtopic.estimated_duration
+                } for subtopic in self.get_subtopics(topic.id)]
+            } for topic in self.get_topics(subject.id)]
+        } for subject in subjects if subject is not None]
+
+    def serialized(self, key, build):
+        """
+        Encode a payload once per snapshot.
+
+        Args:
+            key: Hashable name of the payload
+            build: Callable returning the JSON-serializable payload
+
+        Returns:
+            SerializedPayload (the ETag is a hash of the body, so it is the
+            same in every worker process)
+        """
+        payload = self._payloads.get(key)
+        if payload is not None:
+            return payload
+
+        with self._payloads_lock:
+            payload = self._payloads.get(key)
+            if payload is None:
+                body = json.dumps(build(), separators=(',', ':')).encode('utf-8')
+                payload = SerializedPayload(
+                    body=body,
+                    gzip_body=gzip.compress(body, compresslevel=9, mtime=0),
+                    etag=hashlib.blake2b(body, digest_size=16).hexdigest()
+                )
+                self._payloads[key] = payload
+            return payload
+
+
+def load_curriculum_index(version=0):
+    """
+    Build a CurriculumIndex from the database using three projection queries.
+
+    Args:
+        version: Version to stamp on the snapshot
+
+    Returns:
+        A new CurriculumIndex
+    """
+    subjects = [SubjectEntry(*row) for row in db.session.query(
+        Subject.id, Subject.title, Subject.description
+    ).order_by(Subject.id).all()]
+
+    topics = [TopicEntry(*row) for row in db.session.query(
+        Topic.id, Topic.subject_id, Topic.parent_topic_id, Topic.name, Topic.title, Topic.description
+    ).order_by(Topic.id).all()]
+
+    subtopics = [SubtopicEntry(*row) for row in db.session.query(
+        Subtopic.id, Subtopic.topic_id, Subtopic.title, Subtopic.description, Subtopic.estimated_duration
+    ).order_by(Subtopic.id).all()]
+
+    return CurriculumIndex(subjects, topics, subtopics, version=version)
+
+
+def _current_version(now):
+    """
+    Get the version a snapshot must carry to be fresh.
+
+    The curriculum tag version is re-read at most every VERSION_CHECK_INTERVAL
+    seconds so hot paths don't query the shared tag store on every call.
+
+    Args:
+        now: Current time.monotonic() value
+
+    Returns:
+        Tuple of (local invalidation counter, curriculum tag version)
+    """
+    global _tag_version, _checked_at
+
+    if _checked_at is None or now - _checked_at >= VERSION_CHECK_INTERVAL:
+        from app.utils.cache_invalidation import get_tag_versions, CURRICULUM_TAG
+        _tag_version = get_tag_versions([CURRICULUM_TAG])[0][1]
+        _checked_at = now
+    return (_version, _tag_version)
+
+
+def _is_fresh(index, version, now):
+    return (index is not None and index.version == version
+            and now - index.built_at < MAX_SNAPSHOT_AGE)
+
+
+def get_curriculum_index():
+    """
+    Get the process-wide curriculum snapshot, building it on first use,
+    after the curriculum has been invalidated (here or in another worker),
+    or once it is older than MAX_SNAPSHOT_AGE.
+
+    Returns:
+        The current CurriculumIndex
+    """
+    global _index
+
+    now = time.monotonic()
+    version = _current_version(now)
+    if _is_fresh(_index, version, now):
+        return _index
+
+    with _lock:
+        # Another thread may have rebuilt it while we waited
+        version = _current_version(now)
+        if not _is_fresh(_index, version, now):
+            _index = load_curriculum_index(version=version)
+        return _index
+
+
+def invalidate_curriculum_index():
+    """Bump the curriculum version so the next read rebuilds the snapshot."""
+    global _version, _checked_at
+    with _lock:
+        _version += 1
+        # Re-read the tag version too, so the rebuilt snapshot carries the new one
+        _checked_at = None
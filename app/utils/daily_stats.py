@@ -0,0 +1,189 @@
+"""
+Incremental per-user daily statistics.
+Keeps the user_daily_stats rollup in step with the tasks table: an after_flush
+listener turns every created, changed or deleted Task into count deltas and
+upserts them in the same transaction, so analytics read O(days x subjects)
+rollup rows instead of scanning tasks.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, func, inspect, case, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Task attributes that change which row a task counts in, or what it adds
+_TRACKED_ATTRS = ('user_id', 'subject_id', 'due_date', 'created_at', 'completed_at', 'skipped_at', 'total_duration')
+
+def stat_day(due_date, created_at):
+    """Day a task counts on: its due date, else the day it was created."""
+    if due_date is not None:
+        return due_date
+    return (created_at or datetime.utcnow()).date()
+
+def task_contribution(values):
+    """
+    Row key and counts a task adds to the rollup.
+
+    Args:
+        values: Dictionary of the task's tracked attribute values
+
+    Returns:
+        Tuple of ((user_id, day, subject_id), (created, completed, skipped, minutes))
+    """
+    completed = values['completed_at'] is not None
+    key = (values['user_id'], stat_day(values['due_date'], values['created_at']), values['subject_id'])
+    return key, (1, int(completed), int(values['skipped_at'] is not None),
+                 (values['total_duration'] or 0) if completed else 0)
+
+def _current_values(task):
+    """Tracked values including the pending changes."""
+    return {name: getattr(task, name) for name in _TRACKED_ATTRS}
+
+def _previous_values(task):
+    """Tracked values as they were before the pending changes."""
+    state = inspect(task)
+    values = {}
+    for name in _TRACKED_ATTRS:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        else:
+            values[name] = None
+    return values
+
+def _add(deltas, values, sign):
+    """Add (sign=1) or remove (sign=-1) a task's contribution."""
+    key, counts = task_contribution(values)
+    row = deltas[key]
+    for i, count in enumerate(counts):
+        row[i] += sign * count
+
+def apply_stat_deltas(connection, deltas):
+    """
+    Upsert count deltas into user_daily_stats with one executemany.
+
+    Args:
+        connection: Connection in the current transaction
+        deltas: Dictionary of (user_id, day, subject_id) -> [created, completed, skipped, minutes]
+    """
+    from app.models.stats import UserDailyStat
+
+    rows = [
+        {'user_id': user_id, 'day': day, 'subject_id': subject_id,
+         'created': counts[0], 'completed': counts[1], 'skipped': counts[2], 'minutes': counts[3]}
+        for (user_id, day, subject_id), counts in deltas.items()
+        if user_id is not None and subject_id is not None and any(counts)
+    ]
+    if not rows:
+        return
+
+    table = UserDailyStat.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.day, table.c.subject_id],
+        set_={
+            'created': table.c.created + stmt.excluded.created,
+            'completed': table.c.completed + stmt.excluded.completed,
+            'skipped': table.c.skipped + stmt.excluded.skipped,
+            'minutes': table.c.minutes + stmt.excluded.minutes
+        }
+    )
+    connection.execute(stmt, rows)
+
+def record_inserted_tasks(session, task_rows):
+    """
+    Count tasks written with a bulk insert (which the flush listener can't see).
+
+    Args:
+        session: Session the insert ran in
+        task_rows: List of task column dictionaries that were inserted
+    """
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for row in task_rows:
+        _add(deltas, {name: row.get(name) for name in _TRACKED_ATTRS}, 1)
+    apply_stat_deltas(session.connection(), deltas)
+
+def _after_flush(session, flush_context):
+    """Turn the Task rows written by this flush into rollup deltas."""
+    from app.models.task import Task
+
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for obj in session.new:
+        if isinstance(obj, Task):
+            _add(deltas, _current_values(obj), 1)
+    for obj in session.dirty:
+        if isinstance(obj, Task) and session.is_modified(obj, include_collections=False):
+            _add(deltas, _previous_values(obj), -1)
+            _add(deltas, _current_values(obj), 1)
+    for obj in session.deleted:
+        if isinstance(obj, Task):
+            _add(deltas, _previous_values(obj), -1)
+
+    if deltas:
+        apply_stat_deltas(session.connection(), deltas)
+
+def register_daily_stats(session):
+    """
+    Attach the rollup listener to a session (or scoped session).
+
+    Args:
+        session: Session, sessionmaker or scoped_session to listen on
+    """
+    if not event.contains(session, 'after_flush', _after_flush):
+        event.listen(session, 'after_flush', _after_flush)
+
+def backfill_daily_stats(user_id=None):
+    """
+    Rebuild the rollup from the tasks table with one INSERT ... SELECT.
+
+    Args:
+        user_id: Only rebuild this user's rows (None for everyone)
+
+    Returns:
+        Number of rollup rows written
+    """
+    from app import db
+    from app.models.task import Task
+    from app.models.stats import UserDailyStat
+    from app.utils.cache_invalidation import tag_session, user_tasks_tag
+
+    day = func.coalesce(Task.due_date, func.date(Task.created_at))
+    select = db.session.query(
+        Task.user_id, day, Task.subject_id,
+        func.count(Task.id),
+        func.count(Task.completed_at),
+        func.count(Task.skipped_at),
+        func.coalesce(func.sum(case((Task.completed_at.isnot(None), Task.total_duration), else_=0)), 0)
+    ).group_by(Task.user_id, day, Task.subject_id)
+
+    clear = delete(UserDailyStat)
+    if user_id is not None:
+        select = select.filter(Task.user_id == user_id)
+        clear = clear.where(UserDailyStat.user_id == user_id)
+
+    db.session.execute(clear)
+    table = UserDailyStat.__table__
+    result = db.session.execute(table.insert().from_select(
+        ['user_id', 'day', 'subject_id', 'created', 'completed', 'skipped', 'minutes'],
+        select.statement
+    ))
+
+    # Cached analytics were built from the old rows
+    user_ids = [user_id] if user_id is not None else [
+        row[0] for row in db.session.query(Task.user_id).distinct()
+    ]
+    tag_session(db.session, *[user_tasks_tag(uid) for uid in user_ids])
+    db.session.commit()
+    return result.rowcount
+
+def ensure_daily_stats():
+    """Backfill the rollup once if it is empty but tasks exist (new table on an old database)."""
+    from app import db
+    from app.models.task import Task
+    from app.models.stats import UserDailyStat
+
+    if db.session.query(UserDailyStat.id).first() is None and db.session.query(Task.id).first() is not None:
+        return backfill_daily_stats()
+    return 0
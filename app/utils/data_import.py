@@ -3,6 +3,7 @@ import os
 from app import db
 from app.models.curriculum import Subject, Topic, Subtopic
 from app.models.task import TaskType
+from app.utils.curriculum_index import invalidate_curriculum_index
 
 def import_curriculum_data(json_path, validate=True):
     """
@@ -139,6 +140,7 @@ def import_curriculum_data(json_path, validate=True):
         
         # Commit all changes
         db.session.commit()
+        invalidate_curriculum_index()
         
     except Exception as e:
         db.session.rollback()
@@ -376,6 +378,7 @@ def create_blank_subject(user_id, title, topics_data):
                 db.session.add(subtopic)
         
         db.session.commit()
+        invalidate_curriculum_index()
         return subject
         
     except Exception as e:
@@ -2,6 +2,8 @@ from app.models.curriculum import Subject, Topic, Subtopic
 from app.models.task import TaskType
 from app import db
 from app.utils.curriculum_importer import import_curriculum_data
+from app.utils.curriculum_index import invalidate_curriculum_index
+from app.utils.task_type_registry import refresh_task_type_registry
 
 def get_subject_code(subject_name):
     """
@@ -178,10 +180,14 @@ def fill_database():
         
         # Step 2: Create default task types
         TaskType.create_default_types()
+        refresh_task_type_registry()
         
         # Step 3: Import curriculum data
         success, message = import_curriculum_data()
         
+        # The tables may have been recreated, so always drop the old snapshot
+        invalidate_curriculum_index()
+        
         if success:
             return True, "Database filled successfully with tables, task types, and curriculum data."
         else:
@@ -1,59 +1,164 @@
 """
 Caching utilities for handling large datasets efficiently.
 Provides caching mechanisms to improve performance for the Timetable app.
+
+Results live in a bounded in-process LRU cache with per-entry TTLs and
+per-namespace counters (see optimization_lru). Misses are single-flight:
+concurrent callers for the same key wait for the first caller's result instead
+of recomputing it. With stale_seconds set, an expired value is served while one
+background thread refreshes it (see optimization_flight).
+
+With a shared store configured (see shared_cache), computed values are also
+written to it and local misses read from it first, so worker processes share
+each other's results.
 """
 
 import time
 import functools
+from app.utils.optimization_lru import MISSING, count, make_key, cache_get, cache_set, clear_entries, store_stats
+from app.utils.optimization_flight import start_flight, run_flight, refresh_in_background
+
+# Optional second tier shared by every worker process (a shared_cache.SharedStore)
+_shared_store = None
+
+def configure_shared_store(store):
+    """Use a shared store as the second cache tier (None turns it off)."""
+    global _shared_store
+    _shared_store = store
+
+def _shared_key(namespace, key):
+    """Key of an entry in the shared store, prefixed by namespace so it can be cleared."""
+    return f"opt:{namespace}:{key.hex()}"
+
+def _shared_get(namespace, key):
+    """
+    Look up a fresh value computed by any worker.
+
+    Returns:
+        Tuple of (value, seconds_left); value is MISSING if there is none
+    """
+    store = _shared_store
+    if store is None:
+        return MISSING, 0
+    try:
+        entry = store.get(_shared_key(namespace, key))
+    except Exception:
+        # A locked or unreadable shared file degrades to the local cache
+        return MISSING, 0
+    if entry is None:
+        return MISSING, 0
+    expires_at, value = entry
+    seconds_left = expires_at - time.time()
+    if seconds_left <= 0:
+        return MISSING, 0
+    return value, seconds_left
+
+def _shared_set(namespace, key, value, timeout_seconds, stale_seconds):
+    """Publish a computed value to the other workers."""
+    store = _shared_store
+    if store is None:
+        return
+    try:
+        store.set(_shared_key(namespace, key), (time.time() + timeout_seconds, value),
+                  timeout_seconds + stale_seconds)
+    except Exception:
+        pass
+
+def _load(namespace, key, func, args, kwargs, timeout_seconds, stale_seconds):
+    """
+    Compute a value and cache it in both tiers. A fresh result another worker
+    published to the shared store is reused instead.
+    """
+    result, seconds_left = _shared_get(namespace, key)
+    if result is not MISSING:
+        count(namespace, 'shared_hits')
+        cache_set(namespace, key, result, seconds_left, stale_seconds)
+        return result
 
-# Cache storage
-_cache = {}
-_cache_timeout = {}
+    result = func(*args, **kwargs)
+    cache_set(namespace, key, result, timeout_seconds, stale_seconds)
+    _shared_set(namespace, key, result, timeout_seconds, stale_seconds)
+    return result
 
-def cached(timeout_seconds=300):
+def cached(timeout_seconds=300, namespace=None, stale_seconds=0, tags=None):
     """
     Decorator for caching function results.
-    
+
     Args:
         timeout_seconds: Number of seconds to keep results in cache
-        
+        namespace: Name used for keys and statistics (defaults to the function name)
+        stale_seconds: How long after expiry the old value may still be served
+                       while a background thread refreshes it (0 disables)
+        tags: List of invalidation tags, or a callable taking the function's
+              arguments and returning them (see cache_invalidation)
+
     Returns:
         Decorated function with caching capability
     """
     def decorator(func):
+        func_namespace = namespace or func.__name__
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            # Create a cache key from function name and arguments
-            key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
-            
+            # Tag versions are part of the key, so invalidating a tag makes old entries unreachable
+            versions = ()
+            if tags is not None:
+                from app.utils.cache_invalidation import get_tag_versions
+                versions = get_tag_versions(tags(*args, **kwargs) if callable(tags) else tags)
+            key = make_key(func_namespace, (args, versions), kwargs)
+            load = functools.partial(_load, func_namespace, key, func, args, kwargs,
+                                     timeout_seconds, stale_seconds)
+
             # Check if result is in cache and not expired
-            current_time = time.time()
-            if key in _cache and _cache_timeout.get(key, 0) > current_time:
-                return _cache[key]
-            
-            # Execute function and cache result
-            result = func(*args, **kwargs)
-            _cache[key] = result
-            _cache_timeout[key] = current_time + timeout_seconds
-            
-            return result
+            result, fresh = cache_get(func_namespace, key)
+            if result is not MISSING:
+                if not fresh:
+                    # Serve the stale value; the first caller to see it starts the refresh
+                    flight, leader = start_flight(key)
+                    if leader:
+                        count(func_namespace, 'refreshes')
+                        refresh_in_background(flight, key, func_namespace, load)
+                return result
+
+            # Single flight: the first caller computes, the others wait for its result
+            flight, leader = start_flight(key)
+            if leader:
+                return run_flight(flight, key, load)
+
+            count(func_namespace, 'coalesced')
+            return flight.wait()
+
+        wrapper.cache_namespace = func_namespace
         return wrapper
     return decorator
 
 def clear_cache():
-    """Clear all cached data."""
-    global _cache, _cache_timeout
-    _cache = {}
-    _cache_timeout = {}
+    """Clear all cached data (including this module's entries in the shared store)."""
+    clear_entries()
+    if _shared_store is not None:
+        _shared_store.delete_prefix('opt:')
 
 def clear_cache_for_function(func_name):
     """
     Clear cache entries for a specific function.
-    
+
     Args:
-        func_name: Name of the function to clear cache for
+        func_name: Name of the function (cache namespace) to clear cache for
+    """
+    clear_entries(func_name)
+    if _shared_store is not None:
+        _shared_store.delete_prefix(f"opt:{func_name}:")
+
+def get_cache_stats():
+    """
+    Get cache usage and per-namespace counters.
+
+    Returns:
+        Dictionary with entries, bytes and a namespaces dict of hits, stale_hits,
+        misses, coalesced, refreshes, shared_hits, evictions and expirations
+        counters (plus a shared dict of store usage when one is configured)
     """
-    keys_to_remove = [k for k in _cache if k.startswith(f"{func_name}:")]
-    for key in keys_to_remove:
-        _cache.pop(key, None)
-        _cache_timeout.pop(key, None)
+    stats = store_stats()
+    if _shared_store is not None:
+        stats['shared'] = _shared_store.stats()
+    return stats
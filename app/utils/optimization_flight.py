@@ -0,0 +1,92 @@
+"""
+Single-flight computations for optimization_cache.
+Concurrent callers for the same key wait for the first caller's result instead
+of recomputing it, and a stale value can be refreshed by one background thread
+while callers keep being served the old one.
+"""
+
+import threading
+
+# Computations in progress: key -> Flight
+_flights = {}
+_flights_lock = threading.Lock()
+
+class Flight:
+    """A computation that concurrent callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        """Block until the leader finishes, then return its result (or raise its error)."""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+def start_flight(key):
+    """
+    Register a computation for a key.
+
+    Returns:
+        Tuple of (flight, is_leader); only the leader computes
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = _flights[key] = Flight()
+        return flight, True
+
+def run_flight(flight, key, compute):
+    """
+    Run a leader's computation and wake the waiting callers.
+
+    Args:
+        flight: Flight returned by start_flight
+        key: Key the flight was registered under
+        compute: Callable taking no arguments and returning the result
+
+    Returns:
+        The computed result
+    """
+    try:
+        flight.result = compute()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+def refresh_in_background(flight, key, name, compute):
+    """
+    Run a leader's computation on a daemon thread (inside an app context if there is one).
+
+    Args:
+        flight: Flight returned by start_flight
+        key: Key the flight was registered under
+        name: Name used for the thread and in error logs
+        compute: Callable taking no arguments and returning the result
+    """
+    from flask import current_app, has_app_context
+
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def run():
+        try:
+            if app is None:
+                run_flight(flight, key, compute)
+            else:
+                with app.app_context():
+                    run_flight(flight, key, compute)
+        except Exception as e:
+            # The stale value keeps being served until a refresh succeeds
+            if app is not None:
+                app.logger.error(f"Error refreshing cached {name}: {str(e)}")
+
+    threading.Thread(target=run, name=f'cache-refresh-{name}', daemon=True).start()
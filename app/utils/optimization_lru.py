@@ -0,0 +1,181 @@
+"""
+In-process store behind optimization_cache.
+A bounded LRU cache with per-entry TTLs, split into lock-striped shards so
+threads rarely contend. Keys are hashed, and hit/miss/eviction counters are
+kept per namespace (the cached function's name).
+"""
+
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Global bounds, split evenly across shards
+MAX_ENTRIES = 4096
+MAX_BYTES = 32 * 1024 * 1024  # 32 MB
+NUM_SHARDS = 16
+
+# How often a write also sweeps every shard for expired entries
+SWEEP_INTERVAL_SECONDS = 60
+
+# Returned by cache_get on a miss
+MISSING = object()
+
+class _Shard:
+    """One lock-protected LRU segment of the cache."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, stale_until, size, namespace, value)
+        self.bytes = 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def pop(self, key):
+        """Remove an entry. Caller must hold the lock."""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+        return entry
+
+    def sweep(self, now):
+        """Drop entries past their stale window. Caller must hold the lock."""
+        expired = [(key, entry[3]) for key, entry in self.entries.items() if entry[1] <= now]
+        for key, _ in expired:
+            self.pop(key)
+        return expired
+
+_shards = [_Shard(max(1, MAX_ENTRIES // NUM_SHARDS), max(1, MAX_BYTES // NUM_SHARDS))
+           for _ in range(NUM_SHARDS)]
+_stats = {}
+_stats_lock = threading.Lock()
+_last_sweep = time.time()
+
+def count(namespace, counter, amount=1):
+    """Increment a per-namespace counter."""
+    with _stats_lock:
+        stats = _stats.setdefault(namespace, {
+            'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0,
+            'refreshes': 0, 'shared_hits': 0, 'evictions': 0, 'expirations': 0
+        })
+        stats[counter] += amount
+
+def make_key(namespace, args, kwargs):
+    """Hash the namespace and call arguments into a fixed-size key."""
+    raw = repr((namespace, args, sorted(kwargs.items()))).encode('utf-8')
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+def _shard_for(key):
+    """Pick the shard that owns a key."""
+    return _shards[int.from_bytes(key[:4], 'little') % NUM_SHARDS]
+
+def _estimate_size(value):
+    """Approximate memory cost of a value (pickled length)."""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        import sys
+        return sys.getsizeof(value)
+
+def _sweep_all(now):
+    """Expire entries in every shard, at most once per SWEEP_INTERVAL_SECONDS."""
+    global _last_sweep
+    if now - _last_sweep < SWEEP_INTERVAL_SECONDS:
+        return
+    _last_sweep = now
+
+    for shard in _shards:
+        with shard.lock:
+            expired = shard.sweep(now)
+        for _, namespace in expired:
+            count(namespace, 'expirations')
+
+def cache_get(namespace, key):
+    """
+    Look up a key, expiring it lazily once its stale window has passed.
+
+    Returns:
+        Tuple of (value, is_fresh); value is MISSING on a miss
+    """
+    shard = _shard_for(key)
+    now = time.time()
+    value, fresh = MISSING, False
+    with shard.lock:
+        entry = shard.entries.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                shard.entries.move_to_end(key)
+                value, fresh = entry[4], entry[0] > now
+            else:
+                shard.pop(key)
+                count(namespace, 'expirations')
+
+    if value is MISSING:
+        count(namespace, 'misses')
+    else:
+        count(namespace, 'hits' if fresh else 'stale_hits')
+    return value, fresh
+
+def cache_set(namespace, key, value, timeout_seconds, stale_seconds=0):
+    """Store a value, evicting least recently used entries to stay within bounds."""
+    now = time.time()
+    _sweep_all(now)
+
+    size = _estimate_size(value)
+    shard = _shard_for(key)
+    evicted = []
+
+    with shard.lock:
+        # Values larger than a whole shard are not cached at all
+        if size > shard.max_bytes:
+            return
+
+        shard.pop(key)
+        expires_at = now + timeout_seconds
+        shard.entries[key] = (expires_at, expires_at + stale_seconds, size, namespace, value)
+        shard.bytes += size
+
+        while len(shard.entries) > shard.max_entries or shard.bytes > shard.max_bytes:
+            _, entry = shard.entries.popitem(last=False)
+            shard.bytes -= entry[2]
+            evicted.append(entry[3])
+
+    for evicted_namespace in evicted:
+        count(evicted_namespace, 'evictions')
+
+def clear_entries(namespace=None):
+    """
+    Drop cached entries.
+
+    Args:
+        namespace: Only drop this namespace's entries (None for every entry)
+    """
+    for shard in _shards:
+        with shard.lock:
+            if namespace is None:
+                shard.entries.clear()
+                shard.bytes = 0
+                continue
+            keys = [key for key, entry in shard.entries.items() if entry[3] == namespace]
+            for key in keys:
+                shard.pop(key)
+
+def store_stats():
+    """
+    Get store usage and per-namespace counters.
+
+    Returns:
+        Dictionary with entries, bytes and a namespaces dict of counters
+    """
+    entries = 0
+    size = 0
+    for shard in _shards:
+        with shard.lock:
+            entries += len(shard.entries)
+            size += shard.bytes
+
+    with _stats_lock:
+        namespaces = {name: dict(stats) for name, stats in _stats.items()}
+
+    return {'entries': entries, 'bytes': size, 'namespaces': namespaces}
@@ -8,8 +8,12 @@ from sqlalchemy import text, func
 from app import db
 from app.models.curriculum import Subject, Topic, Subtopic
 from app.utils.optimization_cache import cached
+from app.utils.cache_invalidation import CURRICULUM_TAG, user_tasks_tag
+from app.utils.curriculum_index import get_curriculum_index
 
-@cached(timeout_seconds=3600)  # Cache for 1 hour
+# Cache for a day; new tasks or curriculum changes invalidate it through its tags
+@cached(timeout_seconds=86400, stale_seconds=300,
+        tags=lambda user_id: [user_tasks_tag(user_id), CURRICULUM_TAG])
 def get_optimized_subject_distribution(user_id):
     """
     Optimized version of subject distribution calculation with caching.
@@ -21,8 +25,9 @@ def get_optimized_subject_distribution(user_id):
     Returns:
         Dictionary with subject_id: percentage pairs
     """
-    # Get all subjects
-    subjects = Subject.query.all()
+    # Get all subjects from the curriculum snapshot
+    index = get_curriculum_index()
+    subjects = index.subjects
     
     # Early return if no subjects
     if not subjects:
@@ -67,34 +72,8 @@ def get_optimized_subject_distribution(user_id):
             # Biology as a whole gets the same share as any other single subject
             biology_share = equal_share
             
-            # Get topic counts with a single query
-            if len(biology_subjects) > 1:
-                # Multiple biology subjects
-                subject_ids_str = ','.join(str(s.id) for s in biology_subjects)
-                bio_topic_counts = db.session.execute(
-                    text(f"""
-                    SELECT subject_id, COUNT(*) as count
-                    FROM topics
-                    WHERE subject_id IN ({subject_ids_str})
-                    GROUP BY subject_id
-                    """)
-                ).all()
-            elif len(biology_subjects) == 1:
-                # Single biology subject - don't use IN clause
-                bio_topic_counts = db.session.execute(
-                    text("""
-                    SELECT subject_id, COUNT(*) as count
-                    FROM topics
-                    WHERE subject_id = :subject_id
-                    GROUP BY subject_id
-                    """),
-                    {"subject_id": biology_subjects[0].id}
-                ).all()
-            else:
-                # No biology subjects
-                bio_topic_counts = []
-            
-            bio_topic_counts_dict = {row[0]: row[1] for row in bio_topic_counts}
+            # Get topic counts from the curriculum snapshot
+            bio_topic_counts_dict = {s.id: index.topic_count(s.id) for s in biology_subjects}
             total_bio_topics = sum(bio_topic_counts_dict.values())
             
             if total_bio_topics > 0:
@@ -125,34 +104,8 @@ def get_optimized_subject_distribution(user_id):
             # The less Biology appears, the more weight it should get
             bio_inverse = 1.0 - bio_percentage if bio_percentage > 0 else 1.0
             
-            # Get topic counts for Biology subjects
-            if len(biology_subject_ids) > 1:
-                # Multiple biology subjects
-                subject_ids_str = ','.join(str(s_id) for s_id in biology_subject_ids)
-                bio_topic_counts = db.session.execute(
-                    text(f"""
-                    SELECT subject_id, COUNT(*) as count
-                    FROM topics
-                    WHERE subject_id IN ({subject_ids_str})
-                    GROUP BY subject_id
-                    """)
-                ).all()
-            elif len(biology_subject_ids) == 1:
-                # Single biology subject - don't use IN clause
-                bio_topic_counts = db.session.execute(
-                    text("""
-                    SELECT subject_id, COUNT(*) as count
-                    FROM topics
-                    WHERE subject_id = :subject_id
-                    GROUP BY subject_id
-                    """),
-                    {"subject_id": biology_subject_ids[0]}
-                ).all()
-            else:
-                # No biology subjects
-                bio_topic_counts = []
-            
-            bio_topic_counts_dict = {row[0]: row[1] for row in bio_topic_counts}
+            # Get topic counts for Biology subjects from the curriculum snapshot
+            bio_topic_counts_dict = {s_id: index.topic_count(s_id) for s_id in biology_subject_ids}
             total_bio_topics = sum(bio_topic_counts_dict.values())
             
             if total_bio_topics > 0:
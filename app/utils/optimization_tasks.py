@@ -23,7 +23,7 @@ def generate_tasks_in_batch(user_id, count=5, max_retries=3):
     Returns:
         Dict with status and generated tasks
     """
-    from app.utils.task_generator import generate_replacement_task
+    from app.utils.task_generator import build_replacement_task, save_tasks
     from app.models.user import User
     
     result = {
@@ -52,26 +52,25 @@ def generate_tasks_in_batch(user_id, count=5, max_retries=3):
     
     while successful_tasks < count and retry_count <= max_retries:
         try:
-            # Start a new transaction for each attempt
-            db.session.begin_nested()
-            
             # Calculate how many more tasks we need
             remaining = count - successful_tasks
             
-            # Generate the remaining tasks
+            # Build the remaining tasks in memory
+            new_tasks = []
+            planned_topic_ids = set()
             for _ in range(remaining):
-                task = generate_replacement_task(user)
+                task = build_replacement_task(user, planned_topic_ids=planned_topic_ids)
                 if task:
-                    result['tasks'].append(task)
-                    successful_tasks += 1
+                    new_tasks.append(task)
             
-            # Commit the transaction if we generated at least one task
-            if successful_tasks > 0:
-                db.session.commit()
+            # Write them in a single commit if we built at least one task
+            if new_tasks:
+                save_tasks(new_tasks)
+                result['tasks'].extend(new_tasks)
+                successful_tasks += len(new_tasks)
                 retry_count = 0  # Reset retry counter after success
             else:
-                # No tasks generated, so rollback and try again
-                db.session.rollback()
+                # No tasks generated, so try again
                 retry_count += 1
                 current_app.logger.warning(f"No tasks generated, retrying (attempt {retry_count}/{max_retries})...")
         
@@ -100,6 +99,7 @@ def generate_balanced_task_batch(user_id, count=5, max_per_subject=2):
     """
     Generate a balanced batch of tasks across different subjects.
     Ensures no single subject dominates the task list.
+    All tasks are built in memory and written in a single commit.
     
     Args:
         user_id: User ID to generate tasks for
@@ -109,9 +109,9 @@ def generate_balanced_task_batch(user_id, count=5, max_per_subject=2):
     Returns:
         List of generated tasks
     """
-    from app.utils.task_generator import generate_task_for_subject
+    from app.utils.task_generator import build_task_for_subject, save_tasks
+    from app.utils.curriculum_index import get_curriculum_index
     from app.models.user import User
-    from app.models.curriculum import Subject
     
     # Get the user object
     user = User.query.get(user_id)
@@ -122,7 +122,7 @@ def generate_balanced_task_batch(user_id, count=5, max_per_subject=2):
     distribution = get_optimized_subject_distribution(user_id)
     
     # Get all subjects and sort by distribution weight
-    subjects = Subject.query.all()
+    subjects = list(get_curriculum_index().subjects)
     if not subjects:
         return []
     
@@ -132,13 +132,14 @@ def generate_balanced_task_batch(user_id, count=5, max_per_subject=2):
     # Generate tasks
     tasks = []
     subject_counts = {}
+    planned_topic_ids = set()
     
     # First pass - try to generate at least one task per subject
     for subject, _ in weighted_subjects:
         if len(tasks) >= count:
             break
             
-        task = generate_task_for_subject(user, subject.id)
+        task = build_task_for_subject(user, subject.id, planned_topic_ids=planned_topic_ids)
         if task:
             tasks.append(task)
             subject_counts[subject.id] = 1
@@ -154,7 +155,7 @@ def generate_balanced_task_batch(user_id, count=5, max_per_subject=2):
             if subject_counts.get(subject.id, 0) >= max_per_subject:
                 continue
                 
-            task = generate_task_for_subject(user, subject.id)
+            task = build_task_for_subject(user, subject.id, planned_topic_ids=planned_topic_ids)
             if task:
                 tasks.append(task)
                 subject_counts[subject.id] = subject_counts.get(subject.id, 0) + 1
@@ -162,7 +163,7 @@ def generate_balanced_task_batch(user_id, count=5, max_per_subject=2):
                 if len(tasks) >= count:
                     break
     
-    return tasks
+    return save_tasks(tasks)
 
 def regenerate_stale_tasks(user_id, days_threshold=7, limit=10, batch_size=5):
     """
@@ -0,0 +1,169 @@
+"""
+Daily plan pre-generation.
+Builds each active user's tasks for a day ahead of time (from the CLI or an
+off-peak scheduler thread) so the dashboard only has to read them.
+
+Every worker process with the scheduler enabled wakes at the same hour; a lease
+in the shared store (see shared_cache) lets only one of them run each day.
+"""
+
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from app import db
+
+# Number of subjects in a daily plan (matches the dashboard)
+PLAN_SUBJECT_COUNT = 3
+
+# How long a scheduler run holds its lease (longer than any run should take)
+LEASE_SECONDS = 6 * 60 * 60
+
+_scheduler_thread = None
+_scheduler_lock = threading.Lock()
+
+
+def generate_daily_plan(user, due_date):
+    """
+    Generate and save a user's plan for a day in a single commit: one task
+    for each of up to three randomly chosen subjects.
+
+    Args:
+        user: User object
+        due_date: Day the plan is for
+
+    Returns:
+        List of created tasks
+    """
+    from app.utils.curriculum_index import get_curriculum_index
+    from app.utils.task_generator_main import generate_tasks
+
+    subjects = list(get_curriculum_index().subjects)
+    random.shuffle(subjects)
+    return generate_tasks(user, [subject.id for subject in subjects[:PLAN_SUBJECT_COUNT]], due_date)
+
+
+def get_active_user_ids(active_days=30):
+    """
+    Get IDs of users who logged in (or signed up) within the last `active_days` days.
+
+    Args:
+        active_days: Activity window in days
+
+    Returns:
+        Sorted list of user IDs
+    """
+    from app.models.user import User
+
+    since = datetime.utcnow() - timedelta(days=active_days)
+    rows = db.session.query(User.id).filter(
+        db.or_(User.last_login >= since, User.created_at >= since)
+    ).order_by(User.id).all()
+    return [row.id for row in rows]
+
+
+def pregenerate_plans(due_date, batch_size=50, active_days=30, max_workers=1):
+    """
+    Generate the plan for a day for every active user that doesn't have one yet,
+    using the bulk engine in chunks of `batch_size` users.
+
+    Args:
+        due_date: Day to generate plans for
+        batch_size: Number of users per chunk
+        active_days: Activity window used to pick users
+        max_workers: Planner processes (1 = plan in this process)
+
+    Returns:
+        Statistics dictionary from generate_plans_bulk
+    """
+    from app.utils.bulk_generation import generate_plans_bulk
+
+    user_ids = get_active_user_ids(active_days)
+    return generate_plans_bulk(user_ids, due_date, chunk_size=batch_size, max_workers=max_workers)
+
+
+def _seconds_until(hour):
+    """Seconds from now until the next occurrence of `hour`:00 UTC."""
+    now = datetime.utcnow()
+    run_at = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return (run_at - now).total_seconds()
+
+
+def acquire_pregeneration_lease(app, due_date):
+    """
+    Claim the pre-generation run for a day across every worker process.
+
+    Args:
+        app: Flask application
+        due_date: Day the run generates plans for
+
+    Returns:
+        True if this process won the lease and should run
+    """
+    from app.utils.shared_cache import shared_store_for_app
+
+    store = shared_store_for_app(app)
+    return store.add(f"plan_pregeneration:lease:{due_date.isoformat()}",
+                     {'pid': os.getpid(), 'started_at': time.time()}, timeout=LEASE_SECONDS)
+
+
+def start_plan_scheduler(app):
+    """
+    Start a daemon thread that pre-generates tomorrow's plans every day at
+    PLAN_PREGENERATION_HOUR (UTC), then verifies the confidence totals. Only one
+    scheduler runs per process, and each day's run takes a lease in the shared
+    store first, so with several workers only one of them does the work.
+
+    Args:
+        app: Flask application
+
+    Returns:
+        The scheduler thread
+    """
+    global _scheduler_thread
+
+    hour = app.config.get('PLAN_PREGENERATION_HOUR', 2)
+    batch_size = app.config.get('PLAN_PREGENERATION_BATCH_SIZE', 50)
+    active_days = app.config.get('PLAN_PREGENERATION_ACTIVE_DAYS', 30)
+    max_workers = app.config.get('PLAN_PREGENERATION_WORKERS', 1)
+
+    def run():
+        while True:
+            time.sleep(_seconds_until(hour))
+            tomorrow = datetime.utcnow().date() + timedelta(days=1)
+            try:
+                if not acquire_pregeneration_lease(app, tomorrow):
+                    app.logger.info(f"Plans for {tomorrow} are being pre-generated by another worker")
+                    continue
+            except Exception as e:
+                app.logger.error(f"Error acquiring the plan pre-generation lease: {str(e)}")
+                continue
+
+            with app.app_context():
+                try:
+                    stats = pregenerate_plans(tomorrow, batch_size=batch_size, active_days=active_days,
+                                              max_workers=max_workers)
+                    app.logger.info(f"Pre-generated plans for {tomorrow}: {stats}")
+                except Exception as e:
+                    app.logger.error(f"Error pre-generating plans: {str(e)}")
+                    db.session.rollback()
+
+                # Repair any drift in the running confidence totals
+                try:
+                    from app.utils.confidence_rollup import verify_confidence_totals
+                    stats = verify_confidence_totals(fix=True)
+                    if stats['mismatched']:
+                        app.logger.warning(f"Repaired confidence totals: {stats}")
+                except Exception as e:
+                    app.logger.error(f"Error verifying confidence totals: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    with _scheduler_lock:
+        if _scheduler_thread is None or not _scheduler_thread.is_alive():
+            _scheduler_thread = threading.Thread(target=run, name='plan-pregeneration', daemon=True)
+            _scheduler_thread.start()
+        return _scheduler_thread
@@ -0,0 +1,153 @@
+"""
+Task-type preference matrix.
+Packs a user's TaskTypePreference rows into bitmasks (global and per subject)
+loaded in one query and cached per user, so resolving task types while
+generating tasks needs no queries.
+
+Cached matrices are stamped with the user's preferences tag version (see
+cache_invalidation), so a preference write in any worker makes every worker
+reload on its next read.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from app import db
+
+# How long a cached matrix is trusted before reloading, even if its tag version still matches
+PREFERENCE_TTL_SECONDS = 300
+MAX_CACHED_USERS = 1024
+
+
+class PreferenceMatrix:
+    """
+    A user's task-type preferences.
+
+    Bit N of a mask is task type ID N. The global masks cover preferences
+    without a subject; subject masks cover subject-specific ones.
+    """
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows: Iterable of (task_type_id, subject_id, is_enabled, task_type_name)
+        """
+        self.loaded_at = time.time()
+        self.version = None        # Preferences tag version the rows were read at
+        self.uplearn_id = None
+        self.global_set = 0        # Types with a global preference row
+        self.global_enabled = 0    # Types enabled globally
+        self.subject_enabled = {}  # subject_id -> mask of enabled types
+
+        # One entry per enabled preference (global or subject), like User.get_enabled_task_types
+        enabled = []
+
+        for type_id, subject_id, is_enabled, name in rows:
+            if name == 'uplearn':
+                self.uplearn_id = type_id
+            bit = 1 << type_id
+            if subject_id is None:
+                self.global_set |= bit
+                if is_enabled:
+                    self.global_enabled |= bit
+            elif is_enabled:
+                self.subject_enabled[subject_id] = self.subject_enabled.get(subject_id, 0) | bit
+            if is_enabled:
+                enabled.append(type_id)
+
+        self.enabled_type_ids = tuple(enabled)
+
+    def is_globally_enabled(self, type_id, default=True):
+        """Global preference for a task type (default when no row exists)."""
+        if not self.global_set >> type_id & 1:
+            return default
+        return bool(self.global_enabled >> type_id & 1)
+
+    def is_enabled_for_subject(self, type_id, subject_id):
+        """Whether a task type is explicitly enabled for a subject."""
+        return bool(self.subject_enabled.get(subject_id, 0) >> type_id & 1)
+
+    def is_uplearn_only(self, subject_id):
+        """Whether the subject is restricted to Uplearn tasks."""
+        return self.uplearn_id is not None and self.is_enabled_for_subject(self.uplearn_id, subject_id)
+
+    def uplearn_subject_ids(self):
+        """Set of subjects restricted to Uplearn tasks."""
+        return {subject_id for subject_id in self.subject_enabled if self.is_uplearn_only(subject_id)}
+
+
+def _preference_query():
+    """Base projection query over preferences joined to their task type."""
+    from app.models.task import TaskType, TaskTypePreference
+
+    return db.session.query(
+        TaskTypePreference.user_id, TaskTypePreference.task_type_id,
+        TaskTypePreference.subject_id, TaskTypePreference.is_enabled, TaskType.name
+    ).join(TaskType, TaskTypePreference.task_type_id == TaskType.id)
+
+
+def load_preference_matrices(user_ids):
+    """
+    Build preference matrices for many users with one query.
+
+    Args:
+        user_ids: List of user IDs
+
+    Returns:
+        Dictionary of user_id -> PreferenceMatrix (every requested user is present)
+    """
+    from app.models.task import TaskTypePreference
+
+    rows = {user_id: [] for user_id in user_ids}
+    for user_id, type_id, subject_id, is_enabled, name in _preference_query().filter(
+        TaskTypePreference.user_id.in_(user_ids)
+    ).order_by(TaskTypePreference.id).all():
+        rows[user_id].append((type_id, subject_id, is_enabled, name))
+    return {user_id: PreferenceMatrix(user_rows) for user_id, user_rows in rows.items()}
+
+
+# Per-user matrices, least recently used first
+_user_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_preference_matrix(user_id):
+    """
+    Get the cached preference matrix for a user, loading it on a miss, after
+    the user's preferences tag has been bumped, or after the TTL.
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        PreferenceMatrix for the user
+    """
+    from app.utils.cache_invalidation import get_tag_versions, user_preferences_tag
+
+    # Read the version before the rows, so a write that lands in between forces a reload
+    version = get_tag_versions([user_preferences_tag(user_id)])[0][1]
+
+    with _lock:
+        matrix = _user_cache.get(user_id)
+        if (matrix is not None and matrix.version == version
+                and time.time() - matrix.loaded_at <= PREFERENCE_TTL_SECONDS):
+            _user_cache.move_to_end(user_id)
+            return matrix
+
+    matrix = load_preference_matrices([user_id])[user_id]
+    matrix.version = version
+
+    with _lock:
+        _user_cache[user_id] = matrix
+        while len(_user_cache) > MAX_CACHED_USERS:
+            _user_cache.popitem(last=False)
+    return matrix
+
+
+def invalidate_preference_matrix(user_id=None):
+    """Drop the cached matrix for one user (after writing preferences), or for everyone."""
+    with _lock:
+        if user_id is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(user_id, None)
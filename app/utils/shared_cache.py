@@ -0,0 +1,373 @@
+"""
+Shared cross-process cache backed by a SQLite file.
+Every worker process opens the same file under the instance folder, so
+workers share one warm cache (and pay one cold-start cost) without Redis.
+Writes are single statements or IMMEDIATE transactions, so they are atomic
+across processes; entries carry an expiry time and the store is kept within
+entry and byte bounds by evicting the entries closest to expiry.
+
+optimization_cache and cache_invalidation use it as a second tier when
+SHARED_CACHE_ENABLED is set, and sqlite_cache plugs it into flask_caching.
+"""
+
+import os
+import time
+import pickle
+import secrets
+import sqlite3
+import threading
+
+DEFAULT_FILENAME = 'shared_cache.sqlite3'
+DEFAULT_MAX_ENTRIES = 20000
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+
+# Check the bounds on roughly one write in PRUNE_EVERY (per process)
+PRUNE_EVERY = 64
+# Seconds to wait for another process's write lock
+BUSY_TIMEOUT_SECONDS = 5
+
+# Sorts entries that never expire after every expiring one
+_NEVER = 1e308
+
+# Row in cache_tags holding a random number chosen when the file is created
+_EPOCH_TAG = '__epoch__'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_cache_entries_expires_at ON cache_entries (expires_at);
+CREATE TABLE IF NOT EXISTS cache_tags (
+    tag TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+class SharedStore:
+    """
+    Key/value store in a SQLite file shared by every process that opens it.
+
+    Values are pickled. Connections are per thread and per process, so the
+    store is safe to use from request threads and after a fork.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn.executescript(_SCHEMA)
+        self.conn.execute('INSERT OR IGNORE INTO cache_tags (tag, version) VALUES (?, ?)',
+                          (_EPOCH_TAG, secrets.randbits(62)))
+        self._epoch = None
+
+    def _connect(self):
+        """Open a connection in autocommit mode with WAL so readers never block writers."""
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @property
+    def conn(self):
+        """This thread's connection, reopened after a fork."""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn = self._connect()
+            local.pid = os.getpid()
+        return local.conn
+
+    @staticmethod
+    def _expiry(timeout, now):
+        """Absolute expiry for a timeout in seconds (None or 0 never expires)."""
+        return now + timeout if timeout else _NEVER
+
+    def get(self, key, default=None):
+        """Get a live value, or default on a miss or after expiry."""
+        row = self.conn.execute(
+            'SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?',
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return default
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            return default
+
+    def get_many(self, keys):
+        """Get several live values in one query; missing keys map to None."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ','.join('?' * len(keys))
+        rows = self.conn.execute(
+            f'SELECT key, value FROM cache_entries WHERE key IN ({placeholders}) AND expires_at > ?',
+            (*keys, time.time())
+        ).fetchall()
+        found = {}
+        for key, value in rows:
+            try:
+                found[key] = pickle.loads(value)
+            except Exception:
+                pass
+        return {key: found.get(key) for key in keys}
+
+    def has(self, key):
+        """Whether a live entry exists for a key."""
+        return self.conn.execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND expires_at > ?',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def set(self, key, value, timeout=None):
+        """
+        Store a value atomically, replacing any existing entry.
+
+        Args:
+            key: Cache key
+            value: Picklable value
+            timeout: Seconds until expiry (None or 0 never expires)
+
+        Returns:
+            True if stored, False if the value can't be pickled or is too large
+        """
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return False
+        if len(blob) > self.max_bytes:
+            return False
+
+        now = time.time()
+        self.conn.execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, expires_at, size) VALUES (?, ?, ?, ?)',
+            (key, blob, self._expiry(timeout, now), len(blob))
+        )
+        self._maybe_prune(now)
+        return True
+
+    def add(self, key, value, timeout=None):
+        """Store a value only if the key is missing or expired; returns whether it was stored."""
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return False
+        if len(blob) > self.max_bytes:
+            return False
+
+        now = time.time()
+        cursor = self.conn.execute(
+            'INSERT INTO cache_entries (key, value, expires_at, size) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at, '
+            'size = excluded.size WHERE cache_entries.expires_at <= ?',
+            (key, blob, self._expiry(timeout, now), len(blob), now)
+        )
+        self._maybe_prune(now)
+        return cursor.rowcount > 0
+
+    def delete(self, key):
+        """Remove a key; returns whether it existed."""
+        return self.conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,)).rowcount > 0
+
+    def delete_prefix(self, prefix):
+        """Remove every key starting with a prefix; returns the number removed."""
+        return self.conn.execute(
+            'DELETE FROM cache_entries WHERE substr(key, 1, ?) = ?', (len(prefix), prefix)
+        ).rowcount
+
+    def incr(self, key, delta=1):
+        """
+        Atomically add to an integer entry, creating it (without expiry) if missing.
+
+        Returns:
+            The new value, or None if the existing value isn't an integer
+        """
+        conn = self.conn
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT value, expires_at FROM cache_entries WHERE key = ? AND expires_at > ?',
+                (key, now)
+            ).fetchone()
+            if row is None:
+                value, expires_at = delta, _NEVER
+            else:
+                current = pickle.loads(row[0])
+                if not isinstance(current, int):
+                    conn.execute('ROLLBACK')
+                    return None
+                value, expires_at = current + delta, row[1]
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (key, value, expires_at, size) VALUES (?, ?, ?, ?)',
+                (key, blob, expires_at, len(blob))
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+    def clear(self):
+        """Remove every entry (tag versions are kept so old keys stay unreachable)."""
+        self.conn.execute('DELETE FROM cache_entries')
+
+    def get_tag_versions(self, tags):
+        """
+        Current versions of some tags in one query.
+
+        Returns:
+            Dictionary of tag -> version (tags never bumped are absent)
+        """
+        tags = list(tags)
+        if not tags:
+            return {}
+        placeholders = ','.join('?' * len(tags))
+        return dict(self.conn.execute(
+            f'SELECT tag, version FROM cache_tags WHERE tag IN ({placeholders})', tags
+        ).fetchall())
+
+    @property
+    def epoch(self):
+        """
+        Random identifier of this store's tag versions. Versions restart from
+        zero if the file is recreated, and the epoch changes with them.
+        """
+        if self._epoch is None:
+            row = self.conn.execute('SELECT version FROM cache_tags WHERE tag = ?',
+                                    (_EPOCH_TAG,)).fetchone()
+            self._epoch = row[0] if row else 0
+        return self._epoch
+
+    def bump_tags(self, tags):
+        """Atomically increment the version of each tag."""
+        self.conn.executemany(
+            'INSERT INTO cache_tags (tag, version) VALUES (?, 1) '
+            'ON CONFLICT(tag) DO UPDATE SET version = version + 1',
+            [(tag,) for tag in tags]
+        )
+
+    def _maybe_prune(self, now):
+        """Prune on a fraction of writes so the bound checks stay cheap."""
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.prune(now)
+
+    def prune(self, now=None):
+        """
+        Drop expired entries, then evict the entries closest to expiry until the
+        store is within its entry and byte bounds.
+
+        Returns:
+            Number of entries removed
+        """
+        now = time.time() if now is None else now
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            removed = conn.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (now,)).rowcount
+
+            count, total = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries'
+            ).fetchone()
+            if count > self.max_entries:
+                removed += conn.execute(
+                    'DELETE FROM cache_entries WHERE key IN ('
+                    'SELECT key FROM cache_entries ORDER BY expires_at LIMIT ?)',
+                    (count - self.max_entries,)
+                ).rowcount
+                total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache_entries').fetchone()[0]
+
+            if total > self.max_bytes:
+                # Walk entries closest to expiry first until enough bytes are freed
+                excess = total - self.max_bytes
+                doomed = []
+                for key, size in conn.execute('SELECT key, size FROM cache_entries ORDER BY expires_at'):
+                    doomed.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                conn.executemany('DELETE FROM cache_entries WHERE key = ?', doomed)
+                removed += len(doomed)
+
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return removed
+
+    def stats(self):
+        """
+        Get store usage.
+
+        Returns:
+            Dictionary with path, entries, bytes and tags counts
+        """
+        count, total = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE expires_at > ?',
+            (time.time(),)
+        ).fetchone()
+        tags = self.conn.execute('SELECT COUNT(*) FROM cache_tags WHERE tag != ?', (_EPOCH_TAG,)).fetchone()[0]
+        return {'path': self.path, 'entries': count, 'bytes': total, 'tags': tags}
+
+# One store per file per process
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_shared_store(path, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Get the process-wide store for a file, creating it on first use.
+
+    Args:
+        path: Path to the SQLite file
+        max_entries: Maximum number of entries kept
+        max_bytes: Maximum total size of pickled values
+
+    Returns:
+        SharedStore for the file
+    """
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = SharedStore(path, max_entries, max_bytes)
+        return store
+
+def shared_store_for_app(app):
+    """
+    Get the store configured for an app (SHARED_CACHE_PATH, defaulting to
+    instance/shared_cache.sqlite3, bounded by SHARED_CACHE_MAX_ENTRIES/_BYTES).
+    """
+    path = app.config.get('SHARED_CACHE_PATH') or os.path.join(app.instance_path, DEFAULT_FILENAME)
+    return get_shared_store(
+        path,
+        max_entries=app.config.get('SHARED_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+        max_bytes=app.config.get('SHARED_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+    )
+
+def init_shared_cache(app):
+    """
+    Make optimization_cache and cache_invalidation share the app's store
+    across workers (when SHARED_CACHE_ENABLED is set).
+
+    Returns:
+        The SharedStore, or None when sharing is disabled
+    """
+    from app.utils.optimization_cache import configure_shared_store
+    from app.utils.cache_invalidation import configure_tag_store
+
+    store = shared_store_for_app(app) if app.config.get('SHARED_CACHE_ENABLED') else None
+    configure_shared_store(store)
+    configure_tag_store(store)
+    return store
@@ -0,0 +1,58 @@
+"""
+flask_caching backend on the shared SQLite store.
+Selecting it as CACHE_TYPE puts view caching in the same file the other
+shared caches use, so every worker process serves the same cached views.
+"""
+
+from flask_caching.backends.base import BaseCache
+from app.utils.shared_cache import shared_store_for_app
+
+class SQLiteCache(BaseCache):
+    """
+    flask_caching backend on a SharedStore.
+
+    Select it with CACHE_TYPE = 'app.utils.sqlite_cache.SQLiteCache'.
+    CACHE_KEY_PREFIX namespaces the keys so clear() only drops this cache's entries.
+    """
+
+    def __init__(self, store, default_timeout=300, key_prefix=''):
+        super().__init__(default_timeout=default_timeout)
+        self.store = store
+        self.key_prefix = key_prefix
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(dict(
+            store=shared_store_for_app(app),
+            key_prefix='view:' + (config.get('CACHE_KEY_PREFIX') or '')
+        ))
+        return cls(*args, **kwargs)
+
+    def get(self, key):
+        return self.store.get(self.key_prefix + key)
+
+    def get_many(self, *keys):
+        values = self.store.get_many(self.key_prefix + key for key in keys)
+        return [values[self.key_prefix + key] for key in keys]
+
+    def set(self, key, value, timeout=None):
+        return self.store.set(self.key_prefix + key, value, self._normalize_timeout(timeout))
+
+    def add(self, key, value, timeout=None):
+        return self.store.add(self.key_prefix + key, value, self._normalize_timeout(timeout))
+
+    def delete(self, key):
+        return self.store.delete(self.key_prefix + key)
+
+    def has(self, key):
+        return self.store.has(self.key_prefix + key)
+
+    def inc(self, key, delta=1):
+        return self.store.incr(self.key_prefix + key, delta)
+
+    def dec(self, key, delta=1):
+        return self.store.incr(self.key_prefix + key, -delta)
+
+    def clear(self):
+        self.store.delete_prefix(self.key_prefix)
+        return True
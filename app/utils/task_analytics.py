@@ -0,0 +1,170 @@
+"""
+Task aggregates for analytics and the progress page.
+Computes a user's totals, per-subject totals/completed and recent counts in
+one GROUP BY pass with conditional aggregates, memoized per user data version
+so every analytics path in a request shares the same result. Time series
+(daily, weekly or monthly) also cost one grouped query for any range.
+
+Both read the user_daily_stats rollup (see daily_stats), so their cost
+depends on days x subjects, not on how many tasks a user has. A task counts
+on its due date (its creation date when it has none).
+"""
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import func, case
+from app import db
+from app.models.stats import UserDailyStat
+from app.utils.optimization_cache import cached
+from app.utils.cache_invalidation import user_tasks_tag
+
+# Window for the "recent" counts (tasks per week)
+RECENT_DAYS = 30
+
+# Per-subject counts
+SubjectCounts = namedtuple('SubjectCounts', ['total', 'completed', 'recent'])
+
+# One bucket of a time series: first day of the bucket and counts of the tasks in it
+SeriesPoint = namedtuple('SeriesPoint', ['start', 'created', 'completed', 'skipped', 'minutes'])
+
+SERIES_BUCKETS = ('day', 'week', 'month')
+
+class TaskAggregates:
+    """A user's task counts, overall and per subject."""
+
+    def __init__(self, by_subject, day):
+        self.day = day
+        self.by_subject = by_subject  # subject_id -> SubjectCounts
+        self.total = sum(counts.total for counts in by_subject.values())
+        self.completed = sum(counts.completed for counts in by_subject.values())
+        self.recent = sum(counts.recent for counts in by_subject.values())
+
+    @property
+    def completion_rate(self):
+        """Percentage of tasks completed (0 when there are none)."""
+        return (self.completed / self.total * 100) if self.total > 0 else 0
+
+    @property
+    def tasks_per_week(self):
+        """Average tasks created per week over the recent window."""
+        return (self.recent / RECENT_DAYS) * 7
+
+    def subject(self, subject_id):
+        """Counts for one subject (zeros if the user has no tasks in it)."""
+        return self.by_subject.get(subject_id, SubjectCounts(0, 0, 0))
+
+    def subject_percentage(self, subject_id):
+        """Percentage of a subject's tasks completed (0 when there are none)."""
+        counts = self.subject(subject_id)
+        return (counts.completed / counts.total * 100) if counts.total > 0 else 0
+
+# Keyed by day as well, since the recent window moves at midnight
+@cached(timeout_seconds=3600, namespace='task_aggregates',
+        tags=lambda user_id, day: [user_tasks_tag(user_id)])
+def load_task_aggregates(user_id, day):
+    """
+    Count a user's tasks per subject with a single grouped query over their rollup rows.
+
+    Args:
+        user_id: User ID
+        day: Date the recent window ends on
+
+    Returns:
+        TaskAggregates
+    """
+    recent_since = day - timedelta(days=RECENT_DAYS)
+
+    rows = db.session.query(
+        UserDailyStat.subject_id,
+        func.sum(UserDailyStat.created),
+        func.sum(UserDailyStat.completed),
+        func.sum(case((UserDailyStat.day >= recent_since, UserDailyStat.created), else_=0))
+    ).filter(UserDailyStat.user_id == user_id).group_by(UserDailyStat.subject_id).all()
+
+    return TaskAggregates({
+        subject_id: SubjectCounts(total or 0, completed or 0, recent or 0)
+        for subject_id, total, completed, recent in rows
+        if total
+    }, day)
+
+def get_task_aggregates(user_id):
+    """
+    Get today's task aggregates for a user (cached until their tasks change).
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        TaskAggregates
+    """
+    return load_task_aggregates(user_id, datetime.utcnow().date())
+
+def _bucket_start(day, bucket):
+    """First day of the bucket containing a date (weeks start on Monday)."""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+@cached(timeout_seconds=3600, namespace='task_series',
+        tags=lambda user_id, days, bucket, end: [user_tasks_tag(user_id)])
+def load_task_series(user_id, days, bucket, end):
+    """
+    Sum a user's rollup rows per day with one GROUP BY day query, then
+    zero-fill and roll the days up into buckets in Python.
+
+    Args:
+        user_id: User ID
+        days: Number of days in the window, ending on `end`
+        bucket: 'day', 'week' or 'month'
+        end: Last day of the window
+
+    Returns:
+        List of SeriesPoint, oldest first; created counts the bucket's tasks,
+        completed/skipped those now completed or skipped, minutes their
+        completed duration
+    """
+    if bucket not in SERIES_BUCKETS:
+        raise ValueError(f"Unknown bucket {bucket!r}, expected one of {SERIES_BUCKETS}")
+
+    start = end - timedelta(days=days - 1)
+
+    rows = db.session.query(
+        UserDailyStat.day,
+        func.sum(UserDailyStat.created),
+        func.sum(UserDailyStat.completed),
+        func.sum(UserDailyStat.skipped),
+        func.sum(UserDailyStat.minutes)
+    ).filter(
+        UserDailyStat.user_id == user_id,
+        UserDailyStat.day.between(start, end)
+    ).group_by(UserDailyStat.day).all()
+
+    counts_by_day = {row[0]: row[1:] for row in rows}
+
+    # Zero-fill every day of the window, merging days into their bucket
+    buckets = {}
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        counts = counts_by_day.get(day, (0, 0, 0, 0))
+        totals = buckets.setdefault(_bucket_start(day, bucket), [0, 0, 0, 0])
+        for i, count in enumerate(counts):
+            totals[i] += count or 0
+
+    return [SeriesPoint(key, *totals) for key, totals in buckets.items()]
+
+def get_task_series(user_id, days=7, bucket='day', end=None):
+    """
+    Get a user's task counts over a window ending today (or on `end`).
+
+    Args:
+        user_id: User ID
+        days: Window length in days (e.g. 7, 30, 365)
+        bucket: 'day', 'week' or 'month'
+        end: Last day of the window (defaults to today)
+
+    Returns:
+        List of SeriesPoint, oldest first (cached until the user's tasks change)
+    """
+    return load_task_series(user_id, days, bucket, end or datetime.utcnow().date())
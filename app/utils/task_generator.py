@@ -7,13 +7,24 @@ Handles task creation, topic selection, and subtopic assignment.
 from app.utils.task_subject_utils import get_subject_distribution_for_week
 from app.utils.task_topic_utils import select_weighted_topic
 from app.utils.task_subtopic_utils import add_subtopics_to_task
-from app.utils.task_generator_main import generate_task_for_subject, generate_replacement_task
+from app.utils.task_generator_main import (
+    build_task_for_subject,
+    build_replacement_task,
+    save_tasks,
+    generate_task_for_subject,
+    generate_tasks,
+    generate_replacement_task
+)
 
 # Re-export all functions to maintain backward compatibility
 __all__ = [
     'get_subject_distribution_for_week',
     'select_weighted_topic',
     'add_subtopics_to_task',
+    'build_task_for_subject',
+    'build_replacement_task',
+    'save_tasks',
     'generate_task_for_subject',
+    'generate_tasks',
     'generate_replacement_task'
 ]
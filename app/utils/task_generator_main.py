@@ -6,159 +6,175 @@ Integrates subject, topic, and subtopic functionality to create tasks.
 import random
 from datetime import datetime
 from app import db
-from app.models.curriculum import Subject
-from app.models.task import Task, TaskType
+from app.models.task import Task, TaskSubtopic
+from app.utils.curriculum_index import get_curriculum_index
 
 from app.utils.task_subject_utils import (
     get_subject_distribution_for_week,
     select_subject_based_on_distribution
 )
-from app.utils.task_topic_utils import (
-    select_weighted_topic,
-    get_topics_for_subject,
-    get_subtopic_categories
-)
-from app.utils.task_subtopic_utils import add_subtopics_to_task
+from app.utils.task_topic_utils import select_weighted_topic
+from app.utils.task_subtopic_utils import get_task_duration, order_subtopics_for_user
+from app.utils.task_planning import plan_subject_task
+from app.utils.preference_matrix import get_preference_matrix
+from app.utils.task_type_registry import get_task_type_registry
 
-def generate_task_for_subject(user, subject_id):
+def build_task_for_subject(user, subject_id, due_date=None, planned_topic_ids=None):
     """
-    Generate a study task for a subject.
+    Build a study task for a subject in memory without writing it.
     
-    The process:
-    1. Get the subject and available task types
-    2. Check if Uplearn is enabled for this subject
-    3. Select a topic randomly from the available topics
-    4. Create the task with appropriate task type
-    5. Add subtopics to the task
+    The task is planned by plan_subject_task (shared with bulk generation):
+    a task type from the user's preferences (only Uplearn when the subject is
+    restricted to it), a confidence-weighted topic that avoids recently used
+    ones, and the lowest-confidence subtopics that fit the user's study time.
     
     Args:
         user: User object to generate task for
         subject_id: Subject ID to generate task for
+        due_date: Day the task is planned for (defaults to today)
+        planned_topic_ids: Set of topics already used by tasks built in the
+                           same batch (not yet saved, so not in the recency
+                           index); the new task's topic is added to it
         
     Returns:
-        The created task object.
+        An unsaved Task with its TaskSubtopic rows attached, or None.
     """
-    # Get the subject
-    subject = Subject.query.get(subject_id)
+    if due_date is None:
+        due_date = datetime.utcnow().date()
+    
+    # Get the subject from the curriculum snapshot
+    index = get_curriculum_index()
+    subject = index.get_subject(subject_id)
     if not subject:
         return None
     
-    # Check if Uplearn is enabled for this subject
-    uplearn_only = user.is_uplearn_enabled_for_subject(subject_id)
-    
-    # Get available task types
-    if uplearn_only:
-        # Only use Uplearn task type
-        uplearn_id = TaskType.get_uplearn_id()
-        if not uplearn_id:
-            # Fallback if Uplearn type doesn't exist
-            task_types = TaskType.query.all()
-        else:
-            task_types = [TaskType.query.get(uplearn_id)]
-    else:
-        # Use all enabled task types for the user
-        task_types = user.get_enabled_task_types()
-        
-        # Fallback to all task types if none are enabled
-        if not task_types:
-            task_types = TaskType.query.all()
+    # Task types come from the cached preference matrix and registry
+    task_type_names = {entry.id: entry.name for entry in get_task_type_registry().all()}
     
-    if not task_types:
+    planned = plan_subject_task(
+        subject, index, get_preference_matrix(user.id), task_type_names,
+        draw_topic=lambda topics: select_weighted_topic(topics, user, subject.title, due_date,
+                                                        planned_topic_ids=planned_topic_ids),
+        order_subtopics=lambda topic, subtopics: order_subtopics_for_user(user, topic, subtopics),
+        duration=get_task_duration(user, due_date),
+        rng=random
+    )
+    if not planned:
         return None
     
-    # Select random task type from available options
-    task_type = random.choice(task_types)
-    
-    # Get all topics for this subject
-    from flask import current_app
-    
-    if "Psychology" in subject.title:
-        # Special handling for Psychology's nested structure
-        try:
-            # Get the paper topics (Paper 1, Paper 2, Paper 3)
-            paper_topics = get_topics_for_subject(subject_id)
-            
-            if not paper_topics:
-                current_app.logger.error(f"No paper topics found for Psychology subject ID {subject_id}")
-                return None
-            
-            # Select a paper topic randomly
-            selected_paper = select_weighted_topic(paper_topics, user, subject.title)
-            
-            if not selected_paper:
-                current_app.logger.error(f"Failed to select a paper topic for Psychology subject ID {subject_id}")
-                return None
-            
-            # Get subtopic categories under this paper
-            subtopic_categories = get_subtopic_categories(selected_paper.id)
-            
-            if not subtopic_categories:
-                current_app.logger.error(f"No subtopic categories found for Psychology paper topic ID {selected_paper.id}")
-                # Fall back to using the paper topic directly if no subtopics exist
-                selected_topic = selected_paper
-            else:
-                # Select a subtopic category randomly
-                selected_topic = select_weighted_topic(subtopic_categories, user, subject.title)
-                
-                if not selected_topic:
-                    current_app.logger.error(f"Failed to select a subtopic category for Psychology paper topic ID {selected_paper.id}")
-                    # Fall back to using the paper topic
-                    selected_topic = selected_paper
-        except Exception as e:
-            current_app.logger.error(f"Error processing Psychology subject: {str(e)}")
-            return None
-    else:
-        # Normal subject structure
-        topics = get_topics_for_subject(subject_id)
-        
-        # Select a topic randomly
-        selected_topic = select_weighted_topic(topics, user, subject.title)
+    # Create the task with its subtopics attached in memory (saved together)
+    subtopics = planned.pop('subtopics')
+    task = Task(user_id=user.id, due_date=due_date, **planned)
+    for subtopic_id, duration in subtopics:
+        task.subtopics.append(TaskSubtopic(task_id=None, subtopic_id=subtopic_id, duration=duration))
     
-    if not selected_topic:
-        return None
+    # Later tasks in the same batch avoid this topic (the recency index
+    # only learns about it once the batch is committed)
+    if planned_topic_ids is not None:
+        planned_topic_ids.add(task.topic_id)
     
-    # Create the task
-    task = Task(
-        user_id=user.id,
-        subject_id=subject_id,
-        task_type_id=task_type.id,
-        title=f"{task_type.name.capitalize()}: {selected_topic.title}",
-        description=selected_topic.description,
-        topic_id=selected_topic.id,
-        due_date=datetime.utcnow().date()
-    )
+    return task
+
+def save_tasks(tasks):
+    """
+    Write built tasks and their subtopics in one flush and one commit.
+    Tasks are flushed together to get their IDs, then all TaskSubtopic rows
+    are written with a single executemany INSERT.
+    
+    Args:
+        tasks: List of unsaved Task objects
+        
+    Returns:
+        The same list of tasks, now persisted.
+    """
+    if not tasks:
+        return tasks
+    
+    # Detach the in-memory subtopic links so they are not inserted row by row
+    pending_links = []
+    for task in tasks:
+        pending_links.append((task, list(task.subtopics)))
+        task.subtopics = []
+    
+    db.session.add_all(tasks)
+    db.session.flush()
+    
+    rows = [
+        {'task_id': task.id, 'subtopic_id': link.subtopic_id, 'duration': link.duration}
+        for task, links in pending_links
+        for link in links
+    ]
+    if rows:
+        db.session.execute(TaskSubtopic.__table__.insert(), rows)
     
-    # Save task to get an ID
-    db.session.add(task)
     db.session.commit()
     
-    # Add subtopics to the task
-    add_subtopics_to_task(task, selected_topic, user)
+    return tasks
+
+def generate_task_for_subject(user, subject_id):
+    """
+    Generate and save a study task for a subject.
     
+    Args:
+        user: User object to generate task for
+        subject_id: Subject ID to generate task for
+        
+    Returns:
+        The created task object.
+    """
+    task = build_task_for_subject(user, subject_id)
+    if not task:
+        return None
+    
+    save_tasks([task])
     return task
 
-def generate_replacement_task(user, subject_id=None):
+def generate_tasks(user, subject_ids, due_date=None):
     """
-    Generate a replacement task when one is skipped.
-    If subject_id is provided, generates a task for that subject.
+    Generate one task per subject and write them all in a single commit.
+    
+    Args:
+        user: User object to generate tasks for
+        subject_ids: List of subject IDs to generate tasks for
+        due_date: Day the tasks are planned for (defaults to today)
+        
+    Returns:
+        List of created tasks (subjects that produced no task are skipped).
+    """
+    tasks = []
+    planned_topic_ids = set()
+    
+    for subject_id in subject_ids:
+        task = build_task_for_subject(user, subject_id, due_date, planned_topic_ids)
+        if task:
+            tasks.append(task)
+    
+    return save_tasks(tasks)
+
+def build_replacement_task(user, subject_id=None, planned_topic_ids=None):
+    """
+    Build a replacement task in memory without writing it.
+    If subject_id is provided, builds a task for that subject.
     Otherwise, selects a subject based on distribution.
     
     Args:
         user: User object to generate task for
         subject_id: Optional subject ID to generate task for
+        planned_topic_ids: Set of topics used by other unsaved tasks in the
+                           same batch (see build_task_for_subject)
         
     Returns:
-        The new task object.
+        An unsaved Task, or None.
     """
     if subject_id:
-        # Generate a task for the specified subject
-        return generate_task_for_subject(user, subject_id)
+        # Build a task for the specified subject
+        return build_task_for_subject(user, subject_id, planned_topic_ids=planned_topic_ids)
     
     # Get subject distribution
     distribution = get_subject_distribution_for_week(user)
     
     # Select subject based on distribution
-    subjects = Subject.query.all()
+    subjects = get_curriculum_index().subjects
     
     # Early return if no subjects exist
     if not subjects:
@@ -166,5 +182,25 @@ def generate_replacement_task(user, subject_id=None):
     
     selected_subject = select_subject_based_on_distribution(subjects, distribution)
     
-    # Generate task for selected subject
-    return generate_task_for_subject(user, selected_subject.id)
+    # Build task for selected subject
+    return build_task_for_subject(user, selected_subject.id, planned_topic_ids=planned_topic_ids)
+
+def generate_replacement_task(user, subject_id=None):
+    """
+    Generate a replacement task when one is skipped.
+    If subject_id is provided, generates a task for that subject.
+    Otherwise, selects a subject based on distribution.
+    
+    Args:
+        user: User object to generate task for
+        subject_id: Optional subject ID to generate task for
+        
+    Returns:
+        The new task object.
+    """
+    task = build_replacement_task(user, subject_id)
+    if not task:
+        return None
+    
+    save_tasks([task])
+    return task
@@ -0,0 +1,99 @@
+"""
+Task planning shared by interactive and bulk task generation.
+Decides a task's type, topic and subtopics for one subject as plain data,
+without touching the database. Callers supply the user-specific parts (topic
+draws and subtopic ordering) from their own data sources and turn the result
+into Task rows.
+"""
+
+from app.utils.task_subtopic_utils import select_subtopics_for_duration
+
+
+def candidate_task_type_ids(preferences, subject_id, task_type_names):
+    """
+    Task types a subject's task may use: only Uplearn for Uplearn-only
+    subjects, otherwise every enabled type, falling back to all types.
+
+    Args:
+        preferences: PreferenceMatrix for the user
+        subject_id: Subject ID
+        task_type_names: Dictionary of task type ID -> name
+
+    Returns:
+        List of known task type IDs (empty if there are none)
+    """
+    if preferences.is_uplearn_only(subject_id):
+        type_ids = [preferences.uplearn_id]
+    else:
+        type_ids = list(preferences.enabled_type_ids) or list(task_type_names)
+    return [type_id for type_id in type_ids if type_id in task_type_names]
+
+
+def select_task_topic(subject, index, draw_topic):
+    """
+    Draw the topic for a subject's task. For Psychology, whose root topics are
+    papers, a category under the drawn paper is drawn as well (the paper itself
+    is used when it has none).
+
+    Args:
+        subject: Subject entry
+        index: CurriculumIndex
+        draw_topic: Callable taking a list of topics and returning one (or None)
+
+    Returns:
+        Topic entry, or None if the subject has no topics
+    """
+    topics = index.get_root_topics(subject.id) or index.get_topics(subject.id)
+    if not topics:
+        return None
+
+    topic = draw_topic(topics)
+    if topic is not None and "Psychology" in subject.title:
+        categories = index.get_child_topics(topic.id)
+        if categories:
+            topic = draw_topic(categories) or topic
+    return topic
+
+
+def plan_subject_task(subject, index, preferences, task_type_names, draw_topic,
+                      order_subtopics, duration, rng):
+    """
+    Plan one task for a subject.
+
+    Args:
+        subject: Subject entry
+        index: CurriculumIndex
+        preferences: PreferenceMatrix for the user
+        task_type_names: Dictionary of task type ID -> name
+        draw_topic: Callable taking a list of topics and returning one (or None)
+        order_subtopics: Callable taking (topic, subtopics) and returning the
+            subtopics in priority order
+        duration: Target task duration in minutes
+        rng: random.Random instance (or the random module)
+
+    Returns:
+        Dictionary with subject_id, task_type_id, title, description, topic_id,
+        total_duration and a 'subtopics' list of (subtopic_id, duration), or None
+    """
+    type_ids = candidate_task_type_ids(preferences, subject.id, task_type_names)
+    if not type_ids:
+        return None
+    type_id = rng.choice(type_ids)
+
+    topic = select_task_topic(subject, index, draw_topic)
+    if topic is None:
+        return None
+
+    subtopics = index.get_subtopics(topic.id)
+    if subtopics:
+        subtopics = select_subtopics_for_duration(order_subtopics(topic, subtopics), duration)
+
+    return {
+        'subject_id': subject.id,
+        'task_type_id': type_id,
+        'title': f"{task_type_names[type_id].capitalize()}: {topic.title}",
+        'description': topic.description,
+        'topic_id': topic.id,
+        'total_duration': duration,
+        'subtopics': [(s.id, s.estimated_duration) for s in subtopics]
+    }
@@ -7,7 +7,12 @@ import random
 from datetime import datetime, timedelta
 from sqlalchemy import text
 from app import db
-from app.models.curriculum import Subject, Topic
+from app.utils.curriculum_index import get_curriculum_index
+from app.utils.weighted_sampler import CumulativeTable
+
+# Cached selection tables keyed by (subject IDs, distribution items)
+_selection_tables = {}
+MAX_SELECTION_TABLES = 64
 
 def get_subject_distribution_for_week(user):
     """
@@ -17,8 +22,9 @@ def get_subject_distribution_for_week(user):
     Returns a dictionary with subject_id: percentage pairs.
     Enforces fixed distribution (33.33% each for Biology total, Psychology, Chemistry)
     """
-    # Get all subjects
-    subjects = Subject.query.all()
+    # Get all subjects from the curriculum snapshot
+    index = get_curriculum_index()
+    subjects = index.subjects
     
     # If no subjects exist, return an empty dictionary
     if not subjects:
@@ -34,15 +40,15 @@ def get_subject_distribution_for_week(user):
     
     # Calculate total topic counts for Biology to split allocation proportionally
     if biology_subjects:
-        bio_y12_topics = len(Topic.query.filter_by(subject_id=biology_subjects[0].id).all()) if len(biology_subjects) > 0 else 0
-        bio_y13_topics = len(Topic.query.filter_by(subject_id=biology_subjects[1].id).all()) if len(biology_subjects) > 1 else 0
+        bio_y12_topics = index.topic_count(biology_subjects[0].id) if len(biology_subjects) > 0 else 0
+        bio_y13_topics = index.topic_count(biology_subjects[1].id) if len(biology_subjects) > 1 else 0
         
         total_bio_topics = bio_y12_topics + bio_y13_topics
         
         # Assign Biology subjects a total of 1/3 (0.3333...) share
         if total_bio_topics > 0:
             for subject in biology_subjects:
-                topic_count = len(Topic.query.filter_by(subject_id=subject.id).all())
+                topic_count = index.topic_count(subject.id)
                 # Divide Biology's 33.33% share based on topic proportions
                 distribution[subject.id] = (1/3) * (topic_count / total_bio_topics) if total_bio_topics > 0 else 0
         else:
@@ -74,129 +80,79 @@ def get_subject_distribution_for_week(user):
     
     return distribution
 
+def _build_selection_tables(subjects, distribution):
+    """
+    Build the cumulative-weight tables used by select_subject_based_on_distribution.
+    Keys are positions into the subjects list (or "biology" for the combined category).
+    
+    Returns:
+        Tuple of (category_table, biology_table); biology_table is None without Biology subjects
+    """
+    biology_positions = [i for i, s in enumerate(subjects) if "Biology" in s.title]
+    other_positions = [i for i, s in enumerate(subjects) if "Biology" not in s.title]
+    
+    # If no Biology subjects, use standard selection
+    if not biology_positions:
+        weights = [distribution.get(subjects[i].id, 0) for i in other_positions]
+        if not any(w > 0 for w in weights):
+            # Fallback to equal weighting if all weights are zero
+            weights = [1] * len(other_positions)
+        return CumulativeTable(other_positions, [max(w, 0) for w in weights]), None
+    
+    # Biology is treated as a single category with the combined weight of Y12 and Y13
+    keys = ["biology"] + other_positions
+    weights = [sum(distribution.get(subjects[i].id, 0) for i in biology_positions)]
+    weights += [distribution.get(subjects[i].id, 0) for i in other_positions]
+    if not any(w > 0 for w in weights):
+        # Fallback to equal weighting (Biology counts as ONE)
+        weights = [1] * len(keys)
+    category_table = CumulativeTable(keys, [max(w, 0) for w in weights])
+    
+    # Choose between Y12 and Y13 based on relative weights
+    bio_weights = [distribution.get(subjects[i].id, 0) for i in biology_positions]
+    if not any(w > 0 for w in bio_weights):
+        # Equal weights if all zero
+        bio_weights = [1] * len(biology_positions)
+    biology_table = CumulativeTable(biology_positions, [max(w, 0) for w in bio_weights])
+    
+    return category_table, biology_table
+
 def select_subject_based_on_distribution(subjects, distribution):
     """
     Select a subject based on the distribution weights.
     Treats Biology Y12 and Y13 as a single subject for selection purposes,
     ensuring Biology doesn't appear twice as often as other subjects.
     
+    The cumulative-weight tables are cached per (subjects, distribution), so
+    repeated draws are a bisect instead of a linear scan.
+    
     Args:
-        subjects: List of Subject objects
+        subjects: List of subjects (models or curriculum index entries)
         distribution: Dictionary with subject_id: weight pairs
         
     Returns:
-        Selected Subject object or None if no subjects
+        Selected subject or None if no subjects
     """
     if not subjects:
         return None
     
-    # Separate Biology subjects from others
-    biology_subjects = [s for s in subjects if "Biology" in s.title]
-    non_biology_subjects = [s for s in subjects if "Biology" not in s.title]
-    
-    # If no Biology subjects, use standard selection
-    if not biology_subjects:
-        # Create weighted list for selection
-        subject_weights = [(subject, distribution.get(subject.id, 0)) for subject in subjects]
-        
-        # Filter out zero-weight subjects
-        subject_weights = [(subject, weight) for subject, weight in subject_weights if weight > 0]
-        
-        if not subject_weights:
-            # Fallback to equal weighting if all weights are zero
-            subject_weights = [(subject, 1) for subject in subjects]
-    else:
-        # Step 1: Create category weights
-        # Combined weight for all Biology subjects
-        biology_total_weight = sum(distribution.get(s.id, 0) for s in biology_subjects)
-        
-        # Weights for individual non-Biology subjects
-        non_bio_weights = [(subject, distribution.get(subject.id, 0)) for subject in non_biology_subjects]
-        
-        # Step 2: Create category selection list
-        # Biology is treated as a single category
-        category_weights = [("biology", biology_total_weight)] + [(s, w) for s, w in non_bio_weights]
-        
-        # Filter out zero-weight categories
-        category_weights = [(cat, weight) for cat, weight in category_weights if weight > 0]
-        
-        if not category_weights:
-            # Fallback to equal weighting
-            effective_count = 1 + len(non_biology_subjects)  # Biology counts as ONE
-            equal_weight = 1.0 / effective_count if effective_count > 0 else 0
-            
-            category_weights = [("biology", equal_weight)]
-            category_weights.extend([(s, equal_weight) for s in non_biology_subjects])
-        
-        # Step 3: Select category
-        total_weight = sum(weight for _, weight in category_weights)
-        
-        if total_weight == 0:
-            # Fallback to random with equal probability between Biology and each other subject
-            choices = ["biology"] + non_biology_subjects
-            category_choice = random.choice(choices)
-        else:
-            # Weighted selection for category
-            r = random.uniform(0, total_weight)
-            current_weight = 0
-            
-            category_choice = None
-            for category, weight in category_weights:
-                current_weight += weight
-                if r <= current_weight:
-                    category_choice = category
-                    break
-            
-            # Fallback if no category selected
-            if category_choice is None:
-                category_choice = category_weights[0][0] if category_weights else "biology"
-        
-        # Step 4: If Biology selected, choose between Y12 and Y13 based on relative weights
-        if category_choice == "biology":
-            # Calculate relative weights within Biology
-            if len(biology_subjects) > 1:
-                # Multiple Biology subjects - weight by distribution
-                bio_weights = [(s, distribution.get(s.id, 0)) for s in biology_subjects]
-                bio_total = sum(w for _, w in bio_weights)
-                
-                if bio_total == 0:
-                    # Equal weights if all zero
-                    bio_weights = [(s, 1) for s in biology_subjects]
-                    bio_total = len(biology_subjects)
-                
-                # Select Biology subject based on relative weights
-                r = random.uniform(0, bio_total)
-                current_weight = 0
-                
-                for subject, weight in bio_weights:
-                    current_weight += weight
-                    if r <= current_weight:
-                        return subject
-                
-                # Fallback
-                return biology_subjects[0]
-            else:
-                # Only one Biology subject
-                return biology_subjects[0]
-        else:
-            # Non-Biology subject was selected
-            return category_choice
-    
-    # Standard weighted selection for non-categorized approach
-    total_weight = sum(weight for _, weight in subject_weights)
+    key = (tuple(s.id for s in subjects), tuple(sorted(distribution.items())))
+    tables = _selection_tables.get(key)
+    if tables is None:
+        tables = _build_selection_tables(subjects, distribution)
+        # Distributions only change with the curriculum, so a small cache is enough
+        if len(_selection_tables) >= MAX_SELECTION_TABLES:
+            _selection_tables.clear()
+        _selection_tables[key] = tables
     
-    if total_weight == 0:
-        # Fallback to random selection
-        return random.choice(subjects)
+    category_table, biology_table = tables
+    choice = category_table.sample()
     
-    # Weighted random selection
-    r = random.uniform(0, total_weight)
-    current_weight = 0
+    if choice == "biology":
+        choice = biology_table.sample()
     
-    for subject, weight in subject_weights:
-        current_weight += weight
-        if r <= current_weight:
-            return subject
+    if choice is None:
+        # Fallback (should not be reached)
+        return subjects[0]
     
-    # Fallback (should not be reached)
-    return subjects[0] if subjects else None
+    return subjects[choice]
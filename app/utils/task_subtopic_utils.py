@@ -5,6 +5,8 @@ Handles subtopic selection and task subtopic management.
 
 from app import db
 from app.models.task import TaskSubtopic
+from app.utils.curriculum_index import get_curriculum_index
+from app.utils.weighted_sampler import get_subtopic_order
 
 def add_subtopics_to_task(task, parent_topic, user, max_duration=None):
     """
@@ -12,6 +14,9 @@ def add_subtopics_to_task(task, parent_topic, user, max_duration=None):
     Prioritizes subtopics with lower confidence levels using the (7 - confidence_level)² formula.
     Respects user's study_hours_per_day and weekend_study_hours preferences.
     
+    Nothing is written here: the subtopics are attached to the task in memory
+    and the caller saves the whole task graph in a single commit.
+    
     Args:
         task: Task object to add subtopics to
         parent_topic: Topic object containing subtopics
@@ -24,117 +29,125 @@ def add_subtopics_to_task(task, parent_topic, user, max_duration=None):
     """
     # Determine appropriate max duration based on user preferences
     if max_duration is None:
-        from datetime import datetime, timedelta
-        
-        # Check if today is a weekend (5=Saturday, 6=Sunday)
-        today = datetime.utcnow().date()
-        is_weekend = today.weekday() >= 5
-        
-        # Get study hours based on day of week
-        if is_weekend and hasattr(user, 'weekend_study_hours'):
-            # Use weekend study hours if it's a weekend
-            hours = user.weekend_study_hours
-        elif hasattr(user, 'study_hours_per_day'):
-            # Use weekday study hours
-            hours = user.study_hours_per_day
-        else:
-            # Default if user preferences aren't set
-            hours = 2.0 if not is_weekend else 3.0
-        
-        # Calculate one-third of the total study time (for 3 subjects)
-        # This ensures the 3 tasks will fit within the user's preferred study hours
-        subject_hours = hours / 3.0
+        from datetime import datetime
+        max_duration = get_task_duration(user, task.due_date or datetime.utcnow().date())
         
-        # Convert hours to minutes without an upper limit
-        # Just ensure it's at least 15 minutes to accommodate a single subtopic
-        max_duration = max(int(subject_hours * 60), 15)
-
         # Set the task's total_duration to match the target duration
         # This ensures that even if we don't add enough subtopics, the displayed duration is correct
         task.total_duration = max_duration
         
-        # If we're generating 3 tasks and each has exactly this duration,
-        # the total will match the user's study hour preference
-    from app.models.curriculum import Subtopic
-    from app.models.confidence import SubtopicConfidence
-    import random
-    
-    # Get all subtopics for this topic
-    subtopics = Subtopic.query.filter_by(topic_id=parent_topic.id).all()
+    # Get all subtopics for this topic from the curriculum snapshot
+    subtopics = get_curriculum_index().get_subtopics(parent_topic.id)
     
     if not subtopics:
         return task
     
-    try:
-        # Get subtopic IDs for confidence query
-        subtopic_ids = [s.id for s in subtopics]
-        
-        # Query confidence data for all subtopics at once
-        confidence_data = SubtopicConfidence.query.filter(
-            SubtopicConfidence.user_id == user.id,
-            SubtopicConfidence.subtopic_id.in_(subtopic_ids)
-        ).all()
-        
-        # Create dictionary for quick lookup
-        confidence_dict = {conf.subtopic_id: conf.confidence_level for conf in confidence_data}
-        
-        # Apply weighting formula (7 - confidence_level)²
-        # Higher weight = higher priority for selection
-        weighted_subtopics = []
-        
-        for subtopic in subtopics:
-            # Get confidence level (default to 3 if not found - 50% confidence)
-            confidence_level = confidence_dict.get(subtopic.id, 3)
-            
-            # Apply formula: (7 - confidence_level)²
-            # This gives higher weights to subtopics with lower confidence
-            weight = (7 - confidence_level) ** 2
-            
-            weighted_subtopics.append((subtopic, weight))
-        
-        # Sort by weight (descending) to prioritize low-confidence subtopics
-        weighted_subtopics.sort(key=lambda x: x[1], reverse=True)
-        
-        # Extract just the subtopics in their weighted order
-        subtopics = [s for s, _ in weighted_subtopics]
+    subtopics = order_subtopics_for_user(user, parent_topic, subtopics)
+    
+    # Add subtopics until we reach the max duration
+    added_subtopics = []
+    
+    for subtopic in select_subtopics_for_duration(subtopics, max_duration):
+        # Attach through the relationship so the link is written with the task
+        task.subtopics.append(TaskSubtopic(
+            task_id=task.id,
+            subtopic_id=subtopic.id,
+            duration=subtopic.estimated_duration
+        ))
+        added_subtopics.append(subtopic.title)
+    
+    # Update task description with subtopics
+    update_task_description_with_subtopics(task, added_subtopics)
+    
+    # Force the total duration to match the target duration, even if subtopics don't add up exactly
+    task.total_duration = max_duration
+    
+    return task
+
+def order_subtopics_for_user(user, parent_topic, subtopics):
+    """
+    Order a topic's subtopics for a user, lowest confidence first, using the
+    cached (7 - confidence_level)² ordering.
+    
+    Args:
+        user: User object
+        parent_topic: Topic the subtopics belong to
+        subtopics: List of subtopics
         
+    Returns:
+        List of subtopics in priority order (shuffled if the ordering fails)
+    """
+    try:
+        return get_subtopic_order(user.id, parent_topic.id, subtopics)
     except Exception as e:
         # Log the error but don't crash - fall back to random selection
+        import random
         from flask import current_app
         current_app.logger.error(f"Error in subtopic selection: {str(e)}")
+        subtopics = list(subtopics)
         random.shuffle(subtopics)
+        return subtopics
+
+def get_task_duration(user, day):
+    """
+    Target duration of one task on a day: a third of the user's study hours
+    (weekend hours on Saturday and Sunday), at least 15 minutes.
     
-    # Add subtopics until we reach the max duration
+    Args:
+        user: Object with study_hours_per_day and weekend_study_hours (User or plain record)
+        day: Date the task is planned for
+        
+    Returns:
+        Duration in minutes
+    """
+    # Check if the day is a weekend (5=Saturday, 6=Sunday)
+    is_weekend = day.weekday() >= 5
+    
+    # Get study hours based on day of week
+    if is_weekend and getattr(user, 'weekend_study_hours', None) is not None:
+        # Use weekend study hours if it's a weekend
+        hours = user.weekend_study_hours
+    elif getattr(user, 'study_hours_per_day', None) is not None:
+        # Use weekday study hours
+        hours = user.study_hours_per_day
+    else:
+        # Default if user preferences aren't set
+        hours = 2.0 if not is_weekend else 3.0
+    
+    # Calculate one-third of the total study time (for 3 subjects)
+    # This ensures the 3 tasks will fit within the user's preferred study hours
+    subject_hours = hours / 3.0
+    
+    # Convert hours to minutes without an upper limit
+    # Just ensure it's at least 15 minutes to accommodate a single subtopic
+    return max(int(subject_hours * 60), 15)
+
+def select_subtopics_for_duration(subtopics, max_duration):
+    """
+    Take subtopics in the given (weighted) order until the duration is filled.
+    
+    Args:
+        subtopics: Subtopics in priority order
+        max_duration: Duration to fill in minutes
+        
+    Returns:
+        List of selected subtopics
+    """
     remaining_duration = max_duration
-    added_subtopics = []
+    selected = []
+    selected_titles = set()
     
     for subtopic in subtopics:
-        if remaining_duration >= subtopic.estimated_duration and subtopic.title not in added_subtopics:
-            task_subtopic = TaskSubtopic(
-                task_id=task.id,
-                subtopic_id=subtopic.id,
-                duration=subtopic.estimated_duration
-            )
-            db.session.add(task_subtopic)
-            
+        if remaining_duration >= subtopic.estimated_duration and subtopic.title not in selected_titles:
+            selected.append(subtopic)
+            selected_titles.add(subtopic.title)
             remaining_duration -= subtopic.estimated_duration
-            added_subtopics.append(subtopic.title)
             
             # Stop if we've reached the target duration
             if remaining_duration < 15:  # Minimum subtopic duration
                 break
     
-    # Commit changes
-    db.session.commit()
-    
-    # Update task description with subtopics
-    update_task_description_with_subtopics(task, added_subtopics)
-    
-    # Force the total duration to match the target duration, even if subtopics don't add up exactly
-    task.total_duration = max_duration
-    db.session.commit()
-    
-    return task
+    return selected
 
 def update_task_description_with_subtopics(task, added_subtopics):
     """
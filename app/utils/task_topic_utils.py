@@ -4,19 +4,26 @@ Handles topic selection for curriculum-based task generation.
 """
 
 import random
-from app.models.curriculum import Topic
-from app.models.confidence import TopicConfidence
+from app.utils.curriculum_index import get_curriculum_index
+from app.utils.topic_recency import get_topic_recency
+from app.utils.weighted_sampler import get_topic_sampler
 
-def select_weighted_topic(topics, user, subject_code):
+def select_weighted_topic(topics, user, subject_code, due_date=None, planned_topic_ids=None):
     """
     Select a topic using confidence-based weighted selection.
     Uses the formula (7 - confidence_level)² to prioritize lower confidence topics.
     Also avoids recently used topics to increase variety.
     
+    Weights come from a cached per-user sampler and recent topics from the
+    per-user recency index, so a draw is O(log n) with no Task queries.
+    
     Args:
         topics: List of Topic objects to choose from
         user: User object
         subject_code: Subject code
+        due_date: Day the task is planned for (defaults to today)
+        planned_topic_ids: Topics of unsaved tasks in the same batch, avoided
+                           like topics already planned that day
     
     Returns:
         The selected topic object.
@@ -24,109 +31,36 @@ def select_weighted_topic(topics, user, subject_code):
     if not topics:
         return None
     
-    # Get confidence levels for all topics in one query
-    topic_ids = [topic.id for topic in topics]
+    topics_by_id = {topic.id: topic for topic in topics}
     
     try:
-        # Query topic confidence data for this user and these topics
-        confidence_data = TopicConfidence.query.filter(
-            TopicConfidence.user_id == user.id,
-            TopicConfidence.topic_id.in_(topic_ids)
-        ).all()
-        
-        # Create dictionary for quick lookup
-        confidence_dict = {conf.topic_id: conf.confidence_percent for conf in confidence_data}
-        
-        # Check for recently used topics with much stricter filtering
-        from app.models.task import Task
-        from datetime import datetime, timedelta
-        
-        today = datetime.utcnow().date()
-        
-        # Get all tasks from today, both completed and active
-        todays_tasks = Task.query.filter(
-            Task.user_id == user.id,
-            Task.topic_id.in_(topic_ids),
-            Task.due_date == today
-        ).all()
-        
-        # Get tasks from the past 7 days
-        recent_date = datetime.utcnow() - timedelta(days=7)
-        recent_tasks = Task.query.filter(
-            Task.user_id == user.id,
-            Task.topic_id.in_(topic_ids),
-            Task.created_at >= recent_date
-        ).all()
-        
-        # Create sets of topic IDs to exclude
-        # First priority: exclude topics used today (strongest filter)
-        today_topic_ids = {task.topic_id for task in todays_tasks}
-        
-        # Second priority: exclude topics used in the past 7 days
-        recent_topic_ids = {task.topic_id for task in recent_tasks}
-        
-        # Get topics excluding today's topics
-        unused_today_topics = [topic for topic in topics if topic.id not in today_topic_ids]
-        
-        # If we have enough topics excluding today's, use those
-        if len(unused_today_topics) > 0:
-            candidate_topics = unused_today_topics
-        else:
-            # If filtering by today leaves us with nothing, try filtering only by completed tasks
-            completed_task_ids = {task.topic_id for task in recent_tasks if task.completed_at is not None}
-            topics_not_completed = [topic for topic in topics if topic.id not in completed_task_ids]
-            
-            if len(topics_not_completed) > 0:
-                candidate_topics = topics_not_completed
-            else:
-                # Last resort: use all topics
-                candidate_topics = topics
-        
-        # More randomization - shuffle the list to break predictable patterns
-        random.shuffle(candidate_topics)
-        
-        # If no confidence data exists or all confidence is equal, use random selection
-        if not confidence_dict or len(set(confidence_dict.values())) <= 1:
-            return random.choice(candidate_topics)
-        
-        # Apply weighting formula (7 - confidence_level)²
-        # Higher weight = higher priority for selection
-        topic_weights = []
-        
-        for topic in candidate_topics:
-            # Get confidence level (default to 3 if not found - 50% confidence)
-            confidence_percent = confidence_dict.get(topic.id, 50.0)
-            
-            # Convert percentage (0-100) to scale (1-5)
-            confidence_level = confidence_percent / 20  # 100% → 5, 80% → 4, etc.
-                
-            # Apply formula: (7 - confidence_level)²
-            # This gives higher weights to topics with lower confidence
-            weight = (7 - confidence_level) ** 2
-            
-            topic_weights.append((topic, weight))
-        
-        # Choose a topic using weighted random selection
-        if not topic_weights:
-            # Fallback if weighting failed
-            return random.choice(topics)
-        
-        # Rather than just taking the top few, use proper weighted random selection
-        total_weight = sum(weight for _, weight in topic_weights)
-        if total_weight == 0:
-            return random.choice(candidate_topics)
-            
-        # Weighted random selection
-        r = random.uniform(0, total_weight)
-        current_weight = 0
-        
-        for topic, weight in topic_weights:
-            current_weight += weight
-            if r <= current_weight:
-                return topic
-                
-        # Fallback - should rarely be reached
-        return random.choice(candidate_topics)
+        # Cached sampler over this topic set (one confidence query on a miss)
+        sampler = get_topic_sampler(user.id, topics)
+        recency = get_topic_recency(user.id)
+        
+        if due_date is None:
+            from datetime import datetime
+            due_date = datetime.utcnow().date()
+        
+        # First priority: exclude topics already planned that day (strongest filter)
+        planned = recency.topics_on(due_date)
+        if planned_topic_ids:
+            planned = planned | planned_topic_ids
+        topic = topics_by_id.get(sampler.sample(exclude=planned))
+        if topic is not None:
+            return topic
+        
+        # If filtering by day leaves us with nothing, try filtering only by
+        # topics completed in the past week
+        completed_mask = recency.completed_mask(due_date)
+        completed_topic_ids = [topic_id for topic_id in topics_by_id if completed_mask >> topic_id & 1]
+        
+        topic = topics_by_id.get(sampler.sample(exclude=completed_topic_ids))
+        if topic is not None:
+            return topic
+        
+        # Last resort: use all topics
+        return topics_by_id.get(sampler.sample()) or random.choice(topics)
         
     except Exception as e:
         # Log the error but don't crash - fall back to random selection
@@ -143,14 +77,16 @@ def get_topics_for_subject(subject_id, include_nested=True):
         include_nested: Whether to include nested topics (default: True)
         
     Returns:
-        List of Topic objects
+        List of topic entries from the curriculum index
     """
+    index = get_curriculum_index()
+    
     # Check if this is a nested structure (Psychology)
-    paper_topics = Topic.query.filter_by(subject_id=subject_id, parent_topic_id=None).all()
+    paper_topics = index.get_root_topics(subject_id)
     
     # If this is a standard (non-nested) subject or if include_nested is False
     if len(paper_topics) == 0 or not include_nested:
-        return Topic.query.filter_by(subject_id=subject_id).all()
+        return index.get_topics(subject_id)
     
     return paper_topics
 
@@ -162,9 +98,9 @@ def get_subtopic_categories(paper_topic_id):
         paper_topic_id: ID of the paper topic to get categories for
         
     Returns:
-        List of Topic objects representing subtopic categories
+        List of topic entries representing subtopic categories
     """
-    return Topic.query.filter_by(parent_topic_id=paper_topic_id).all()
+    return get_curriculum_index().get_child_topics(paper_topic_id)
 
 def calculate_topic_priority(user_id, topic_id, days_threshold=14):
     """
@@ -0,0 +1,88 @@
+"""
+Task type registry.
+The task_types table holds a handful of rows that never change at runtime, so
+they are loaded once into an immutable in-process registry. It is refreshed
+after default types are created and when db_manage repairs or initializes the database.
+"""
+
+import threading
+from collections import namedtuple
+from app import db
+
+# Read-only record exposing the same attribute names as the TaskType model
+TaskTypeEntry = namedtuple('TaskTypeEntry', ['id', 'name', 'description'])
+
+_registry = None
+_lock = threading.Lock()
+
+
+class TaskTypeRegistry:
+    """Immutable lookup of task types by ID and by name."""
+
+    def __init__(self, entries):
+        self.entries = tuple(entries)
+        self._by_id = {entry.id: entry for entry in self.entries}
+        self._by_name = {entry.name: entry for entry in self.entries}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def all(self):
+        """All task types ordered by ID."""
+        return list(self.entries)
+
+    def get(self, task_type_id):
+        """Get a task type by ID, or None."""
+        return self._by_id.get(task_type_id)
+
+    def get_by_name(self, name):
+        """Get a task type by name, or None."""
+        return self._by_name.get(name)
+
+    def first(self):
+        """The task type with the lowest ID, or None."""
+        return self.entries[0] if self.entries else None
+
+    @property
+    def uplearn_id(self):
+        """ID of the Uplearn task type, or None."""
+        uplearn = self._by_name.get('uplearn')
+        return uplearn.id if uplearn else None
+
+
+def load_task_type_registry():
+    """Build a registry from the database with one projection query."""
+    from app.models.task import TaskType
+
+    rows = db.session.query(TaskType.id, TaskType.name, TaskType.description).order_by(TaskType.id).all()
+    return TaskTypeRegistry(TaskTypeEntry(*row) for row in rows)
+
+
+def get_task_type_registry():
+    """
+    Get the process-wide registry, loading it on first use.
+    An empty registry (table not seeded yet) is reloaded on the next call.
+
+    Returns:
+        The current TaskTypeRegistry
+    """
+    global _registry
+
+    registry = _registry
+    if registry:
+        return registry
+
+    with _lock:
+        if not _registry:
+            _registry = load_task_type_registry()
+        return _registry
+
+
+def refresh_task_type_registry():
+    """Reload the registry from the database (after default types are created or repaired)."""
+    global _registry
+
+    registry = load_task_type_registry()
+    with _lock:
+        _registry = registry
+    return registry
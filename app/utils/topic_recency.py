@@ -0,0 +1,200 @@
+"""
+Topic recency index for task generation.
+Keeps, per user, a day-bucketed ring of the topics planned on each day and a
+bitset of the topics completed, so recent-topic checks never scan the Task table.
+
+Cached indexes are updated from Task writes once their transaction commits
+(see register_topic_recency), so rolled-back tasks never reach them.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+# Look-back window for recently completed topics
+RECENCY_DAYS = 7
+# Ring slots: the look-back window, today and tomorrow (pregenerated plans)
+RING_SIZE = RECENCY_DAYS + 2
+# How long a cached index is trusted before reloading (other workers may write tasks)
+RECENCY_TTL_SECONDS = 300
+MAX_CACHED_USERS = 1024
+
+
+class TopicRecency:
+    """
+    Ring of RING_SIZE day buckets addressed by date ordinal.
+
+    Each slot holds the ordinal it currently represents, the set of topic IDs
+    planned that day and a bitset (Python int, bit = topic ID) of the topics
+    completed that day. A slot whose ordinal doesn't match is stale and empty.
+    """
+
+    def __init__(self):
+        self.loaded_at = time.time()
+        self._days = [None] * RING_SIZE
+        self._topics = [set() for _ in range(RING_SIZE)]
+        self._completed = [0] * RING_SIZE
+
+    def _slot(self, day, create=False):
+        """Ring position for a date, or None if the slot holds another day."""
+        ordinal = day.toordinal()
+        pos = ordinal % RING_SIZE
+        if self._days[pos] != ordinal:
+            if not create:
+                return None
+            self._days[pos] = ordinal
+            self._topics[pos] = set()
+            self._completed[pos] = 0
+        return pos
+
+    def add(self, topic_id, day, completed=False):
+        """Record a topic planned (and optionally completed) on a day."""
+        today = datetime.utcnow().date()
+        # Ignore days outside the window so they can't evict a live slot
+        if topic_id is None or not today - timedelta(days=RECENCY_DAYS) <= day <= today + timedelta(days=1):
+            return
+        pos = self._slot(day, create=True)
+        self._topics[pos].add(topic_id)
+        if completed:
+            self._completed[pos] |= 1 << topic_id
+
+    def topics_on(self, day):
+        """Set of topic IDs planned on a day."""
+        pos = self._slot(day)
+        return self._topics[pos] if pos is not None else set()
+
+    def used_on(self, topic_id, day):
+        """Whether a topic was planned on a day."""
+        return topic_id in self.topics_on(day)
+
+    def completed_mask(self, day, days=RECENCY_DAYS):
+        """Bitset of topics completed in the `days` days up to and including `day`."""
+        mask = 0
+        for offset in range(days + 1):
+            pos = self._slot(day - timedelta(days=offset))
+            if pos is not None:
+                mask |= self._completed[pos]
+        return mask
+
+    def completed_recently(self, topic_id, day, days=RECENCY_DAYS):
+        """Whether a topic was completed in the `days` days up to and including `day`."""
+        return bool(self.completed_mask(day, days) >> topic_id & 1)
+
+
+# Per-user indexes, least recently used first
+_user_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def load_topic_recency(user_id):
+    """
+    Build a user's recency index with one projection query over the ring window.
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        A new TopicRecency
+    """
+    from app.models.task import Task
+
+    today = datetime.utcnow().date()
+    rows = Task.query.with_entities(
+        Task.topic_id, Task.due_date, Task.completed_at
+    ).filter(
+        Task.user_id == user_id,
+        Task.topic_id.isnot(None),
+        Task.due_date >= today - timedelta(days=RECENCY_DAYS),
+        Task.due_date <= today + timedelta(days=1)
+    ).all()
+
+    recency = TopicRecency()
+    for topic_id, due_date, completed_at in rows:
+        recency.add(topic_id, due_date, completed=completed_at is not None)
+    return recency
+
+
+def get_topic_recency(user_id):
+    """
+    Get the cached recency index for a user, loading it on a miss or after the TTL.
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        TopicRecency for the user
+    """
+    with _lock:
+        recency = _user_cache.get(user_id)
+        if recency is not None and time.time() - recency.loaded_at <= RECENCY_TTL_SECONDS:
+            _user_cache.move_to_end(user_id)
+            return recency
+
+    recency = load_topic_recency(user_id)
+
+    with _lock:
+        _user_cache[user_id] = recency
+        while len(_user_cache) > MAX_CACHED_USERS:
+            _user_cache.popitem(last=False)
+    return recency
+
+
+def _record(user_id, topic_id, due_date, completed):
+    """
+    Apply one task to its user's cached index (if the user has one).
+    Skipped tasks stay in their day bucket, so skipping doesn't free the topic.
+    """
+    if topic_id is None or due_date is None:
+        return
+    with _lock:
+        recency = _user_cache.get(user_id)
+        if recency is not None:
+            recency.add(topic_id, due_date, completed=completed)
+
+
+def _after_flush(session, flush_context):
+    """Note the tasks written in this flush; they are applied on commit."""
+    from app.models.task import Task
+
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Task):
+            # Read the values now: after the commit the objects are expired
+            session.info.setdefault('recency_tasks', []).append(
+                (obj.user_id, obj.topic_id, obj.due_date, obj.completed_at is not None)
+            )
+
+
+def _after_commit(session):
+    """Apply the tasks noted since the last commit."""
+    for values in session.info.pop('recency_tasks', ()):
+        _record(*values)
+
+
+def _after_rollback(session):
+    """Drop the tasks of a rolled-back transaction."""
+    session.info.pop('recency_tasks', None)
+
+
+def register_topic_recency(session):
+    """
+    Attach the listeners that keep cached indexes in step with committed Task writes.
+
+    Args:
+        session: Session, sessionmaker or scoped_session to listen on
+    """
+    if event.contains(session, 'after_flush', _after_flush):
+        return
+    event.listen(session, 'after_flush', _after_flush)
+    event.listen(session, 'after_commit', _after_commit)
+    event.listen(session, 'after_rollback', _after_rollback)
+
+
+def clear_topic_recency(user_id=None):
+    """Clear the cached recency index for one user, or for everyone."""
+    with _lock:
+        if user_id is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(user_id, None)
@@ -0,0 +1,303 @@
+"""
+Weighted sampling utilities for task generation.
+Provides cumulative-weight structures for O(log n) draws and per-user caches
+of topic samplers and subtopic orderings, updated in place when confidence changes.
+"""
+
+import math
+import random
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+
+# How long cached per-user structures are trusted before reloading
+# (other workers may have changed the underlying confidence rows)
+SAMPLER_TTL_SECONDS = 300
+MAX_CACHED_USERS = 1024
+
+# Point updates leave float rounding in the tree's partial sums, so it is
+# rebuilt from the stored weights after this many of them
+REBUILD_EVERY = 1024
+# Remaining mass (relative to the total) below which a draw counts as empty
+EMPTY_EPSILON = 1e-9
+# Tree draws that land on an excluded key (rounding at a boundary) before
+# falling back to an exact linear draw
+MAX_REJECTIONS = 4
+
+
+def confidence_weight(confidence_level):
+    """Priority weight using the (7 - confidence_level)² formula."""
+    return (7 - confidence_level) ** 2
+
+
+def topic_weight(confidence_percent):
+    """Weight for a topic from its confidence percentage (100% -> level 5)."""
+    return confidence_weight(confidence_percent / 20)
+
+
+class CumulativeTable:
+    """Immutable cumulative-weight array; draws are a bisect over the prefix sums."""
+
+    def __init__(self, keys, weights):
+        self.keys = list(keys)
+        self._cumulative = list(accumulate(weights))
+        self.total = self._cumulative[-1] if self._cumulative else 0
+
+    def sample(self, rng=random):
+        """Draw a key with probability proportional to its weight, or None."""
+        if self.total <= 0:
+            return None
+        index = bisect_right(self._cumulative, rng.random() * self.total)
+        return self.keys[min(index, len(self.keys) - 1)]
+
+
+class WeightedSampler:
+    """
+    Fenwick (binary indexed) tree over item weights.
+    Supports O(log n) draws and O(log n) point updates of a single weight.
+    """
+
+    def __init__(self, keys, weights):
+        self._lock = threading.RLock()
+        self.keys = list(keys)
+        self._pos = {key: i for i, key in enumerate(self.keys)}
+        self._weights = [float(w) for w in weights]
+        self._top_bit = 1 << (len(self.keys).bit_length() - 1) if self.keys else 0
+        self._build()
+
+    def _build(self):
+        """Build the tree from the stored weights in O(n)."""
+        tree = [0.0] * (len(self.keys) + 1)
+
+        # Push each node's sum to its parent
+        for i, weight in enumerate(self._weights, start=1):
+            tree[i] += weight
+            parent = i + (i & -i)
+            if parent <= len(self.keys):
+                tree[parent] += tree[i]
+
+        self._tree = tree
+        self._updates = 0
+
+    def __contains__(self, key):
+        return key in self._pos
+
+    def weight(self, key):
+        """Current weight of a key (0 if unknown)."""
+        pos = self._pos.get(key)
+        return self._weights[pos] if pos is not None else 0.0
+
+    def total(self):
+        """Sum of all weights."""
+        total = 0.0
+        i = len(self.keys)
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _prefix(self, pos):
+        """Sum of the weights of the items before position pos."""
+        total = 0.0
+        i = pos
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def update(self, key, weight):
+        """Set the weight of a single key in O(log n)."""
+        pos = self._pos.get(key)
+        if pos is None:
+            return
+        with self._lock:
+            delta = float(weight) - self._weights[pos]
+            self._weights[pos] = float(weight)
+            self._updates += 1
+            if self._updates >= REBUILD_EVERY:
+                self._build()
+                return
+            i = pos + 1
+            while i <= len(self.keys):
+                self._tree[i] += delta
+                i += i & -i
+
+    def _find(self, target):
+        """Position of the first item whose prefix sum exceeds target."""
+        pos = 0
+        step = self._top_bit
+        while step:
+            nxt = pos + step
+            if nxt <= len(self.keys) and self._tree[nxt] <= target:
+                pos = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        return min(pos, len(self.keys) - 1)
+
+    def sample(self, rng=random, exclude=()):
+        """
+        Draw a key with probability proportional to its weight.
+
+        Excluded keys are skipped without touching the tree: the draw is made
+        over the remaining mass (total minus the excluded weights) and mapped
+        past the excluded items' ranges.
+
+        Returns:
+            A key, or None if every remaining weight is zero.
+        """
+        with self._lock:
+            total = self.total()
+            excluded = sorted({self._pos[key] for key in exclude if key in self._pos})
+            remaining = total - math.fsum(self._weights[pos] for pos in excluded)
+            if remaining <= EMPTY_EPSILON * max(total, 1.0):
+                return None
+            if not excluded:
+                return self.keys[self._find(rng.random() * total)]
+
+            # Prefix sums don't change during the draw, so compute them once
+            skips = [(self._prefix(pos), self._weights[pos]) for pos in excluded]
+            excluded_set = set(excluded)
+            for _ in range(MAX_REJECTIONS):
+                target = rng.random() * remaining
+                for start, weight in skips:
+                    if target >= start:
+                        target += weight
+                pos = self._find(target)
+                if pos not in excluded_set and self._weights[pos] > 0:
+                    return self.keys[pos]
+
+            return self._sample_linear(rng, excluded_set)
+
+    def _sample_linear(self, rng, excluded):
+        """Exact O(n) draw over the stored weights, skipping excluded positions."""
+        candidates = [(pos, weight) for pos, weight in enumerate(self._weights)
+                      if pos not in excluded and weight > 0]
+        if not candidates:
+            return None
+        target = rng.random() * math.fsum(weight for _, weight in candidates)
+        for pos, weight in candidates:
+            target -= weight
+            if target < 0:
+                return self.keys[pos]
+        return self.keys[candidates[-1][0]]
+
+
+# Per-user caches: user_id -> {'loaded_at', 'topics': {scope: sampler}, 'subtopics': {topic_id: order}}
+_user_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _user_entry(user_id):
+    """Get (or reset) the cache entry for a user. Caller must hold the lock."""
+    entry = _user_cache.get(user_id)
+    if entry is None or time.time() - entry['loaded_at'] > SAMPLER_TTL_SECONDS:
+        entry = {'loaded_at': time.time(), 'topics': {}, 'subtopics': {}}
+        _user_cache[user_id] = entry
+        while len(_user_cache) > MAX_CACHED_USERS:
+            _user_cache.popitem(last=False)
+    else:
+        _user_cache.move_to_end(user_id)
+    return entry
+
+
+def get_topic_sampler(user_id, topics):
+    """
+    Get the cached sampler for a user over a set of topics (one subject or paper),
+    loading topic confidences in one query on a miss.
+
+    Args:
+        user_id: User ID
+        topics: List of topics (models or curriculum index entries)
+
+    Returns:
+        WeightedSampler keyed by topic ID
+    """
+    scope = tuple(topic.id for topic in topics)
+
+    with _lock:
+        sampler = _user_entry(user_id)['topics'].get(scope)
+    if sampler is not None:
+        return sampler
+
+    from app.models.confidence import TopicConfidence
+
+    rows = TopicConfidence.query.with_entities(
+        TopicConfidence.topic_id, TopicConfidence.confidence_percent
+    ).filter(
+        TopicConfidence.user_id == user_id,
+        TopicConfidence.topic_id.in_(scope)
+    ).all()
+    confidence_dict = {topic_id: percent for topic_id, percent in rows}
+
+    # Missing confidence defaults to 50%
+    sampler = WeightedSampler(scope, [topic_weight(confidence_dict.get(t, 50.0)) for t in scope])
+
+    with _lock:
+        _user_entry(user_id)['topics'][scope] = sampler
+    return sampler
+
+
+def get_subtopic_order(user_id, topic_id, subtopics):
+    """
+    Get a topic's subtopics ordered by (7 - confidence_level)², highest weight first.
+    The ordering is cached per (user, topic) and dropped when a confidence changes.
+
+    Args:
+        user_id: User ID
+        topic_id: Topic ID the subtopics belong to
+        subtopics: List of subtopics (models or curriculum index entries)
+
+    Returns:
+        List of subtopics in weighted order
+    """
+    with _lock:
+        order = _user_entry(user_id)['subtopics'].get(topic_id)
+    if order is not None:
+        return list(order)
+
+    from app.models.confidence import SubtopicConfidence
+
+    rows = SubtopicConfidence.query.with_entities(
+        SubtopicConfidence.subtopic_id, SubtopicConfidence.confidence_level
+    ).filter(
+        SubtopicConfidence.user_id == user_id,
+        SubtopicConfidence.subtopic_id.in_([s.id for s in subtopics])
+    ).all()
+    confidence_dict = {subtopic_id: level for subtopic_id, level in rows}
+
+    # Stable sort keeps curriculum order for equal weights; missing confidence defaults to 3
+    order = tuple(sorted(subtopics, key=lambda s: confidence_weight(confidence_dict.get(s.id, 3)), reverse=True))
+
+    with _lock:
+        _user_entry(user_id)['subtopics'][topic_id] = order
+    return list(order)
+
+
+def update_topic_weight(user_id, topic_id, confidence_percent):
+    """Point-update a topic's weight in every cached sampler of this user."""
+    with _lock:
+        entry = _user_cache.get(user_id)
+        if entry is None:
+            return
+        for sampler in entry['topics'].values():
+            if topic_id in sampler:
+                sampler.update(topic_id, topic_weight(confidence_percent))
+
+
+def invalidate_subtopic_order(user_id, topic_id):
+    """Drop the cached subtopic ordering of a topic for a user."""
+    with _lock:
+        entry = _user_cache.get(user_id)
+        if entry is not None:
+            entry['subtopics'].pop(topic_id, None)
+
+
+def clear_user_samplers(user_id=None):
+    """Clear cached samplers for one user, or for everyone."""
+    with _lock:
+        if user_id is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(user_id, None)
@@ -17,6 +17,34 @@ class Config:
     CACHE_TYPE = 'SimpleCache'  # Simple memory cache
     CACHE_DEFAULT_TIMEOUT = 300  # Default timeout in seconds
     STATIC_CACHE_TIMEOUT = 86400  # 1 day cache for static files
+    CURRICULUM_CACHE_MAX_AGE = 86400  # Browser cache for the serialized curriculum hierarchy
+    
+    # Response compression (gzip, or zstd if the zstandard package is installed)
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 1024  # Bytes; smaller bodies aren't worth compressing
+    COMPRESS_LEVEL = 6
+    # Point url_for('static', ...) at the copies written by `flask build-static`
+    STATIC_FINGERPRINTING = False
+    
+    # Cross-worker cache in a SQLite file (CACHE_TYPE = 'app.utils.sqlite_cache.SQLiteCache'
+    # shares view caching too); defaults to instance/shared_cache.sqlite3
+    SHARED_CACHE_ENABLED = os.environ.get('SHARED_CACHE_ENABLED', 'false').lower() == 'true'
+    SHARED_CACHE_PATH = os.environ.get('SHARED_CACHE_PATH')
+    SHARED_CACHE_MAX_ENTRIES = 20000
+    SHARED_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+    
+    # Off-peak pre-generation of the next day's plans (in-process scheduler thread;
+    # one worker per day runs it, coordinated through the shared cache file)
+    PLAN_PREGENERATION_ENABLED = os.environ.get('PLAN_PREGENERATION_ENABLED', 'false').lower() == 'true'
+    PLAN_PREGENERATION_HOUR = int(os.environ.get('PLAN_PREGENERATION_HOUR', 2))  # UTC
+    PLAN_PREGENERATION_BATCH_SIZE = 50
+    PLAN_PREGENERATION_ACTIVE_DAYS = 30  # Only users seen in the last 30 days
+    PLAN_PREGENERATION_WORKERS = int(os.environ.get('PLAN_PREGENERATION_WORKERS', 1))  # Planner processes
+    
+    # Coalesce bursts of confidence edits and write them from a background thread
+    CONFIDENCE_WRITE_BEHIND_ENABLED = os.environ.get('CONFIDENCE_WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+    CONFIDENCE_WRITE_BEHIND_WINDOW = 0.5  # Seconds to collect a burst before writing it
+    CONFIDENCE_WRITE_BEHIND_MAX_PENDING = 500  # Flush immediately past this many pending subtopics
 
 
 class DevelopmentConfig(Config):
@@ -37,6 +65,9 @@ class TestingConfig(Config):
     # Disable caching for testing
     CACHE_TYPE = 'NullCache'
     STATIC_CACHE_TIMEOUT = 0  # No caching for testing
+    SHARED_CACHE_ENABLED = False
+    PLAN_PREGENERATION_ENABLED = False
+    CONFIDENCE_WRITE_BEHIND_ENABLED = False
 
 
 class ProductionConfig(Config):
@@ -46,9 +77,12 @@ class ProductionConfig(Config):
     # Use SQLite for production as well (no external database)
     SQLALCHEMY_DATABASE_URI = os.environ.get('LOCAL_DATABASE_URI', 'sqlite:///app.db')
     # Production caching settings
-    CACHE_TYPE = 'SimpleCache'  # You can use 'RedisCache' if Redis is available
+    # Gunicorn workers share one SQLite-file cache (no Redis available)
+    CACHE_TYPE = 'app.utils.sqlite_cache.SQLiteCache'
+    SHARED_CACHE_ENABLED = os.environ.get('SHARED_CACHE_ENABLED', 'true').lower() == 'true'
     CACHE_DEFAULT_TIMEOUT = 600  # 10 minutes
     STATIC_CACHE_TIMEOUT = 604800  # 7 days for production
+    STATIC_FINGERPRINTING = True  # Uses the manifest from `flask build-static` when present
 
 
 # Configuration dictionary to easily access different configs
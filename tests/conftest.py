@@ -0,0 +1,74 @@
+"""
+Shared fixtures: an app on the in-memory testing config and a small curriculum
+with a flat subject and a Psychology-style subject whose topics are nested.
+"""
+
+import pytest
+from types import SimpleNamespace
+from app import create_app, db
+
+
+@pytest.fixture
+def app():
+    """App on the testing config with a fresh in-memory database."""
+    from app.utils.curriculum_index import invalidate_curriculum_index
+    from app.utils.optimization_cache import clear_cache
+    from app.utils.weighted_sampler import clear_user_samplers
+
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+    # Process-wide caches outlive the database, so reset them between tests
+    invalidate_curriculum_index()
+    clear_user_samplers()
+    clear_cache()
+
+
+@pytest.fixture
+def curriculum(app):
+    """
+    Two subjects and a user.
+
+    Biology has one topic with two subtopics. Psychology has a paper with one
+    subtopic of its own, a category under it with two subtopics and a
+    sub-category under that with one.
+    """
+    from app.models.curriculum import Subject, Topic, Subtopic
+    from app.models.user import User
+    from app.utils.curriculum_index import invalidate_curriculum_index
+
+    biology = Subject(title='Biology')
+    psychology = Subject(title='Psychology')
+    db.session.add_all([biology, psychology])
+    db.session.flush()
+
+    cells = Topic(subject_id=biology.id, name='cells', title='Cells')
+    paper = Topic(subject_id=psychology.id, name='paper-1', title='Paper 1')
+    db.session.add_all([cells, paper])
+    db.session.flush()
+    memory = Topic(subject_id=psychology.id, parent_topic_id=paper.id, name='memory', title='Memory')
+    db.session.add(memory)
+    db.session.flush()
+    models = Topic(subject_id=psychology.id, parent_topic_id=memory.id, name='models', title='Models')
+    db.session.add(models)
+    db.session.flush()
+
+    subtopics = {}
+    for name, topic in [('organelles', cells), ('membranes', cells), ('paper-intro', paper),
+                        ('capacity', memory), ('encoding', memory), ('msm', models)]:
+        subtopics[name] = Subtopic(topic_id=topic.id, title=name)
+    db.session.add_all(subtopics.values())
+
+    user = User('alice', 'pw')
+    db.session.add(user)
+    db.session.commit()
+    invalidate_curriculum_index()
+
+    return SimpleNamespace(
+        user_id=user.id, biology_id=biology.id, psychology_id=psychology.id,
+        cells_id=cells.id, paper_id=paper.id, memory_id=memory.id, models_id=models.id,
+        subtopic_ids={name: subtopic.id for name, subtopic in subtopics.items()}
+    )
@@ -0,0 +1,173 @@
+"""
+The after_flush rollup keeps topic and subject totals equal to a from-scratch
+rebuild across ORM and Core writes, and verify_confidence_totals repairs drift.
+"""
+
+import pytest
+from sqlalchemy import text
+from app import db
+from app.models.confidence import SubtopicConfidence, TopicConfidence, SubjectConfidence
+from app.utils.confidence_rollup import rebuild_confidence_totals, topic_percent, verify_confidence_totals
+from app.utils.confidence_utils import initialize_confidences, upsert_subtopic_confidences
+
+
+def assert_consistent():
+    """The stored totals match a from-scratch rebuild."""
+    assert rebuild_confidence_totals(fix=False)['mismatched'] == 0
+
+
+def topic_totals(user_id, topic_id):
+    row = TopicConfidence.query.filter_by(user_id=user_id, topic_id=topic_id).first()
+    return (row.level_sum, row.level_count) if row else None
+
+
+def subject_totals(user_id, subject_id):
+    row = SubjectConfidence.query.filter_by(user_id=user_id, subject_id=subject_id).first()
+    return (row.level_sum, row.level_count) if row else None
+
+
+def add_confidence(user_id, subtopic_id, level):
+    confidence = SubtopicConfidence(user_id=user_id, subtopic_id=subtopic_id, confidence_level=level)
+    db.session.add(confidence)
+    return confidence
+
+
+def test_insert_rolls_up_to_ancestors_and_subject(curriculum):
+    ids = curriculum.subtopic_ids
+    add_confidence(curriculum.user_id, ids['msm'], 5)
+    add_confidence(curriculum.user_id, ids['capacity'], 1)
+    add_confidence(curriculum.user_id, ids['paper-intro'], 4)
+    db.session.commit()
+
+    assert topic_totals(curriculum.user_id, curriculum.models_id) == (5, 1)
+    assert topic_totals(curriculum.user_id, curriculum.memory_id) == (6, 2)
+    assert topic_totals(curriculum.user_id, curriculum.paper_id) == (10, 3)
+    assert subject_totals(curriculum.user_id, curriculum.psychology_id) == (10, 3)
+    assert topic_totals(curriculum.user_id, curriculum.cells_id) is None
+
+    # Memory has three subtopics in its subtree: 5, 1 and one unrated at 3
+    row = TopicConfidence.query.filter_by(user_id=curriculum.user_id, topic_id=curriculum.memory_id).one()
+    assert row.confidence_percent == pytest.approx(topic_percent(6, 2, 3))
+    assert_consistent()
+
+
+def test_update_moves_totals(curriculum):
+    ids = curriculum.subtopic_ids
+    confidence = add_confidence(curriculum.user_id, ids['msm'], 2)
+    db.session.commit()
+
+    confidence.confidence_level = 4
+    db.session.commit()
+    assert topic_totals(curriculum.user_id, curriculum.paper_id) == (4, 1)
+
+    # Moving a row to another subject takes its level with it
+    confidence.subtopic_id = ids['organelles']
+    db.session.commit()
+    assert topic_totals(curriculum.user_id, curriculum.paper_id) == (0, 0)
+    assert subject_totals(curriculum.user_id, curriculum.psychology_id) == (0, 0)
+    assert topic_totals(curriculum.user_id, curriculum.cells_id) == (4, 1)
+    assert subject_totals(curriculum.user_id, curriculum.biology_id) == (4, 1)
+    assert_consistent()
+
+
+def test_null_level_counts_as_default(curriculum):
+    confidence = add_confidence(curriculum.user_id, curriculum.subtopic_ids['encoding'], None)
+    db.session.commit()
+    assert topic_totals(curriculum.user_id, curriculum.memory_id) == (3, 1)
+
+    confidence.confidence_level = 5
+    db.session.commit()
+    assert topic_totals(curriculum.user_id, curriculum.memory_id) == (5, 1)
+    assert_consistent()
+
+
+def test_delete_removes_totals(curriculum):
+    ids = curriculum.subtopic_ids
+    kept = add_confidence(curriculum.user_id, ids['capacity'], 2)
+    removed = add_confidence(curriculum.user_id, ids['msm'], 5)
+    db.session.commit()
+
+    db.session.delete(removed)
+    db.session.commit()
+    assert topic_totals(curriculum.user_id, curriculum.models_id) == (0, 0)
+    assert topic_totals(curriculum.user_id, curriculum.paper_id) == (2, 1)
+    assert kept.confidence_level == 2
+    assert_consistent()
+
+
+def test_rolled_back_flush_leaves_no_totals(curriculum):
+    add_confidence(curriculum.user_id, curriculum.subtopic_ids['msm'], 5)
+    db.session.flush()
+    db.session.rollback()
+
+    assert topic_totals(curriculum.user_id, curriculum.models_id) is None
+    assert_consistent()
+
+
+def test_core_upsert_inserts_and_updates(curriculum):
+    ids = curriculum.subtopic_ids
+    add_confidence(curriculum.user_id, ids['capacity'], 1)
+    db.session.commit()
+
+    upsert_subtopic_confidences(curriculum.user_id, {
+        ids['capacity']: (5, None),   # existing ORM row
+        ids['msm']: (2, True),        # new row
+        ids['organelles']: (None, True)  # new row at the default level
+    })
+    assert topic_totals(curriculum.user_id, curriculum.memory_id) == (7, 2)
+    assert topic_totals(curriculum.user_id, curriculum.cells_id) == (3, 1)
+    assert subject_totals(curriculum.user_id, curriculum.psychology_id) == (7, 2)
+
+    # A None level keeps the stored one
+    upsert_subtopic_confidences(curriculum.user_id, {ids['msm']: (None, False)})
+    assert topic_totals(curriculum.user_id, curriculum.models_id) == (2, 1)
+    assert_consistent()
+
+
+def test_mixed_orm_and_bulk_writes(curriculum):
+    ids = curriculum.subtopic_ids
+    user_id = curriculum.user_id
+
+    initialize_confidences([user_id])
+    assert topic_totals(user_id, curriculum.paper_id) == (12, 4)
+    assert subject_totals(user_id, curriculum.biology_id) == (6, 2)
+    assert_consistent()
+
+    upsert_subtopic_confidences(user_id, {ids['encoding']: (5, None), ids['membranes']: (1, None)})
+    assert_consistent()
+
+    confidence = SubtopicConfidence.query.filter_by(user_id=user_id, subtopic_id=ids['encoding']).one()
+    confidence.confidence_level = 2
+    db.session.delete(SubtopicConfidence.query.filter_by(user_id=user_id, subtopic_id=ids['msm']).one())
+    db.session.commit()
+    assert_consistent()
+
+    # Re-initializing only fills the deleted row back in
+    stats = initialize_confidences([user_id])
+    assert stats['subtopics'] == 1
+    assert topic_totals(user_id, curriculum.memory_id) == (8, 3)
+    assert_consistent()
+
+
+def test_verify_repairs_drift(curriculum):
+    user_id = curriculum.user_id
+    initialize_confidences([user_id])
+    upsert_subtopic_confidences(user_id, {curriculum.subtopic_ids['msm']: (5, None)})
+
+    # Core statements bypass the listener, so these leave the totals wrong
+    db.session.execute(text('UPDATE topic_confidences SET level_sum = level_sum + 7 WHERE topic_id = :id'),
+                       {'id': curriculum.memory_id})
+    db.session.execute(text('DELETE FROM subject_confidences WHERE subject_id = :id'),
+                       {'id': curriculum.biology_id})
+    db.session.commit()
+
+    report = rebuild_confidence_totals(fix=False)
+    assert report['mismatched'] == 2
+    assert report['fixed'] == 0
+
+    result = verify_confidence_totals(user_id)
+    assert result['mismatched'] == 2
+    assert result['fixed'] == 2
+    assert topic_totals(user_id, curriculum.memory_id) == (11, 3)
+    assert subject_totals(user_id, curriculum.biology_id) == (6, 2)
+    assert_consistent()
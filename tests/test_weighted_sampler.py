@@ -0,0 +1,114 @@
+"""
+WeightedSampler draws: excluded keys are mapped past exactly, the linear
+fallback takes over after rejected tree draws, periodic rebuilds keep the tree
+in step with the stored weights, and empty or zero-weight samplers draw nothing.
+"""
+
+import math
+import random
+from app.utils import weighted_sampler
+from app.utils.weighted_sampler import CumulativeTable, WeightedSampler
+
+KEYS = ['a', 'b', 'c', 'd', 'e']
+WEIGHTS = [1, 2, 3, 4, 5]
+
+
+def expected_draw(r, keys, weights, exclude=()):
+    """Key an exact linear scan picks for a uniform value r over the non-excluded weights."""
+    candidates = [(key, weight) for key, weight in zip(keys, weights) if key not in exclude and weight > 0]
+    target = r * math.fsum(weight for _, weight in candidates)
+    for key, weight in candidates:
+        target -= weight
+        if target < 0:
+            return key
+    return candidates[-1][0]
+
+
+def test_draws_match_a_linear_scan():
+    sampler = WeightedSampler(KEYS, WEIGHTS)
+    rng, reference = random.Random(3), random.Random(3)
+
+    for _ in range(500):
+        assert sampler.sample(rng) == expected_draw(reference.random(), KEYS, WEIGHTS)
+
+
+def test_exclusion_maps_past_excluded_keys():
+    sampler = WeightedSampler(KEYS, WEIGHTS)
+    exclude = {'b', 'd'}
+    rng, reference = random.Random(11), random.Random(11)
+
+    # Integer weights leave no rounding, so every draw is accepted on the first try
+    for _ in range(500):
+        assert sampler.sample(rng, exclude=exclude) == expected_draw(reference.random(), KEYS, WEIGHTS, exclude)
+
+
+def test_exclusion_ignores_unknown_keys():
+    sampler = WeightedSampler(KEYS, WEIGHTS)
+    rng, reference = random.Random(5), random.Random(5)
+
+    for _ in range(100):
+        assert sampler.sample(rng, exclude={'z'}) == expected_draw(reference.random(), KEYS, WEIGHTS)
+
+
+def test_linear_fallback_after_rejected_draws(monkeypatch):
+    sampler = WeightedSampler(KEYS, WEIGHTS)
+    exclude = {'a', 'e'}
+
+    # A tree that always lands on an excluded key exhausts the rejections
+    monkeypatch.setattr(sampler, '_find', lambda target: KEYS.index('e'))
+    rng, reference = random.Random(7), random.Random(7)
+
+    for _ in range(200):
+        for _ in range(weighted_sampler.MAX_REJECTIONS):
+            reference.random()
+        assert sampler.sample(rng, exclude=exclude) == expected_draw(reference.random(), KEYS, WEIGHTS, exclude)
+
+
+def test_rebuild_after_rebuild_every_updates(monkeypatch):
+    monkeypatch.setattr(weighted_sampler, 'REBUILD_EVERY', 8)
+    sampler = WeightedSampler(KEYS, [0.1] * len(KEYS))
+    rng = random.Random(2)
+
+    for count in range(1, 8):
+        sampler.update(rng.choice(KEYS), rng.random())
+        assert sampler._updates == count
+
+    sampler.update('c', 0.3)
+    assert sampler._updates == 0
+    assert sampler._tree == WeightedSampler(KEYS, sampler._weights)._tree
+    assert math.isclose(sampler.total(), math.fsum(sampler._weights))
+
+
+def test_updates_change_the_draws():
+    sampler = WeightedSampler(KEYS, WEIGHTS)
+    sampler.update('a', 0)
+    sampler.update('e', 50)
+    sampler.update('missing', 100)
+    weights = [0, 2, 3, 4, 50]
+    rng, reference = random.Random(13), random.Random(13)
+
+    for _ in range(300):
+        assert sampler.sample(rng) == expected_draw(reference.random(), KEYS, weights)
+    assert sampler.weight('missing') == 0.0
+
+
+def test_empty_and_zero_weight_samplers_draw_nothing():
+    rng = random.Random(1)
+
+    assert WeightedSampler([], []).sample(rng) is None
+    assert WeightedSampler(KEYS, [0] * len(KEYS)).sample(rng) is None
+    assert WeightedSampler(KEYS, WEIGHTS).sample(rng, exclude=set(KEYS)) is None
+    assert CumulativeTable([], []).sample(rng) is None
+    assert CumulativeTable(KEYS, [0] * len(KEYS)).sample(rng) is None
+
+
+def test_zero_weight_keys_are_never_drawn():
+    sampler = WeightedSampler(KEYS, [0, 3, 0, 0, 1])
+    rng = random.Random(17)
+
+    draws = {sampler.sample(rng) for _ in range(500)}
+    draws |= {sampler.sample(rng, exclude={'b'}) for _ in range(100)}
+    assert draws == {'b', 'e'}
+
+    # Excluding every key with weight leaves only zero weights
+    assert sampler.sample(rng, exclude={'b', 'e'}) is None